@@ -0,0 +1,228 @@
+"""
+Audio-only requests for transcription.
+
+The audio track is demuxed locally with ffmpeg (OpenCV cannot read audio),
+long silences are cut out with an energy-based voice activity detector, and
+only the remaining speech is sent to the model, as FLAC, optionally with a
+few key frames for context. Audio is billed at a fraction of the video rate
+and is a fraction of the upload size.
+
+Timestamps the model writes refer to the trimmed audio; the segments table
+in the report has the same form as preprocess_video's, so
+preprocess.remap_timestamps maps them back to the source video.
+"""
+import os
+import shutil
+import subprocess
+import sys
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import tracing
+from units import AUDIO_TOKENS_PER_SECOND, VIDEO_TOKENS_PER_SECOND, format_timestamp
+from video_utils import DEFAULT_ENCODING, VideoSession, encode_frame_bytes, read_frames_at_positions, resize_frame
+
+# Gemini bills an image like one sampled video frame
+IMAGE_TOKENS = VIDEO_TOKENS_PER_SECOND
+
+@dataclass
+class AudioOptions:
+    """How to prepare an audio-only transcription request."""
+    sample_rate: int = 16000        # speech models resample to 16 kHz anyway
+    frame_ms: int = 30              # VAD analysis window
+    trim_silence: bool = True
+    min_silence_seconds: float = 1.5  # shorter pauses are kept as they are
+    padding_seconds: float = 0.25     # kept on each side of every speech run
+    threshold_db: float = -50.0       # frames quieter than this (dBFS) are always silence
+    margin_db: float = 10.0           # speech must be this much louder than the noise floor
+    key_frames: int = 0
+    key_frame_width: int = 768
+
+def require_ffmpeg() -> str:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise ValueError("Audio-only transcription needs ffmpeg on the PATH to demux the audio track")
+    return ffmpeg
+
+def extract_audio(video_path: str, sample_rate: int = 16000) -> np.ndarray:
+    """The video's audio track as mono 16-bit samples at sample_rate."""
+    command = [require_ffmpeg(), "-v", "error", "-i", video_path, "-vn", "-ac", "1", "-ar", str(sample_rate),
+               "-f", "s16le", "-"]
+    completed = subprocess.run(command, capture_output=True)
+    if completed.returncode != 0 or not completed.stdout:
+        detail = completed.stderr.decode(errors="replace").strip().split("\n")[0]
+        raise ValueError(f"No audio track could be read from {video_path}" + (f": {detail}" if detail else ""))
+    return np.frombuffer(completed.stdout, dtype=np.int16)
+
+def frame_levels(samples: np.ndarray, sample_rate: int, frame_ms: int) -> np.ndarray:
+    """RMS level in dBFS of each frame_ms window (a trailing partial window is dropped)."""
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    count = len(samples) // frame_length
+    frames = samples[:count * frame_length].reshape(count, frame_length).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20.0 * np.log10(rms + 1e-10)
+
+def detect_speech(samples: np.ndarray, sample_rate: int, options: Optional[AudioOptions] = None) -> List[Tuple[float, float]]:
+    """
+    (start, end) seconds of the stretches to keep: runs of frames louder
+    than the threshold, joined across pauses shorter than
+    min_silence_seconds and padded by padding_seconds.
+
+    The threshold adapts to the recording: margin_db above the noise floor
+    (the 10th percentile frame level), but never above the level of the
+    louder frames minus margin_db (so audio that is speech throughout is
+    kept) nor below threshold_db.
+    """
+    options = options or AudioOptions()
+    levels = frame_levels(samples, sample_rate, options.frame_ms)
+    if not len(levels):
+        return []
+    noise_floor = float(np.percentile(levels, 10))
+    loud = float(np.percentile(levels, 95))
+    threshold = max(options.threshold_db, min(noise_floor + options.margin_db, loud - options.margin_db))
+
+    voiced = np.concatenate(([False], levels > threshold, [False]))
+    edges = np.flatnonzero(voiced[1:] != voiced[:-1])
+    frame_seconds = options.frame_ms / 1000
+    duration = len(samples) / sample_rate
+
+    intervals: List[Tuple[float, float]] = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        start, end = start * frame_seconds, end * frame_seconds
+        if intervals and start - intervals[-1][1] < options.min_silence_seconds:
+            intervals[-1] = (intervals[-1][0], end)
+        else:
+            intervals.append((start, end))
+
+    padded: List[Tuple[float, float]] = []
+    for start, end in intervals:
+        start, end = max(0.0, start - options.padding_seconds), min(duration, end + options.padding_seconds)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+    return padded
+
+def build_segments(intervals: List[Tuple[float, float]], sample_rate: int) -> List[Dict]:
+    """Segments table mapping trimmed-audio time back to source time."""
+    segments = []
+    output_samples = 0
+    for start, end in intervals:
+        first, last = int(round(start * sample_rate)), int(round(end * sample_rate))
+        segments.append({
+            "output_start": round(output_samples / sample_rate, 3),
+            "source_start": round(first / sample_rate, 3)
+        })
+        output_samples += last - first
+    return segments
+
+def source_to_output(seconds: float, segments: List[Dict], intervals: List[Tuple[float, float]]) -> float:
+    """
+    Inverse of remap_time: where a source position ended up in the trimmed
+    audio. Positions inside a removed silence map to the start of the next
+    kept stretch.
+    """
+    for segment, (start, end) in zip(segments, intervals):
+        if seconds < end:
+            return segment["output_start"] + max(0.0, seconds - start)
+    if not segments:
+        return seconds
+    start, end = intervals[-1]
+    return segments[-1]["output_start"] + (end - start)
+
+def encode_audio(samples: np.ndarray, sample_rate: int, intervals: List[Tuple[float, float]], output_path: str) -> None:
+    """Write the kept stretches of samples back to back to output_path as FLAC."""
+    command = [require_ffmpeg(), "-y", "-v", "error", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "-",
+               "-c:a", "flac", output_path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        # Stretches are written one at a time; the trimmed audio is never assembled in memory
+        for start, end in intervals:
+            process.stdin.write(samples[int(round(start * sample_rate)):int(round(end * sample_rate))].tobytes())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    stderr = process.stderr.read().decode(errors="replace").strip()
+    if process.wait() != 0:
+        raise ValueError(f"Failed to encode audio to {output_path}: {stderr}")
+
+def key_frames(video_path: str, segments: List[Dict], intervals: List[Tuple[float, float]],
+               options: AudioOptions) -> List[Dict]:
+    """
+    Up to options.key_frames evenly spaced JPEG frames from the source
+    video, each with its position in the trimmed audio ("timestamp") and in
+    the source ("source_timestamp"). Frames are encoded straight to the
+    bytes sent in the request.
+    """
+    frames = []
+    with VideoSession(video_path) as session:
+        positions = np.linspace(0, session.total_frames - 1, options.key_frames, dtype=int)
+        for pos, frame in read_frames_at_positions(session.cap, sorted(set(int(p) for p in positions))):
+            if frame is None:
+                print(f"Failed to read key frame at position {pos}", file=sys.stderr)
+                continue
+            source_seconds = int(pos / session.fps)
+            frames.append({
+                "timestamp": format_timestamp(source_to_output(source_seconds, segments, intervals)),
+                "source_timestamp": format_timestamp(source_seconds),
+                "mime_type": DEFAULT_ENCODING.mime_type,
+                "data": encode_frame_bytes(resize_frame(frame, options.key_frame_width))
+            })
+    return frames
+
+def prepare_audio(video_path: str, output_path: str, options: Optional[AudioOptions] = None) -> Tuple[Dict, List[Dict]]:
+    """
+    Demux, trim and encode the audio of video_path to output_path (FLAC) and
+    pick the key frames. Returns (report, key frames); the report has the
+    durations, sizes, estimated token saving and the segments table for
+    preprocess.remap_timestamps.
+    """
+    options = options or AudioOptions()
+    with tracing.span("audio_extract"):
+        samples = extract_audio(video_path, options.sample_rate)
+    source_duration = len(samples) / options.sample_rate
+
+    intervals = [(0.0, source_duration)]
+    if options.trim_silence:
+        with tracing.span("vad"):
+            speech = detect_speech(samples, options.sample_rate, options)
+        if speech:
+            intervals = speech
+        else:
+            print("No speech detected; sending the untrimmed audio", file=sys.stderr)
+    segments = build_segments(intervals, options.sample_rate)
+
+    with tracing.span("audio_encode"):
+        encode_audio(samples, options.sample_rate, intervals, output_path)
+    frames = key_frames(video_path, segments, intervals, options) if options.key_frames else []
+
+    output_duration = sum(end - start for start, end in intervals)
+    source_bytes = os.path.getsize(video_path)
+    output_bytes = os.path.getsize(output_path)
+    source_tokens = int(source_duration * (VIDEO_TOKENS_PER_SECOND + AUDIO_TOKENS_PER_SECOND))
+    output_tokens = int(output_duration * AUDIO_TOKENS_PER_SECOND) + len(frames) * IMAGE_TOKENS
+
+    report = {
+        "options": asdict(options),
+        "source_bytes": source_bytes,
+        "output_bytes": output_bytes,
+        "bytes_saved": source_bytes - output_bytes,
+        "source_duration": round(source_duration, 3),
+        "output_duration": round(output_duration, 3),
+        "silence_trimmed_seconds": round(source_duration - output_duration, 3),
+        "speech_segments": len(intervals),
+        "key_frames": [{"timestamp": f["timestamp"], "source_timestamp": f["source_timestamp"]} for f in frames],
+        "estimated_source_tokens": source_tokens,
+        "estimated_output_tokens": output_tokens,
+        "estimated_tokens_saved": source_tokens - output_tokens,
+        "segments": segments
+    }
+    print(
+        f"Prepared audio: {source_bytes} -> {output_bytes} bytes, "
+        f"{source_duration:.1f}s -> {output_duration:.1f}s in {len(intervals)} segments, "
+        f"{len(frames)} key frames, ~{report['estimated_tokens_saved']} input tokens saved",
+        file=sys.stderr
+    )
+    return report, frames
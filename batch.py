@@ -0,0 +1,274 @@
+"""
+Process a library of videos concurrently.
+
+    python batch.py recordings/ prompts/transcribe.txt --output results.jsonl --concurrency 8
+    python batch.py manifest.jsonl prompts/procedure.txt --mode procedure --requests-per-minute 30
+
+The source is either a directory (every video file in it, recursively) or a
+JSON Lines manifest with one {"video_path", "prompt_path"?, "mode"?, "pdf"?,
+"model"?, "id"?} object per line; relative paths are resolved against the
+manifest's directory. All options of main.py apply to every job unless the
+manifest overrides them.
+
+Each finished job is appended to the output as one JSON line. Rerunning with
+the same output skips jobs that already succeeded, so an interrupted batch
+resumes where it stopped. Quota and transient server errors are retried with
+exponential backoff. A summary with the aggregated token counts and costs is
+printed to stdout at the end.
+
+For tests, --api-endpoint (or $VERTEX_API_ENDPOINT) points the SDK at a local
+fake model server such as benchmarks/fake_model_server.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import main
+import tracing
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".webm", ".mkv", ".avi"}
+
+@dataclass
+class BatchJob:
+    job_id: str
+    video_path: str
+    prompt_path: str
+    mode: Optional[str] = None
+    pdf_path: Optional[str] = None
+    model_name: Optional[str] = None
+
+def discover_jobs(source: str, prompt_path: str) -> List[BatchJob]:
+    """List the jobs described by a directory of videos or a JSONL manifest."""
+    source_path = Path(source)
+    if source_path.is_dir():
+        videos = sorted(p for p in source_path.rglob("*") if p.suffix.lower() in VIDEO_EXTENSIONS)
+        return [BatchJob(str(p.relative_to(source_path)), str(p), prompt_path) for p in videos]
+
+    if not source_path.exists():
+        raise FileNotFoundError(f"Batch source not found at {source}")
+
+    base = source_path.parent
+    jobs = []
+    with open(source_path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "video_path" not in entry:
+                raise ValueError(f"{source}:{line_number}: missing video_path")
+            video_path = str(base / entry["video_path"])
+            jobs.append(BatchJob(
+                job_id=str(entry.get("id", entry["video_path"])),
+                video_path=video_path,
+                prompt_path=str(base / entry["prompt_path"]) if entry.get("prompt_path") else prompt_path,
+                mode=entry.get("mode"),
+                pdf_path=str(base / entry["pdf"]) if entry.get("pdf") else None,
+                model_name=entry.get("model")
+            ))
+    return jobs
+
+def load_completed(output_path: str) -> Dict[str, Dict]:
+    """Successful records already in the output file, by job id."""
+    completed = {}
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run
+                continue
+            if record.get("status") == "ok":
+                completed[record["job_id"]] = record
+    return completed
+
+class RateLimiter:
+    """Spaces model calls at least 60 / requests_per_minute seconds apart."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+def is_retryable(error: Exception) -> bool:
+    """Whether error is a quota or transient server error (HTTP 429/500/503/504)."""
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        # Without the SDK no model call was made, so nothing is worth retrying
+        return False
+    return isinstance(error, (
+        exceptions.ResourceExhausted,
+        exceptions.TooManyRequests,
+        exceptions.ServiceUnavailable,
+        exceptions.DeadlineExceeded,
+        exceptions.InternalServerError,
+    ))
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (1-based)."""
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+def summarize(records: List[Dict]) -> Dict:
+    """Aggregate token counts and calculate_cost results over successful records."""
+    totals = {"prompt_tokens": 0, "response_tokens": 0, "input_cost": 0.0, "output_cost": 0.0, "total_cost": 0.0}
+    by_model: Dict[str, Dict] = {}
+    for record in records:
+        usage = (record.get("result") or {}).get("token_usage")
+        if record.get("status") != "ok" or not usage:
+            continue
+        costs = usage["costs"]
+        model_totals = by_model.setdefault(costs["model"], {"jobs": 0, "total_cost": 0.0})
+        model_totals["jobs"] += 1
+        model_totals["total_cost"] += costs["total_cost"]
+        totals["prompt_tokens"] += usage["prompt_tokens"]
+        totals["response_tokens"] += usage["response_tokens"]
+        for key in ("input_cost", "output_cost", "total_cost"):
+            totals[key] += costs[key]
+
+    for key in ("input_cost", "output_cost", "total_cost"):
+        totals[key] = round(totals[key], 6)
+    for model_totals in by_model.values():
+        model_totals["total_cost"] = round(model_totals["total_cost"], 6)
+    totals["by_model"] = by_model
+    return totals
+
+async def run_job(job: BatchJob, options: Dict, semaphore: asyncio.Semaphore, rate_limiter: RateLimiter,
+                  max_retries: int, backoff_base: float, backoff_max: float) -> Dict:
+    job_options = dict(options)
+    if job.mode:
+        job_options["mode"] = job.mode
+    if job.pdf_path:
+        job_options["pdf_path"] = job.pdf_path
+    if job.model_name:
+        job_options["model_name"] = job.model_name
+
+    record = {"job_id": job.job_id, "video_path": job.video_path}
+    start = time.perf_counter()
+    async with semaphore:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await main.process_video_async(job.video_path, job.prompt_path,
+                                                        rate_limiter=rate_limiter, **job_options)
+                record.update(status="ok", result=json.loads(result))
+                break
+            except Exception as e:
+                if attempt <= max_retries and is_retryable(e):
+                    delay = backoff_delay(attempt, backoff_base, backoff_max)
+                    print(f"{job.job_id}: {type(e).__name__}: {e}; retry {attempt}/{max_retries} in {delay:.1f}s",
+                          file=sys.stderr)
+                    await asyncio.sleep(delay)
+                    continue
+                print(f"{job.job_id}: failed: {e}", file=sys.stderr)
+                record.update(status="error", error=str(e), error_type=type(e).__name__)
+                break
+
+    record["attempts"] = attempt
+    record["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+async def run_batch(jobs: List[BatchJob], options: Dict, output_path: str, concurrency: int = 4,
+                    requests_per_minute: Optional[float] = None, max_retries: int = 5,
+                    backoff_base: float = 2.0, backoff_max: float = 60.0) -> Dict:
+    """
+    Run process_video_async over jobs with at most concurrency in flight,
+    appending each record to output_path as it finishes. Jobs already
+    recorded as successful in output_path are skipped. Returns the summary.
+    """
+    completed = load_completed(output_path)
+    pending = [job for job in jobs if job.job_id not in completed]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already done, {len(pending)} to run", file=sys.stderr)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    rate_limiter = RateLimiter(requests_per_minute)
+    records = [completed[job.job_id] for job in jobs if job.job_id in completed]
+    failed = 0
+
+    with open(output_path, "a") as out:
+        tasks = [
+            asyncio.ensure_future(run_job(job, options, semaphore, rate_limiter, max_retries, backoff_base, backoff_max))
+            for job in pending
+        ]
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            record = await task
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            records.append(record)
+            failed += record["status"] != "ok"
+            print(f"[{done}/{len(pending)}] {record['job_id']}: {record['status']}", file=sys.stderr)
+
+    summary = {
+        "jobs": len(jobs),
+        "succeeded": len(records) - failed,
+        "failed": failed,
+        "resumed": len(jobs) - len(pending),
+        "output": output_path
+    }
+    summary.update(summarize(records))
+    return summary
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Process many videos concurrently")
+    parser.add_argument("source", help="Directory of videos or JSON Lines manifest")
+    parser.add_argument("prompt_path", help="Prompt file used for jobs that do not set their own")
+    parser.add_argument("--output", default="batch_results.jsonl",
+                      help="JSON Lines file for results; existing successful jobs are skipped")
+    parser.add_argument("--concurrency", type=int, default=4,
+                      help="Maximum number of videos in flight")
+    parser.add_argument("--requests-per-minute", type=float,
+                      help="Limit on model calls per minute (retries included)")
+    parser.add_argument("--max-retries", type=int, default=5,
+                      help="Retries per video on quota or transient server errors")
+    parser.add_argument("--backoff-base", type=float, default=2.0,
+                      help="Initial retry delay in seconds, doubled on each retry")
+    parser.add_argument("--backoff-max", type=float, default=60.0,
+                      help="Upper bound on a single retry delay in seconds")
+    parser.add_argument("--api-endpoint",
+                      help=f"Vertex AI endpoint override, e.g. a local fake model server (sets ${main.API_ENDPOINT_ENV})")
+    main.add_processing_arguments(parser)
+    return parser.parse_args(argv)
+
+def cli(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.api_endpoint:
+        os.environ[main.API_ENDPOINT_ENV] = args.api_endpoint
+
+    try:
+        jobs = discover_jobs(args.source, args.prompt_path)
+        options = main.processing_options(args)
+        with tracing.invocation("batch", jobs=len(jobs), concurrency=args.concurrency):
+            summary = asyncio.run(run_batch(
+                jobs, options, args.output,
+                concurrency=args.concurrency,
+                requests_per_minute=args.requests_per_minute,
+                max_retries=args.max_retries,
+                backoff_base=args.backoff_base,
+                backoff_max=args.backoff_max
+            ))
+        print(json.dumps(summary, indent=2))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    if summary["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,76 @@
+"""
+Measure frames/sec of frame capture (decode, resize, encode) with the encode
+thread pool at several sizes, for each image format.
+
+    python benchmarks/bench_encode.py --duration 30 --pool-sizes 1,2,4,8 --max-width 1280
+
+Every frame of a synthetic video is captured so encoding, not seeking,
+dominates; outputs are checked to be identical (same order and bytes) at
+every pool size.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.synthetic import make_synthetic_video
+from video_utils import EncodeOptions, VideoSession, extract_key_frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the frame encode pipeline")
+    parser.add_argument("--duration", type=float, default=20.0, help="Synthetic video length in seconds")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--max-width", type=int, help="Resize captured frames to this width")
+    parser.add_argument("--pool-sizes", default="1,2,4,8", help="Comma-separated encode pool sizes")
+    parser.add_argument("--formats", default="jpeg,webp", help="Comma-separated image formats")
+    parser.add_argument("--quality", type=int, help="Encode quality (default: per format)")
+    parser.add_argument("--video", help="Use an existing video instead of generating one")
+    args = parser.parse_args()
+
+    pool_sizes = [int(n) for n in args.pool_sizes.split(",")]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = args.video
+        if not video_path:
+            video_path = os.path.join(tmp, 'synthetic.mp4')
+            make_synthetic_video(video_path, args.duration, args.fps, (args.width, args.height))
+        with VideoSession(video_path) as session:
+            total_frames = session.total_frames
+
+        for image_format in args.formats.split(","):
+            baseline = None
+            for workers in pool_sizes:
+                encoding = EncodeOptions(format=image_format, quality=args.quality, workers=workers)
+                start = time.perf_counter()
+                frames = extract_key_frames(video_path, total_frames, max_width=args.max_width, encoding=encoding)
+                seconds = time.perf_counter() - start
+
+                if baseline is None:
+                    baseline = (frames, seconds)
+                results.append({
+                    "format": image_format,
+                    "workers": workers,
+                    "frames": len(frames),
+                    "fps": round(len(frames) / seconds, 1),
+                    "speedup": round(baseline[1] / seconds, 2),
+                    "mean_image_bytes": int(sum(len(f["image"]) for f in frames) * 3 / 4 / max(len(frames), 1)),
+                    "output_matches": frames == baseline[0]
+                })
+                print(f"{image_format} workers={workers}: {results[-1]['fps']} frames/s", file=sys.stderr)
+
+    print(json.dumps({
+        "benchmark": "encode",
+        "source_size": [args.width, args.height],
+        "max_width": args.max_width,
+        "cpu_count": os.cpu_count(),
+        "results": results
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
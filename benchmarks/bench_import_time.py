@@ -0,0 +1,89 @@
+"""
+Measure CLI startup: the cumulative import time of each entry-point module
+(from python -X importtime) and the wall time of `<script> --help`, and check
+that none of the heavy dependencies is loaded just by importing it.
+
+    python benchmarks/bench_import_time.py --budget-ms 150
+
+Exits non-zero if a heavy module is imported eagerly or a --help run
+exceeds the budget, so it can guard against import-time regressions.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+ENTRY_POINTS = ["main", "extract_frames", "generate_word"]
+HEAVY_MODULES = ["cv2", "numpy", "vertexai", "google.cloud.aiplatform", "docx", "PIL"]
+
+def import_time_us(module: str) -> int:
+    """Cumulative import time of module in microseconds, per -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    # Lines look like: "import time:  self [us] |  cumulative | imported package"
+    for line in result.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise ValueError(f"No importtime entry for {module}")
+
+def heavy_modules_loaded(module: str) -> list:
+    code = (
+        f"import sys, json, {module}\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+def help_time_ms(module: str, repeat: int) -> float:
+    """
+    Best-of-repeat wall time of `python <module>.py --help`. The exit status
+    is ignored: generate_word.py has no --help and fails on the bogus path,
+    which still exercises the same startup.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, f"{module}.py", "--help"], cwd=ROOT,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI import and startup time")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per --help measurement (best is kept)")
+    parser.add_argument("--budget-ms", type=float, help="Fail if any --help run takes longer than this")
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    for module in ENTRY_POINTS:
+        heavy = heavy_modules_loaded(module)
+        help_ms = help_time_ms(module, args.repeat)
+        over_budget = args.budget_ms is not None and help_ms > args.budget_ms
+        failed = failed or bool(heavy) or over_budget
+        results.append({
+            "module": module,
+            "import_ms": round(import_time_us(module) / 1000, 1),
+            "help_ms": round(help_ms, 1),
+            "heavy_modules_loaded": heavy,
+            "over_budget": over_budget
+        })
+
+    print(json.dumps({
+        "benchmark": "import_time",
+        "budget_ms": args.budget_ms,
+        "results": results,
+        "passed": not failed
+    }, indent=2))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare sequential-decode key frame extraction against the old
+seek-per-frame path on a synthetic long video.
+
+    python benchmarks/bench_keyframes.py --duration 600 --num-frames 40
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.synthetic import make_synthetic_video
+from video_utils import extract_key_frames, encode_frame
+
+def extract_key_frames_seek(video_path: str, num_frames: int):
+    """The previous implementation: one cap.set() seek per requested frame."""
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for pos in np.linspace(0, total_frames - 1, num_frames, dtype=int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+        ret, frame = cap.read()
+        if ret:
+            frames.append(encode_frame(frame))
+    cap.release()
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark key frame extraction")
+    parser.add_argument("--duration", type=float, default=300.0, help="Synthetic video length in seconds")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--num-frames", type=int, default=40)
+    parser.add_argument("--video", help="Use an existing video instead of generating one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = args.video
+        if not video_path:
+            video_path = os.path.join(tmp, 'synthetic.mp4')
+            make_synthetic_video(video_path, args.duration, args.fps, (args.width, args.height))
+
+        start = time.perf_counter()
+        seek_frames = extract_key_frames_seek(video_path, args.num_frames)
+        seek_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sequential_frames = extract_key_frames(video_path, args.num_frames)
+        sequential_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "benchmark": "keyframes",
+        "num_frames": args.num_frames,
+        "seek_seconds": round(seek_seconds, 3),
+        "sequential_seconds": round(sequential_seconds, 3),
+        "speedup": round(seek_seconds / sequential_seconds, 2) if sequential_seconds else None,
+        # Both paths encode identically, so the same decoded frames give the same data URLs
+        "frames_match": seek_frames == [frame["image"] for frame in sequential_frames]
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Check and time the procedure parser.
+
+Every response in benchmarks/corpus/procedure/*.txt is parsed and compared
+with the .json next to it, then re-parsed with ProcedureStreamParser from
+randomly sized chunks, which must give the same result. Throughput is
+measured on a synthetic response with --steps steps built from the corpus.
+
+    python benchmarks/bench_procedure_parser.py --steps 20000 --trials 200
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from procedure_parser import ProcedureStreamParser, parse_procedure
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus', 'procedure')
+
+def stream_parse(text: str, rng: random.Random, max_chunk: int) -> dict:
+    parser = ProcedureStreamParser()
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, max_chunk)
+        parser.feed(text[position:position + size])
+        position += size
+    parser.finish()
+    return parser.result()
+
+def large_response(steps: int) -> str:
+    step_lines = []
+    for i in range(1, steps + 1):
+        step_lines += [
+            f"{i}. Perform action number {i} in the configuration dialog",
+            "   a. Click the highlighted button in the toolbar",
+            "   b. Confirm the change in the dialog that appears",
+            "   ⚠️ Do not close the window while the change is applied",
+            "   💡 Press Ctrl+Z to undo the last change",
+        ]
+    return "\n".join([
+        "TITLE: Synthetic procedure",
+        "",
+        "OVERVIEW:",
+        "A long generated procedure used to measure parser throughput.",
+        "",
+        "PREREQUISITES:",
+        "- Administrator access",
+        "",
+        "PROCEDURE:",
+        *step_lines,
+        "",
+        "VERIFICATION:",
+        "Every change is listed in the audit log.",
+        "",
+        "TROUBLESHOOTING:",
+        "- Change not applied: repeat the step",
+    ]) + "\n"
+
+def best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the procedure parser")
+    parser.add_argument("--steps", type=int, default=20000, help="Steps in the synthetic throughput response")
+    parser.add_argument("--trials", type=int, default=200, help="Random chunkings per corpus file")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs (best is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = []
+    corpus = sorted(glob.glob(os.path.join(CORPUS_DIR, '*.txt')))
+    for path in corpus:
+        name = os.path.basename(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        with open(path[:-4] + '.json', 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+
+        if parse_procedure(text) != expected:
+            failures.append(f"{name}: parse_procedure output differs from {name[:-4]}.json")
+        for _ in range(args.trials):
+            if stream_parse(text, rng, 32) != expected:
+                failures.append(f"{name}: streamed parse differs from the full-text parse")
+                break
+
+    text = large_response(args.steps)
+    megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+    parse_seconds = best_time(lambda: parse_procedure(text), args.repeat)
+    stream_seconds = best_time(lambda: stream_parse(text, random.Random(args.seed), 256), args.repeat)
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    print(json.dumps({
+        "benchmark": "procedure_parser",
+        "corpus_files": len(corpus),
+        "failures": len(failures),
+        "response_mb": round(megabytes, 2),
+        "steps": args.steps,
+        "parse_mb_per_s": round(megabytes / parse_seconds, 1),
+        "stream_parse_mb_per_s": round(megabytes / stream_seconds, 1)
+    }, indent=2))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
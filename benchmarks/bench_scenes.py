@@ -0,0 +1,70 @@
+"""
+Compare exact and fast (thumbnail + stride) scene detection on a synthetic
+video with known cuts. Reports frames/sec for both and how many of the exact
+mode's detections the fast mode reproduces.
+
+    python benchmarks/bench_scenes.py --duration 120 --stride 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.synthetic import make_synthetic_video
+from video_utils import VideoSession, detect_scene_changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scene change detection")
+    parser.add_argument("--duration", type=float, default=120.0, help="Synthetic video length in seconds")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--scene-length", type=float, default=4.0)
+    parser.add_argument("--threshold", type=float, default=30.0)
+    parser.add_argument("--stride", type=int, default=5)
+    parser.add_argument("--thumbnail-width", type=int, default=64)
+    parser.add_argument("--video", help="Use an existing video instead of generating one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = args.video
+        if not video_path:
+            video_path = os.path.join(tmp, 'synthetic.mp4')
+            make_synthetic_video(video_path, args.duration, args.fps,
+                                 (args.width, args.height), args.scene_length)
+
+        with VideoSession(video_path) as session:
+            total_frames = session.total_frames
+
+        start = time.perf_counter()
+        exact = detect_scene_changes(video_path, args.threshold)
+        exact_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast = detect_scene_changes(video_path, args.threshold, fast=True,
+                                    stride=args.stride, thumbnail_width=args.thumbnail_width)
+        fast_seconds = time.perf_counter() - start
+
+    exact_timestamps = [f['timestamp'] for f in exact]
+    fast_timestamps = [f['timestamp'] for f in fast]
+    matched = len(set(exact_timestamps) & set(fast_timestamps))
+
+    print(json.dumps({
+        "benchmark": "scenes",
+        "total_frames": total_frames,
+        "exact_fps": round(total_frames / exact_seconds, 1),
+        "fast_fps": round(total_frames / fast_seconds, 1),
+        "speedup": round(exact_seconds / fast_seconds, 2),
+        "exact_detections": len(exact_timestamps),
+        "fast_detections": len(fast_timestamps),
+        "agreement": round(matched / len(exact_timestamps), 3) if exact_timestamps else 1.0,
+        "extra_in_fast": sorted(set(fast_timestamps) - set(exact_timestamps)),
+        "missed_in_fast": sorted(set(exact_timestamps) - set(fast_timestamps))
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
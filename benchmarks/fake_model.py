@@ -0,0 +1,93 @@
+"""
+Run main.py against an in-process stand-in for Vertex AI's GenerativeModel,
+so process_video (sync, streamed, batch-style async and segmented) can be
+timed offline. The fake answers every request with a synthetic procedure of
+--steps steps after --latency seconds, and reports usage metadata like the
+real API. Everything else (input files, preprocessing, parsing, caching)
+runs the real code; the Vertex AI SDK still has to be importable for the
+request parts.
+
+    python benchmarks/fake_model.py --steps 2000 -- video.mp4 prompt.txt --mode procedure --no-cache
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main
+from benchmarks.bench_procedure_parser import large_response
+
+@dataclass
+class FakeUsage:
+    prompt_token_count: int
+    candidates_token_count: int
+
+    @property
+    def total_token_count(self) -> int:
+        return self.prompt_token_count + self.candidates_token_count
+
+@dataclass
+class FakeResponse:
+    text: str
+    usage_metadata: FakeUsage
+
+@dataclass
+class FakeTokenCount:
+    total_tokens: int
+
+class FakeGenerativeModel:
+    """The parts of GenerativeModel that main.py uses."""
+
+    def __init__(self, text: str, latency: float = 0.0, chunk_chars: int = 200, prompt_tokens: int = 10000):
+        self.text = text
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = main.estimate_text_tokens(text)
+
+    def count_tokens(self, contents: List) -> FakeTokenCount:
+        return FakeTokenCount(self.prompt_tokens)
+
+    def generate_content(self, contents: List, stream: bool = False):
+        if stream:
+            return self._stream()
+        time.sleep(self.latency)
+        return FakeResponse(self.text, FakeUsage(self.prompt_tokens, self.response_tokens))
+
+    async def generate_content_async(self, contents: List) -> FakeResponse:
+        await asyncio.sleep(self.latency)
+        return FakeResponse(self.text, FakeUsage(self.prompt_tokens, self.response_tokens))
+
+    def _stream(self) -> Iterator[FakeResponse]:
+        # The latency is spread over the chunks, first chunk included
+        chunks = [self.text[i:i + self.chunk_chars] for i in range(0, len(self.text), self.chunk_chars)]
+        for n, chunk in enumerate(chunks, 1):
+            time.sleep(self.latency / len(chunks))
+            yield FakeResponse(chunk, FakeUsage(self.prompt_tokens, main.estimate_text_tokens(self.text[:n * self.chunk_chars])))
+
+def install(text: str, latency: float = 0.0, model_names: Optional[List[str]] = None) -> FakeGenerativeModel:
+    """Make main.get_model return a FakeGenerativeModel for model_names (default: both Gemini models)."""
+    model = FakeGenerativeModel(text, latency)
+    for name in model_names or ["gemini-1.5-flash-002", "gemini-1.5-pro-002"]:
+        main._models[name] = model
+    return model
+
+def cli():
+    parser = argparse.ArgumentParser(description="Run main.py against a fake model",
+                                     usage="%(prog)s [--steps N] [--latency S] -- <main.py arguments>")
+    parser.add_argument("--steps", type=int, default=50, help="Steps in the fake procedure response")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each model call takes")
+    args, main_argv = parser.parse_known_args()
+    if main_argv and main_argv[0] == "--":
+        main_argv = main_argv[1:]
+
+    install(large_response(args.steps), args.latency)
+    main.main(main_argv)
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,167 @@
+"""
+A local stand-in for the Vertex AI prediction service, for testing the
+real SDK code paths (batch.py's concurrency, rate limiting and retries)
+without a Google Cloud project.
+
+    python benchmarks/fake_model_server.py --port 50051 --latency 1 --fail-every 3
+
+It serves the v1beta1 PredictionService methods the generative models SDK
+calls (StreamGenerateContent and CountTokens) over gRPC. Every request gets
+a synthetic procedure of --steps steps with usage metadata; with
+--fail-every N, every Nth generate call fails with RESOURCE_EXHAUSTED
+(HTTP 429), the quota error batch.py retries.
+
+The SDK only opens TLS channels, so the server uses a throwaway
+self-signed certificate for localhost. On startup it prints the
+environment a client needs:
+
+    VERTEX_API_ENDPOINT=localhost:50051
+    GRPC_DEFAULT_SSL_ROOTS_FILE_PATH=/tmp/fake-model-server-.../cert.pem
+
+main.py connects to a loopback endpoint with anonymous credentials, so no
+Google credentials are needed either.
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent import futures
+from typing import Iterator, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import grpc
+from google.cloud.aiplatform_v1beta1.types import content as content_types
+from google.cloud.aiplatform_v1beta1.types import prediction_service as types
+
+import main
+from benchmarks.bench_procedure_parser import large_response
+
+SERVICE_NAME = "google.cloud.aiplatform.v1beta1.PredictionService"
+
+def self_signed_certificate(host: str = "localhost") -> Tuple[bytes, bytes]:
+    """(certificate, private key) PEM bytes for host, valid for a day."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, host)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(host)]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    return (
+        certificate.public_bytes(serialization.Encoding.PEM),
+        key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                          serialization.NoEncryption())
+    )
+
+class FakePredictionService:
+    """Answers every request with the same text after latency seconds."""
+
+    def __init__(self, text: str, latency: float = 0.0, fail_every: int = 0, chunk_chars: int = 200,
+                 prompt_tokens: int = 10000):
+        self.text = text
+        self.latency = latency
+        self.fail_every = fail_every
+        self.chunk_chars = chunk_chars
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = main.estimate_text_tokens(text)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def stream_generate_content(self, request: types.GenerateContentRequest,
+                                context: grpc.ServicerContext) -> Iterator[types.GenerateContentResponse]:
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if self.fail_every and call % self.fail_every == 0:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f"Fake quota exceeded (call {call})")
+
+        chunks = [self.text[i:i + self.chunk_chars] for i in range(0, len(self.text), self.chunk_chars)]
+        for n, chunk in enumerate(chunks, 1):
+            time.sleep(self.latency / len(chunks))
+            last = n == len(chunks)
+            response_tokens = self.response_tokens if last else main.estimate_text_tokens(self.text[:n * self.chunk_chars])
+            yield types.GenerateContentResponse(
+                candidates=[content_types.Candidate(
+                    index=0,
+                    content=content_types.Content(role="model", parts=[content_types.Part(text=chunk)]),
+                    finish_reason=content_types.Candidate.FinishReason.STOP if last else 0
+                )],
+                usage_metadata=types.GenerateContentResponse.UsageMetadata(
+                    prompt_token_count=self.prompt_tokens,
+                    candidates_token_count=response_tokens,
+                    total_token_count=self.prompt_tokens + response_tokens
+                )
+            )
+
+    def count_tokens(self, request: types.CountTokensRequest, context: grpc.ServicerContext) -> types.CountTokensResponse:
+        return types.CountTokensResponse(total_tokens=self.prompt_tokens)
+
+    def handler(self) -> grpc.GenericRpcHandler:
+        return grpc.method_handlers_generic_handler(SERVICE_NAME, {
+            "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+                self.stream_generate_content,
+                request_deserializer=types.GenerateContentRequest.deserialize,
+                response_serializer=types.GenerateContentResponse.serialize
+            ),
+            "CountTokens": grpc.unary_unary_rpc_method_handler(
+                self.count_tokens,
+                request_deserializer=types.CountTokensRequest.deserialize,
+                response_serializer=types.CountTokensResponse.serialize
+            ),
+        })
+
+def serve(service: FakePredictionService, port: int = 0, workers: int = 16) -> Tuple[grpc.Server, int, str]:
+    """
+    Start a TLS server for service on localhost:port (0 picks a free port).
+    Returns (server, port, path of the certificate clients must trust).
+    """
+    certificate, key = self_signed_certificate()
+    cert_dir = tempfile.mkdtemp(prefix="fake-model-server-")
+    cert_path = os.path.join(cert_dir, "cert.pem")
+    with open(cert_path, "wb") as f:
+        f.write(certificate)
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    server.add_generic_rpc_handlers((service.handler(),))
+    port = server.add_secure_port(f"localhost:{port}", grpc.ssl_server_credentials([(key, certificate)]))
+    server.start()
+    return server, port, cert_path
+
+def cli():
+    parser = argparse.ArgumentParser(description="Serve a fake Vertex AI prediction service on localhost")
+    parser.add_argument("--port", type=int, default=50051, help="Port to listen on (0 picks a free one)")
+    parser.add_argument("--steps", type=int, default=50, help="Steps in the fake procedure response")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each generate call takes")
+    parser.add_argument("--fail-every", type=int, default=0,
+                        help="Fail every Nth generate call with RESOURCE_EXHAUSTED (0: never)")
+    parser.add_argument("--workers", type=int, default=16, help="Requests served at once")
+    args = parser.parse_args()
+
+    service = FakePredictionService(large_response(args.steps), args.latency, args.fail_every)
+    server, port, cert_path = serve(service, args.port, args.workers)
+    print(f"{main.API_ENDPOINT_ENV}=localhost:{port}", flush=True)
+    print(f"GRPC_DEFAULT_SSL_ROOTS_FILE_PATH={cert_path}", flush=True)
+    try:
+        server.wait_for_termination()
+    except KeyboardInterrupt:
+        server.stop(0)
+    print(f"Served {service.calls} generate calls", file=sys.stderr)
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,289 @@
+"""
+Offline end-to-end benchmark suite. Generates synthetic screen recordings
+(several lengths and resolutions, with known scene cuts) and procedure
+documents, then times every extract_frames mode, the Word export and
+process_video against a fake model (benchmarks/fake_model.py), each in its
+own process. Wall time, peak RSS and per-stage times come from the
+entry points' VIDEO_TRACE summaries; scene modes also report recall of the
+known cuts.
+
+Results are written as JSON. With --compare, each case is checked against
+an earlier results file and cases that got slower or bigger than
+--tolerance (or lost cut recall) are flagged; the exit status is 1 if any
+case regressed or failed.
+
+    python benchmarks/run_suite.py --quick
+    python benchmarks/run_suite.py --output before.json
+    python benchmarks/run_suite.py --compare before.json --tolerance 0.2
+
+The Vertex AI SDK has to be importable for the process_video cases; they
+are skipped when it is not. A worker socket in the environment is ignored.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.synthetic import make_procedure_data, make_synthetic_video
+
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+# (name, duration seconds, (width, height)); the scene length is 5 seconds
+VIDEOS = [
+    ("short-720p", 30.0, (1280, 720)),
+    ("long-720p", 180.0, (1280, 720)),
+    ("short-1080p", 30.0, (1920, 1080)),
+]
+QUICK_VIDEOS = [
+    ("short-480p", 10.0, (854, 480)),
+]
+WORD_STEPS = [200, 1000]
+QUICK_WORD_STEPS = [50]
+FAKE_MODEL_STEPS = 500
+SCENE_LENGTH = 5.0
+FPS = 30.0
+
+@dataclass
+class Case:
+    name: str
+    command: List[str]
+    # Extra measurements from the case's stdout
+    check: Optional[Callable[[str], Dict]] = None
+    info: Dict = field(default_factory=dict)
+
+def timestamp_seconds(timestamp: str) -> int:
+    hours, minutes, seconds = (int(part) for part in timestamp.split(":"))
+    return hours * 3600 + minutes * 60 + seconds
+
+def cut_recall(cuts: List[int], fps: float) -> Callable[[str], Dict]:
+    """A check scoring scene output against the known cuts, to the second."""
+    def check(stdout: str) -> Dict:
+        detected = [timestamp_seconds(frame["timestamp"]) for frame in json.loads(stdout)]
+        found = sum(any(abs(t - cut / fps) <= 1.0 for t in detected) for cut in cuts)
+        return {
+            "cuts": len(cuts),
+            "detected": len(detected),
+            "cut_recall": round(found / len(cuts), 3) if cuts else 1.0
+        }
+    return check
+
+def frame_count(stdout: str) -> Dict:
+    return {"frames": len(json.loads(stdout))}
+
+def video_cases(name: str, video_path: str, cuts: List[int], work_dir: str) -> List[Case]:
+    extract = [sys.executable, "extract_frames.py", video_path]
+    index_dir = os.path.join(work_dir, f"index-{name}")
+    marks_path = os.path.join(work_dir, f"marks-{name}.json")
+    # One mark per scene plus one mid-scene, out of order
+    marks = [{"timestamp": cut / FPS + 0.5, "description": f"Cut {i}"} for i, cut in enumerate(cuts)]
+    marks += [{"timestamp": SCENE_LENGTH / 2, "description": "First scene"}]
+    with open(marks_path, "w") as f:
+        json.dump(marks[::-1], f)
+
+    recall = cut_recall(cuts, FPS)
+    return [
+        Case(f"keyframes/{name}", extract + ["--mode", "keyframes", "--num-frames", "10"], frame_count),
+        Case(f"keyframes-dedup/{name}", extract + ["--mode", "keyframes", "--num-frames", "10", "--dedup"], frame_count),
+        Case(f"scenes/{name}", extract + ["--mode", "scenes"], recall),
+        Case(f"scenes-fast/{name}", extract + ["--mode", "scenes", "--fast"], recall),
+        Case(f"scenes-dedup/{name}", extract + ["--mode", "scenes", "--fast", "--dedup"], recall),
+        Case(f"timestamps/{name}", extract + ["--mode", "timestamps", "--timestamps", marks_path], frame_count),
+        # Builds the index; the next case reuses it
+        Case(f"thumbnails/{name}", extract + ["--mode", "thumbnails", "--index-dir", index_dir], frame_count),
+        Case(f"scenes-index/{name}", extract + ["--mode", "scenes", "--index", "--index-dir", index_dir], recall),
+    ]
+
+def word_cases(steps: int, work_dir: str) -> List[Case]:
+    data_path = os.path.join(work_dir, f"procedure-{steps}.json")
+    make_procedure_data(data_path, steps)
+    output_path = os.path.join(work_dir, f"procedure-{steps}.docx")
+    return [Case(f"word/{steps}-steps", [sys.executable, "generate_word.py", data_path, output_path],
+                 info={"input_mb": round(os.path.getsize(data_path) / (1024 * 1024), 1)})]
+
+def model_cases(name: str, video_path: str, work_dir: str) -> List[Case]:
+    prompt_path = os.path.join(work_dir, "prompt.txt")
+    with open(prompt_path, "w") as f:
+        f.write("Write a step-by-step procedure for the task shown in this screen recording.\n")
+    process = [sys.executable, "benchmarks/fake_model.py", "--steps", str(FAKE_MODEL_STEPS), "--",
+               video_path, prompt_path, "--no-cache"]
+    return [
+        Case(f"process-procedure/{name}", process + ["--mode", "procedure"]),
+        Case(f"process-transcribe/{name}", process + ["--mode", "transcribe"]),
+        Case(f"process-stream/{name}", process + ["--mode", "procedure", "--stream"]),
+        Case(f"process-segment/{name}", process + ["--mode", "procedure", "--segment", "--segment-seconds", "10"]),
+    ]
+
+def vertex_available() -> bool:
+    try:
+        import vertexai  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def run_case(case: Case, work_dir: str) -> Dict:
+    """Run the case once and return its trace summary, plus its checks."""
+    trace_path = os.path.join(work_dir, "trace.jsonl")
+    if os.path.exists(trace_path):
+        os.unlink(trace_path)
+    env = dict(os.environ, VIDEO_TRACE=trace_path)
+    env.pop("VIDEO_WORKER_SOCKET", None)
+    env.pop("VIDEO_PROFILE", None)
+
+    start = time.perf_counter()
+    completed = subprocess.run(case.command, cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"exit status {completed.returncode}: {completed.stderr.strip()[-2000:]}")
+
+    with open(trace_path) as f:
+        # The entry point's own summary is the last line
+        trace = json.loads(f.read().splitlines()[-1])
+    result = {
+        "wall_seconds": trace["wall_seconds"],
+        "process_seconds": round(elapsed, 6),
+        "peak_rss_mb": trace["peak_rss_mb"],
+        "stages": {stage: stats["total_seconds"] for stage, stats in trace["stages"].items()}
+    }
+    if case.check:
+        result.update(case.check(completed.stdout))
+    return result
+
+def run_cases(cases: List[Case], work_dir: str, repeat: int) -> Dict[str, Dict]:
+    """Each case's median over repeat runs (the run with the median wall time)."""
+    results = {}
+    for case in cases:
+        print(f"{case.name} ...", file=sys.stderr, end=" ", flush=True)
+        try:
+            runs = [run_case(case, work_dir) for _ in range(repeat)]
+        except Exception as e:
+            print(f"failed: {e}", file=sys.stderr)
+            results[case.name] = {"error": str(e)}
+            continue
+        runs.sort(key=lambda run: run["process_seconds"])
+        result = dict(runs[len(runs) // 2], **case.info)
+        if repeat > 1:
+            result["process_seconds_stdev"] = round(statistics.stdev(run["process_seconds"] for run in runs), 6)
+        results[case.name] = result
+        print(f"{result['process_seconds']:.2f}s, {result['peak_rss_mb']} MB", file=sys.stderr)
+    return results
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float, min_seconds: float) -> List[str]:
+    """Regressions of results against baseline, one message each."""
+    regressions = []
+    for name, result in results.items():
+        if "error" in result:
+            regressions.append(f"{name}: failed: {result['error'].splitlines()[0]}")
+            continue
+        before = baseline.get(name)
+        if not before or "error" in before:
+            continue
+        seconds, seconds_before = result["process_seconds"], before["process_seconds"]
+        # Ignore noise on cases that take next to no time either way
+        if seconds > seconds_before * (1 + tolerance) and seconds - seconds_before > min_seconds:
+            regressions.append(f"{name}: {seconds_before:.2f}s -> {seconds:.2f}s")
+        if result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {before['peak_rss_mb']} MB -> {result['peak_rss_mb']} MB")
+        if result.get("cut_recall", 1.0) < before.get("cut_recall", 1.0):
+            regressions.append(f"{name}: cut recall {before['cut_recall']} -> {result['cut_recall']}")
+    return regressions
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="One small video and a small procedure (a smoke run)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the median is reported")
+    parser.add_argument("--only", help="Only run cases whose name contains this string")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to flag regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative increase in time or peak RSS counted as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.2,
+                        help="Time increases smaller than this are never counted as regressions")
+    parser.add_argument("--work-dir", help="Keep generated inputs here and reuse them between runs")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["cases"]
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="video-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        cases = []
+        with_model = vertex_available()
+        if not with_model:
+            print("vertexai is not importable; skipping the process_video cases", file=sys.stderr)
+        for name, duration, size in QUICK_VIDEOS if args.quick else VIDEOS:
+            video_path = os.path.join(work_dir, f"{name}.mp4")
+            cuts_path = video_path + ".cuts.json"
+            if os.path.exists(cuts_path):
+                with open(cuts_path) as f:
+                    cuts = json.load(f)
+            else:
+                print(f"Generating {name} ({duration:.0f}s)", file=sys.stderr)
+                cuts = make_synthetic_video(video_path, duration, FPS, size, SCENE_LENGTH)
+                with open(cuts_path, "w") as f:
+                    json.dump(cuts, f)
+            cases += video_cases(name, video_path, cuts, work_dir)
+            if with_model:
+                cases += model_cases(name, video_path, work_dir)
+        for steps in QUICK_WORD_STEPS if args.quick else WORD_STEPS:
+            cases += word_cases(steps, work_dir)
+        if args.only:
+            cases = [case for case in cases if args.only in case.name]
+
+        results = run_cases(cases, work_dir, args.repeat)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark": "suite",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "repeat": args.repeat,
+        "cases": results
+    }
+    output_path = args.output
+    if not output_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output_path}", file=sys.stderr)
+
+    regressions = compare(results, baseline or {}, args.tolerance, args.min_seconds)
+    print(json.dumps({
+        "benchmark": "suite",
+        "output": output_path,
+        "cases": len(results),
+        "failed": sum("error" in result for result in results.values()),
+        "regressions": regressions
+    }, indent=2))
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
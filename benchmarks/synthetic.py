@@ -0,0 +1,94 @@
+import base64
+import json
+import cv2
+import numpy as np
+from typing import List, Tuple
+
+def synthetic_screen(rng: np.random.Generator, size: Tuple[int, int] = (1280, 720)) -> np.ndarray:
+    """A flat UI-like BGR frame: a background colour with a few panels."""
+    width, height = size
+    background = np.empty((height, width, 3), dtype=np.uint8)
+    background[:] = rng.integers(0, 256, 3, dtype=np.uint8)
+    # A few panels and text-like bars so the frame is not a solid colour
+    for _ in range(6):
+        x, y = int(rng.integers(0, width - 100)), int(rng.integers(0, height - 60))
+        w, h = int(rng.integers(80, width // 2)), int(rng.integers(40, height // 3))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(background, (x, y), (x + w, y + h), color, -1)
+    return background
+
+def make_synthetic_video(
+    output_path: str,
+    duration: float = 60.0,
+    fps: float = 30.0,
+    size: Tuple[int, int] = (1280, 720),
+    scene_length: float = 5.0,
+    seed: int = 0
+) -> List[int]:
+    """
+    Write a screen-recording-like video: flat UI panels that change completely
+    every scene_length seconds, with a small moving cursor in between.
+    Returns the frame indices of the scene cuts.
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise ValueError(f"Failed to open video writer: {output_path}")
+
+    total_frames = int(duration * fps)
+    frames_per_scene = max(1, int(scene_length * fps))
+    cuts = []
+    background = None
+
+    for i in range(total_frames):
+        if i % frames_per_scene == 0:
+            background = synthetic_screen(rng, size)
+            if i > 0:
+                cuts.append(i)
+
+        frame = background.copy()
+        cursor = (int((i * 7) % width), int((i * 3) % height))
+        cv2.circle(frame, cursor, 6, (255, 255, 255), -1)
+        writer.write(frame)
+
+    writer.release()
+    return cuts
+
+def make_procedure_data(
+    output_path: str,
+    steps: int = 100,
+    size: Tuple[int, int] = (1280, 720),
+    distinct_images: int = 20,
+    image_scale: int = 70,
+    seed: int = 0
+) -> None:
+    """
+    Write generate_word.py input: a procedure with one JPEG frame (as a data
+    URL) per step, cycling through distinct_images different screens.
+    """
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(distinct_images):
+        _, buffer = cv2.imencode(".jpg", synthetic_screen(rng, size), [cv2.IMWRITE_JPEG_QUALITY, 95])
+        images.append("data:image/jpeg;base64," + base64.b64encode(buffer.tobytes()).decode("ascii"))
+
+    procedure = {
+        "title": "Synthetic procedure",
+        "overview": "A generated procedure used to benchmark the Word export.",
+        "prerequisites": ["Administrator access"],
+        "steps": [
+            {
+                "main": f"Perform action number {i + 1} in the configuration dialog",
+                "sub": ["Click the highlighted button", "Confirm the change"],
+                "warnings": ["Do not close the window while the change is applied"],
+                "tips": ["Press Ctrl+Z to undo the last change"],
+                "frames": [{"image": images[i % distinct_images], "timestamp": f"00:{i // 60 % 60:02d}:{i % 60:02d}"}]
+            }
+            for i in range(steps)
+        ],
+        "verification": "Every change is listed in the audit log.",
+        "troubleshooting": ["Change not applied: repeat the step"]
+    }
+    with open(output_path, "w") as f:
+        json.dump({"procedure": procedure, "imageScale": image_scale}, f)
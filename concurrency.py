@@ -0,0 +1,29 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+def ordered_map(func: Callable[[Any], Any], items: Iterable, workers: int = 1,
+                queue_size: Optional[int] = None) -> Iterator:
+    """
+    Yield func(item) for each item, in order, computing up to queue_size of
+    them ahead in a pool of workers threads.
+
+    items is consumed lazily on the calling thread, so a decoder feeding it
+    keeps decoding while the pool resizes and encodes (cv2 and Pillow release
+    the GIL), and stops once queue_size results are waiting; only those are
+    held in memory. Results are yielded as soon as the oldest one is ready.
+    With workers <= 1 this is a plain map.
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    queue_size = max(queue_size or 2 * workers, 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            while pending and (len(pending) >= queue_size or pending[0].done()):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
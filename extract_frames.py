@@ -1,9 +1,17 @@
 import argparse
 import json
 import sys
-from typing import List, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple, Iterable, Iterator, TextIO
 from dataclasses import dataclass
-from video_utils import extract_key_frames, detect_scene_changes, capture_frame_at_timestamp
+import jobs
+import tracing
+import worker
+
+# video_utils pulls in OpenCV and NumPy; it is imported where frames are
+# actually decoded so --help and worker-forwarded runs start fast.
+if TYPE_CHECKING:
+    from frame_cache import FrameCache
+    from video_utils import EncodeOptions, VideoSource
 
 @dataclass
 class TimestampMark:
@@ -12,89 +20,209 @@ class TimestampMark:
     frame_path: Optional[str]
     target_size: Optional[Tuple[int, int]] = None  # (width, height)
 
+def _marked_frame(mark: TimestampMark, frame_data: Dict) -> Dict:
+    return {
+        'timestamp': mark.timestamp,
+        'frame_path': frame_data['frame_path'],
+        'description': mark.description,
+        'width': frame_data['width'],
+        'height': frame_data['height']
+    }
+
+def iter_marked_timestamps(
+    video_path: "VideoSource",
+    timestamps: List[TimestampMark],
+    max_width: Optional[int] = None,
+    max_height: Optional[int] = None,
+    target_size: Optional[Tuple[int, int]] = None,
+    cache: Optional["FrameCache"] = None,
+    encoding: Optional["EncodeOptions"] = None
+) -> Iterator[Dict]:
+    """
+    Capture frames at specific timestamps, yielding frame information in
+    decode (ascending timestamp) order as each frame is encoded. Each frame
+    has an "index": its position in timestamps, which is the order
+    capture_marked_timestamps returns.
+    """
+    from video_utils import iter_frames_at_timestamps
+
+    for i, frame_data in iter_frames_at_timestamps(
+        video_path,
+        [mark.timestamp for mark in timestamps],
+        descriptions=[mark.description for mark in timestamps],
+        max_width=max_width,
+        max_height=max_height,
+        target_sizes=[mark.target_size or target_size for mark in timestamps],
+        cache=cache,
+        encoding=encoding
+    ):
+        yield {'index': i, **_marked_frame(timestamps[i], frame_data)}
+
 def capture_marked_timestamps(
-    video_path: str, 
+    video_path: "VideoSource",
     timestamps: List[TimestampMark],
     max_width: Optional[int] = None,
     max_height: Optional[int] = None,
-    target_size: Optional[Tuple[int, int]] = None
+    target_size: Optional[Tuple[int, int]] = None,
+    cache: Optional["FrameCache"] = None,
+    encoding: Optional["EncodeOptions"] = None
 ) -> List[Dict]:
     """
-    Capture frames at specific timestamps and return frame information.
+    Capture frames at specific timestamps and return frame information in
+    the order of timestamps, recording each mark's frame_path.
     Optionally resize images to fit within max dimensions while preserving aspect ratio.
     """
-    captured_frames = []
-    for mark in timestamps:
-        frame_data = capture_frame_at_timestamp(
-            video_path, 
-            mark.timestamp,
-            description=mark.description,
-            max_width=max_width,
-            max_height=max_height,
-            target_size=mark.target_size or target_size
-        )
-        mark.frame_path = frame_data['frame_path']
-        captured_frames.append({
-            'timestamp': mark.timestamp,
-            'frame_path': frame_data['frame_path'],
-            'description': mark.description,
-            'width': frame_data['width'],
-            'height': frame_data['height']
-        })
+    captured_frames = [None] * len(timestamps)
+    for frame in iter_marked_timestamps(video_path, timestamps, max_width, max_height, target_size, cache, encoding):
+        i = frame.pop('index')
+        timestamps[i].frame_path = frame['frame_path']
+        captured_frames[i] = frame
     return captured_frames
 
-def main():
+def write_ndjson(frames: Iterable[Dict], stream: TextIO = sys.stdout) -> int:
+    """
+    Write each frame as one JSON line and flush it immediately, so the reader
+    sees frames as they are extracted. Returns the number of frames written.
+    """
+    count = 0
+    for frame in frames:
+        stream.write(json.dumps(frame))
+        stream.write("\n")
+        stream.flush()
+        count += 1
+    return count
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Extract frames from video")
     parser.add_argument("video_path", help="Path to the video file")
     parser.add_argument("--mode", 
-                       choices=["keyframes", "scenes", "timestamps"], 
+                       choices=["keyframes", "scenes", "timestamps", "thumbnails"], 
                        default="keyframes",
-                       help="Frame extraction mode: keyframes, scenes, or timestamps")
+                       help="Frame extraction mode: keyframes, scenes, timestamps, or thumbnails (from the thumbnail index)")
     parser.add_argument("--num-frames", type=int, default=5,
                       help="Number of frames to extract in keyframes mode")
     parser.add_argument("--threshold", type=float, default=30.0,
                       help="Threshold for scene change detection")
+    parser.add_argument("--fast", action="store_true",
+                      help="Scenes mode: compare downscaled thumbnails of every Nth frame")
+    parser.add_argument("--stride", type=int, default=5,
+                      help="Scenes mode with --fast: compare every Nth frame")
+    parser.add_argument("--thumbnail-width", type=int, default=64,
+                      help="Scenes mode with --fast: width of comparison thumbnails")
+    parser.add_argument("--workers", type=int, default=1,
+                      help="Scenes mode: number of processes scanning the video in parallel")
     parser.add_argument("--timestamps", type=str,
                       help="JSON file containing timestamp marks (for timestamps mode)")
     parser.add_argument("--max-width", type=int,
                       help="Maximum width for captured frames")
     parser.add_argument("--max-height", type=int,
                       help="Maximum height for captured frames")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json",
+                      help="Output a single JSON array, or one JSON object per line as frames are extracted "
+                           "(in timestamps mode in video order, with each frame's position in the input as \"index\")")
+    parser.add_argument("--image-format", choices=["jpeg", "webp"], default="jpeg",
+                      help="Encoding of the captured frames")
+    parser.add_argument("--quality", type=int,
+                      help="Encoding quality 1-100 (default: 95 for JPEG, 80 for WebP)")
+    parser.add_argument("--encode-workers", type=int, default=1,
+                      help="Threads resizing and encoding frames while the video keeps decoding")
+    parser.add_argument("--dedup", action="store_true",
+                      help="Keyframes/scenes modes: drop frames that look like an already extracted frame")
+    parser.add_argument("--dedup-distance", type=int, default=6,
+                      help="With --dedup, maximum perceptual-hash Hamming distance (of 64 bits) counted as a duplicate")
+    parser.add_argument("--index", action="store_true",
+                      help="Keyframes/scenes modes: use the video's thumbnail index (built on first use); "
+                           "keyframes become suggested frames at the biggest visual changes")
+    parser.add_argument("--index-dir", type=str,
+                      help="Directory of thumbnail indexes (default: ~/.cache/video-frames/index)")
+    parser.add_argument("--index-interval", type=float, default=1.0,
+                      help="Seconds between thumbnail index samples")
+    parser.add_argument("--index-width", type=int, default=96,
+                      help="Width of thumbnail index samples")
+    parser.add_argument("--frame-cache", type=str,
+                      help="Write frames as image files to this cache directory and output their paths instead of base64 "
+                           "(generate_word.py reads them from $VIDEO_FRAME_CACHE)")
+    parser.add_argument("--frame-cache-max-mb", type=int, default=1024,
+                      help="Size limit of the frame cache directory; least recently used frames are evicted")
+    parser.add_argument("--frame-url-prefix", type=str,
+                      help="With --frame-cache, output URLs under this prefix instead of file paths "
+                           "(generate_word.py maps them back with $VIDEO_FRAME_URL_PREFIX)")
     
-    args = parser.parse_args()
-    
-    try:
-        print(f"Processing video: {args.video_path}", file=sys.stderr)
-        print(f"Mode: {args.mode}", file=sys.stderr)
+    return parser.parse_args(argv)
+
+def iter_frames(args: argparse.Namespace) -> Iterator[Dict]:
+    """
+    Run the extraction described by parsed command-line args, yielding
+    frames as they are produced.
+    """
+    from frame_cache import FrameCache
+    from video_utils import EncodeOptions, FrameDeduplicator, VideoSession, iter_key_frames, iter_scene_changes
 
-        frames = []
-        if args.mode == "keyframes":
+    print(f"Processing video: {args.video_path}", file=sys.stderr)
+    print(f"Mode: {args.mode}", file=sys.stderr)
+
+    cache = None
+    if args.frame_cache:
+        cache = FrameCache(
+            args.frame_cache,
+            max_bytes=args.frame_cache_max_mb * 1024 * 1024,
+            url_prefix=args.frame_url_prefix
+        )
+    encoding = EncodeOptions(format=args.image_format, quality=args.quality, workers=args.encode_workers)
+    dedup = FrameDeduplicator(args.dedup_distance) if args.dedup else None
+
+    with VideoSession(args.video_path) as session:
+        index = None
+        if args.index or args.mode == "thumbnails":
+            from thumbnail_index import get_index
+            index = get_index(session, args.index_dir, args.index_interval, args.index_width)
+
+        if args.mode == "thumbnails":
+            from thumbnail_index import iter_thumbnails
+
+            timestamps = None
+            if args.timestamps:
+                with open(args.timestamps) as f:
+                    timestamps = [mark['timestamp'] for mark in json.load(f)]
+            yield from iter_thumbnails(index, timestamps, encoding)
+
+        elif args.mode == "keyframes":
             print(f"Num frames: {args.num_frames}", file=sys.stderr)
-            frames = extract_key_frames(
-                args.video_path, 
+            yield from iter_key_frames(
+                session,
                 args.num_frames,
                 max_width=args.max_width,
-                max_height=args.max_height
+                max_height=args.max_height,
+                cache=cache,
+                encoding=encoding,
+                dedup=dedup,
+                index=index
             )
-            print(f"Extracted {len(frames)} key frames", file=sys.stderr)
-        
+
         elif args.mode == "scenes":
             print(f"Threshold: {args.threshold}", file=sys.stderr)
-            frames = detect_scene_changes(
-                args.video_path, 
+            yield from iter_scene_changes(
+                session,
                 args.threshold,
                 max_width=args.max_width,
-                max_height=args.max_height
+                max_height=args.max_height,
+                fast=args.fast,
+                stride=args.stride,
+                thumbnail_width=args.thumbnail_width,
+                workers=args.workers,
+                cache=cache,
+                encoding=encoding,
+                dedup=dedup,
+                index=index
             )
-            print(f"Detected {len(frames)} scene changes", file=sys.stderr)
-        
+
         elif args.mode == "timestamps":
             if not args.timestamps:
                 raise ValueError("Timestamps file must be provided in timestamps mode")
-            
+
             with open(args.timestamps) as f:
                 timestamp_data = json.load(f)
-            
+
             timestamp_marks = [
                 TimestampMark(
                     timestamp=mark['timestamp'],
@@ -103,20 +231,50 @@ def main():
                     target_size=mark.get('target_size')
                 ) for mark in timestamp_data
             ]
-            
-            frames = capture_marked_timestamps(
-                args.video_path, 
-                timestamp_marks,
-                max_width=args.max_width,
-                max_height=args.max_height
-            )
-            print(f"Captured {len(frames)} frames at marked timestamps", file=sys.stderr)
-        
-        if not frames:
-            print("Warning: No frames were extracted", file=sys.stderr)
-            frames = []
-        
-        print(json.dumps(frames))
+
+            if args.format == "ndjson":
+                yield from iter_marked_timestamps(
+                    session,
+                    timestamp_marks,
+                    max_width=args.max_width,
+                    max_height=args.max_height,
+                    cache=cache,
+                    encoding=encoding
+                )
+            else:
+                yield from capture_marked_timestamps(
+                    session,
+                    timestamp_marks,
+                    max_width=args.max_width,
+                    max_height=args.max_height,
+                    cache=cache,
+                    encoding=encoding
+                )
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    
+    try:
+        with tracing.invocation("extract_frames", mode=args.mode):
+            sock = worker.connect()
+            if sock is not None:
+                # A warm worker process does the extraction; we only relay frames
+                frames = worker.stream(sock, "extract_frames", vars(args))
+            else:
+                frames = iter_frames(args)
+            frames = jobs.track(frames, "Frames extracted")
+
+            if args.format == "ndjson":
+                # Frames are decoded, encoded and written one at a time
+                count = write_ndjson(frames)
+            else:
+                frames = list(frames)
+                count = len(frames)
+                print(json.dumps(frames))
+
+            print(f"Wrote {count} frames", file=sys.stderr)
+            if not count:
+                print("Warning: No frames were extracted", file=sys.stderr)
     
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
@@ -125,4 +283,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
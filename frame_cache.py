@@ -0,0 +1,291 @@
+import contextlib
+import fcntl
+import functools
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from hashing import file_fingerprint, hash_file, hash_text
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "video-frames"
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB
+# Videos remembered in video_hashes.json; the oldest are forgotten first
+MAX_HASH_INDEX_ENTRIES = 4096
+# Where consumers of cached frames (generate_word.py) look for them
+CACHE_DIR_ENV = "VIDEO_FRAME_CACHE"
+URL_PREFIX_ENV = "VIDEO_FRAME_URL_PREFIX"
+
+def jpeg_size(path: str) -> Tuple[int, int]:
+    """
+    Read (width, height) from a JPEG's SOF header without decoding the image.
+    """
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            raise ValueError(f"Not a JPEG file: {path}")
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                raise ValueError(f"No frame header found in JPEG: {path}")
+            code = marker[1]
+            if code == 0xFF:
+                # Fill byte; the real marker code follows
+                f.seek(-1, os.SEEK_CUR)
+                continue
+            (length,) = struct.unpack(">H", f.read(2))
+            # SOF0-SOF15, excluding DHT (C4), JPG (C8) and DAC (CC)
+            if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                _, height, width = struct.unpack(">BHH", f.read(5))
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+def webp_size(path: str) -> Tuple[int, int]:
+    """
+    Read (width, height) from a WebP file's first chunk (VP8, VP8L or VP8X)
+    without decoding the image.
+    """
+    with open(path, "rb") as f:
+        header = f.read(30)
+    if len(header) < 30 or header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+        raise ValueError(f"Not a WebP file: {path}")
+
+    chunk = header[12:16]
+    if chunk == b"VP8 ":
+        # Lossy: 14-bit dimensions after the key frame start code
+        width, height = struct.unpack("<HH", header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        # Lossless: 14-bit width-1 and height-1 packed after the signature byte
+        (bits,) = struct.unpack("<I", header[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        # Extended: 24-bit canvas width-1 and height-1
+        width = int.from_bytes(header[24:27], "little") + 1
+        height = int.from_bytes(header[27:30], "little") + 1
+        return width, height
+    raise ValueError(f"Unknown WebP chunk {chunk!r}: {path}")
+
+def image_size(path: str) -> Tuple[int, int]:
+    """(width, height) of a cached JPEG or WebP frame, read from its header."""
+    if path.endswith(".webp"):
+        return webp_size(path)
+    return jpeg_size(path)
+
+class FrameCache:
+    """
+    Content-addressed store of encoded frames on disk.
+
+    Frames are keyed by a hash of the video's contents plus the frame index
+    and output size parameters, so the same frame requested again (from the
+    same or a renamed copy of the video) is served from disk without
+    decoding. The directory is bounded to max_bytes with least-recently-used
+    eviction, using file mtimes as the access clock.
+
+    put() may be called from several threads at once (the encode pool in
+    video_utils); size accounting and eviction are serialized.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        url_prefix: Optional[str] = None
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.url_prefix = url_prefix
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._size = None
+        self._lock = threading.Lock()
+
+    @property
+    def _hash_index_path(self) -> Path:
+        return self.cache_dir / "video_hashes.json"
+
+    @contextlib.contextmanager
+    def _hash_index_lock(self):
+        # flock is per open file, so this serializes threads as well as processes
+        with open(self.cache_dir / "video_hashes.lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _read_hash_index(self) -> Dict[str, str]:
+        try:
+            with open(self._hash_index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def video_hash(self, video_path: str) -> str:
+        """
+        Content hash of video_path, memoized on disk by path, size and mtime
+        so large files are only read once.
+        """
+        fingerprint = file_fingerprint(video_path)
+        digest = self._read_hash_index().get(fingerprint)
+        if digest is not None:
+            return digest
+
+        print(f"Hashing video contents: {video_path}", file=sys.stderr)
+        digest = hash_file(video_path)
+        # Hashing is done unlocked; the index is re-read under the lock so
+        # entries other extractions added meanwhile are kept
+        with self._hash_index_lock():
+            index = self._read_hash_index()
+            index.pop(fingerprint, None)
+            index[fingerprint] = digest
+            for stale in list(index)[:-MAX_HASH_INDEX_ENTRIES]:
+                del index[stale]
+            self._write_atomic(self._hash_index_path, json.dumps(index).encode("utf-8"))
+        return digest
+
+    def key(
+        self,
+        video_hash: str,
+        frame_index: int,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        target_size: Optional[Tuple[int, int]] = None,
+        ext: str = ".jpg",
+        quality: Optional[int] = None
+    ) -> str:
+        target = "x".join(str(v) for v in target_size) if target_size else None
+        # quality is only part of the key when set, so default-quality keys are unchanged
+        extra = [str(quality)] if quality is not None else []
+        return hash_text(video_hash, str(frame_index), str(max_width), str(max_height), target, ext, *extra)[:32]
+
+    def path_for(self, key: str, ext: str = ".jpg") -> Path:
+        return self.cache_dir / key[:2] / f"{key}{ext}"
+
+    def reference(self, path: Path) -> str:
+        """The string handed back to callers: a URL if url_prefix is set, else the path."""
+        if self.url_prefix:
+            return f"{self.url_prefix.rstrip('/')}/{path.relative_to(self.cache_dir).as_posix()}"
+        return str(path)
+
+    def resolve(self, reference: str) -> Optional[Path]:
+        """
+        The cached frame a reference() string names: a URL under
+        url_prefix or the path of a frame file in the cache directory.
+        Anything else gives None; paths are resolved first, so ".." and
+        symlinks cannot lead out of the cache.
+        """
+        if self.url_prefix and reference.startswith(self.url_prefix.rstrip("/") + "/"):
+            reference = str(self.cache_dir / reference[len(self.url_prefix.rstrip("/")) + 1:])
+        elif not os.path.isfile(reference):
+            return None
+
+        root = self.cache_dir.resolve()
+        path = Path(reference).resolve()
+        if path.parent.parent != root:
+            return None
+        return path
+
+    def get(self, key: str, ext: str = ".jpg") -> Optional[Path]:
+        """Return the cached file for key, marking it recently used, or None."""
+        path = self.path_for(key, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, data: bytes, ext: str = ".jpg") -> Path:
+        """
+        Store encoded image bytes under key and evict old entries if needed.
+        Keys are content-addressed, so a key that is already stored is only
+        marked recently used; rewriting it would count its size twice.
+        """
+        existing = self.get(key, ext)
+        if existing is not None:
+            return existing
+        path = self.path_for(key, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(path, data)
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+            if self.current_size() > self.max_bytes:
+                self.evict()
+        return path
+
+    def current_size(self) -> int:
+        if self._size is None:
+            total = 0
+            for path in self._entries():
+                try:
+                    total += path.stat().st_size
+                except FileNotFoundError:
+                    continue
+            self._size = total
+        return self._size
+
+    def evict(self) -> int:
+        """
+        Delete least-recently-used entries until the cache is at most 90% of
+        max_bytes. Returns the number of files removed.
+        """
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        self._size = total
+        if removed:
+            print(f"Evicted {removed} cached frames", file=sys.stderr)
+        return removed
+
+    def _entries(self):
+        # Files still being written by _write_atomic are not entries yet
+        return (p for p in self.cache_dir.glob("??/*") if not p.name.startswith(".tmp-") and p.is_file())
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def __getstate__(self) -> Dict:
+        # Worker processes recount their own view of the directory size
+        state = self.__dict__.copy()
+        state["_size"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def configured_cache() -> FrameCache:
+    """The frame cache named by $VIDEO_FRAME_CACHE and $VIDEO_FRAME_URL_PREFIX."""
+    return FrameCache(os.environ.get(CACHE_DIR_ENV), url_prefix=os.environ.get(URL_PREFIX_ENV))
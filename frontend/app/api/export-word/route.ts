@@ -1,46 +1,42 @@
 import { NextResponse } from 'next/server';
-import { spawn } from 'child_process';
-import { writeFile, unlink } from 'fs/promises';
+import { createReadStream } from 'fs';
+import { writeFile, stat } from 'fs/promises';
 import path from 'path';
+import { Readable } from 'stream';
+import { createJob, removeJob, spawnJob, busyResponse, QUEUE_FULL_EXIT_CODE } from '../../../lib/jobs';
 
 export async function POST(request: Request) {
   try {
     const data = await request.json();
     
-    // Write procedure data to temporary file
-    const tempDataFile = path.join(process.cwd(), '..', 'temp_procedure.json');
+    // Write procedure data to a directory of this request's own, so
+    // concurrent exports never collide
+    const job = await createJob(request.headers.get('x-job-id'));
+    const tempDataFile = path.join(job.scratchDir, 'procedure.json');
     await writeFile(tempDataFile, JSON.stringify(data));
+    const tempOutputFile = path.join(job.scratchDir, 'procedure.docx');
 
-    // Run Python script to generate Word document
-    const pythonProcess = spawn('python3', [
-      'generate_word.py',
-      tempDataFile
-    ], {
-      cwd: path.join(process.cwd(), '..'),
-    });
+    // Run Python script to generate Word document straight into a file,
+    // once the job queue has a free slot for it
+    const pythonProcess = spawnJob(job, 'generate_word', [
+      tempDataFile,
+      tempOutputFile
+    ]);
 
     return new Promise((resolve) => {
-      let outputBuffer = Buffer.alloc(0);
       let errorOutput = '';
 
-      pythonProcess.stdout.on('data', (data) => {
-        outputBuffer = Buffer.concat([outputBuffer, data]);
-      });
-
       pythonProcess.stderr.on('data', (data) => {
         errorOutput += data.toString();
         console.error('Python stderr:', data.toString());
       });
 
       pythonProcess.on('close', async (code) => {
-        // Clean up temporary file
-        try {
-          await unlink(tempDataFile);
-        } catch (err) {
-          console.error('Error cleaning up temp file:', err);
-        }
-
-        if (code !== 0) {
+        if (code === QUEUE_FULL_EXIT_CODE) {
+          await removeJob(job);
+          resolve(busyResponse(errorOutput));
+        } else if (code !== 0) {
+          await removeJob(job);
           resolve(
             NextResponse.json(
               { error: 'Word document generation failed', details: errorOutput },
@@ -48,9 +44,15 @@ export async function POST(request: Request) {
             )
           );
         } else {
-          // Return the Word document as a downloadable file
-          const response = new NextResponse(outputBuffer);
+          // Stream the Word document back as a downloadable file
+          const { size } = await stat(tempOutputFile);
+          const fileStream = createReadStream(tempOutputFile);
+          fileStream.on('close', () => {
+            removeJob(job);
+          });
+          const response = new NextResponse(Readable.toWeb(fileStream) as ReadableStream);
           response.headers.set('Content-Type', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document');
+          response.headers.set('Content-Length', size.toString());
           response.headers.set('Content-Disposition', 'attachment; filename="procedure.docx"');
           resolve(response);
         }
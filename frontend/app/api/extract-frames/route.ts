@@ -1,14 +1,14 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { spawn } from 'child_process';
-import { writeFile, access, unlink } from 'fs/promises';
+import { writeFile } from 'fs/promises';
 import path from 'path';
-import { constants } from 'fs';
+import { createJob, removeJob, saveUpload, spawnJob, busyResponse, QUEUE_FULL_EXIT_CODE } from '../../../lib/jobs';
 
 export async function POST(request: Request) {
   try {
     // Check if the request is JSON or FormData
     const contentType = request.headers.get('content-type');
-    let file: File;
+    let file: File | null = null;
+    let jobIdField: string | null = null;
     let mode = 'timestamps';
     let numFrames = 5;
     let threshold = 30.0;
@@ -20,7 +20,8 @@ export async function POST(request: Request) {
       timestamps = data.timestamps || [];
       targetSize = data.targetSize;
       
-      // For JSON requests, we need the video file from the timestamps
+      // A JSON body cannot carry the video, so it is rejected below once
+      // the timestamps are checked
       if (timestamps.length === 0) {
         return NextResponse.json(
           { error: 'No timestamps provided' },
@@ -28,18 +29,34 @@ export async function POST(request: Request) {
         );
       }
     } else {
-      // Handle FormData as before
+      // Handle FormData as before; timestamps mode sends its marks as JSON fields
       const formData = await request.formData();
       file = formData.get('file') as File;
+      jobIdField = formData.get('jobId') as string;
       mode = formData.get('mode') as string || 'keyframes';
       numFrames = parseInt(formData.get('numFrames') as string || '5');
       threshold = parseFloat(formData.get('threshold') as string || '30.0');
+      timestamps = JSON.parse(formData.get('timestamps') as string || '[]');
+      targetSize = JSON.parse(formData.get('targetSize') as string || 'null');
     }
 
-    // Build Python script arguments
+    if (!file) {
+      return NextResponse.json(
+        { error: 'No video file provided; send it as multipart form data in the "file" field' },
+        { status: 400 }
+      );
+    }
+
+    // Save the uploaded video in a directory of its own, so concurrent
+    // requests never collide
+    const job = await createJob(jobIdField);
+    const videoPath = await saveUpload(job, file, 'video.mp4');
+
+    // Build extract_frames.py arguments
     const pythonArgs = [
-      'extract_frames.py',
-      '--mode', mode
+      videoPath,
+      '--mode', mode,
+      '--format', 'ndjson'
     ];
 
     if (mode === 'keyframes') {
@@ -53,67 +70,97 @@ export async function POST(request: Request) {
         target_size: targetSize ? [targetSize.width, targetSize.height] : undefined
       }));
       
-      const timestampFile = path.join(process.cwd(), '..', 'temp_timestamps.json');
+      const timestampFile = path.join(job.scratchDir, 'timestamps.json');
       await writeFile(timestampFile, JSON.stringify(timestampsWithSize));
       pythonArgs.push('--timestamps', timestampFile);
     }
 
     console.log('Running Python script with args:', pythonArgs);
 
-    return new Promise((resolve) => {
-      const pythonProcess = spawn('python3', pythonArgs, {
-        cwd: path.join(process.cwd(), '..'),
-      });
-
-      let output = '';
-      let errorOutput = '';
-
-      pythonProcess.stdout.on('data', (data) => {
-        output += data.toString();
-        console.log('Python stdout:', data.toString());
-      });
-
-      pythonProcess.stderr.on('data', (data) => {
-        errorOutput += data.toString();
-        console.error('Python stderr:', data.toString());
-      });
-
-      pythonProcess.on('close', async (code) => {
-        // Clean up temporary files
-        if (mode === 'timestamps') {
-          try {
-            await unlink(path.join(process.cwd(), '..', 'temp_timestamps.json'));
-          } catch (err) {
-            console.error('Error cleaning up timestamp file:', err);
+    // Runs once the job queue has a free slot for it
+    const pythonProcess = spawnJob(job, 'extract_frames', pythonArgs);
+    // Decode as a stream so a character split across chunks stays intact
+    pythonProcess.stdout.setEncoding('utf8');
+
+    let errorOutput = '';
+    let cancelled = false;
+    // Settles with 'running' on the first frame, or the exit code if the
+    // process ends first (rejected by the queue, failed, or no frames)
+    let settle: (state: number | null | 'running') => void = () => {};
+    const started = new Promise<number | null | 'running'>((resolve) => { settle = resolve; });
+
+    // Frames arrive as one JSON object per line and are forwarded as soon as
+    // each line is complete, so neither this process nor the browser holds
+    // more than a few of them
+    const encoder = new TextEncoder();
+    const body = new ReadableStream<Uint8Array>({
+      start(controller) {
+        let pending = '';
+
+        pythonProcess.stdout.on('data', (data: string) => {
+          pending += data;
+          const newline = pending.lastIndexOf('\n');
+          if (newline === -1 || cancelled) {
+            return;
           }
-        }
-
-        if (code !== 0) {
-          resolve(
-            NextResponse.json(
-              { error: 'Frame extraction failed', details: errorOutput },
-              { status: 500 }
-            )
-          );
-        } else {
-          try {
-            const frames = JSON.parse(output);
-            resolve(
-              NextResponse.json(
-                { frames },
-                { status: 200 }
-              )
-            );
-          } catch (parseError) {
-            resolve(
-              NextResponse.json(
-                { error: 'Invalid response format', details: output },
-                { status: 500 }
-              )
-            );
+          controller.enqueue(encoder.encode(pending.slice(0, newline + 1)));
+          pending = pending.slice(newline + 1);
+          settle('running');
+          if ((controller.desiredSize ?? 1) <= 0) {
+            pythonProcess.stdout.pause();
           }
-        }
-      });
+        });
+
+        pythonProcess.stderr.on('data', (data) => {
+          errorOutput += data.toString();
+          console.error('Python stderr:', data.toString());
+        });
+
+        pythonProcess.on('close', async (code) => {
+          // Clean up temporary files
+          await removeJob(job);
+
+          if (!cancelled) {
+            if (pending.trim()) {
+              controller.enqueue(encoder.encode(pending + '\n'));
+            }
+            if (code !== 0) {
+              // Frames already sent cannot be taken back, so a failure after
+              // the first one is reported as a last line
+              controller.enqueue(encoder.encode(
+                JSON.stringify({ error: 'Frame extraction failed', details: errorOutput }) + '\n'
+              ));
+            }
+            controller.close();
+          }
+          settle(code);
+        });
+      },
+      pull() {
+        pythonProcess.stdout.resume();
+      },
+      cancel() {
+        cancelled = true;
+        pythonProcess.kill();
+      }
+    }, new CountQueuingStrategy({ highWaterMark: 16 }));
+
+    const state = await started;
+    if (state === QUEUE_FULL_EXIT_CODE) {
+      return busyResponse(errorOutput);
+    } else if (state !== 'running' && state !== 0) {
+      return NextResponse.json(
+        { error: 'Frame extraction failed', details: errorOutput },
+        { status: 500 }
+      );
+    }
+
+    return new Response(body, {
+      status: 200,
+      headers: {
+        'Content-Type': 'application/x-ndjson',
+        'X-Job-Id': job.id
+      }
     });
   } catch (error) {
     console.error('Error processing request:', error);
@@ -0,0 +1,45 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { spawn } from 'child_process';
+import { jobId, repoRoot } from '../../../lib/jobs';
+
+// Status of queued and running jobs (or of one job with ?id=...), with each
+// job's queue position and progress, as reported by jobs.py
+export async function GET(request: NextRequest) {
+  const id = request.nextUrl.searchParams.get('id');
+  const pythonArgs = ['jobs.py', 'status'];
+  if (id) {
+    if (jobId(id) !== id) {
+      return NextResponse.json({ error: 'Invalid job id' }, { status: 400 });
+    }
+    pythonArgs.push(id);
+  }
+
+  return new Promise<NextResponse>((resolve) => {
+    const pythonProcess = spawn('python3', pythonArgs, { cwd: repoRoot });
+
+    let output = '';
+    let errorOutput = '';
+
+    pythonProcess.stdout.on('data', (data) => {
+      output += data.toString();
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      errorOutput += data.toString();
+    });
+
+    pythonProcess.on('close', (code) => {
+      if (code !== 0) {
+        resolve(
+          NextResponse.json(
+            { error: id ? 'Job not found' : 'Job status unavailable', details: errorOutput },
+            { status: id ? 404 : 500 }
+          )
+        );
+        return;
+      }
+      const result = JSON.parse(output);
+      resolve(NextResponse.json(id ? { job: result } : { jobs: result }, { status: 200 }));
+    });
+  });
+}
@@ -1,7 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { spawn } from 'child_process';
 import { writeFile } from 'fs/promises';
 import path from 'path';
+import { createJob, removeJob, saveUpload, spawnJob, busyResponse, QUEUE_FULL_EXIT_CODE } from '../../../lib/jobs';
 
 export async function POST(request: NextRequest) {
   try {
@@ -18,25 +18,21 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // Save the uploaded video file
-    const bytes = await file.arrayBuffer();
-    const buffer = Buffer.from(bytes);
-    const tempFilePath = path.join(process.cwd(), '..', file.name);
-    await writeFile(tempFilePath, buffer);
+    // Save the uploaded video file in a directory of its own, so concurrent
+    // requests never collide
+    const job = await createJob(formData.get('jobId') as string);
+    const tempFilePath = await saveUpload(job, file, 'video.mp4');
 
     // Save the PDF file if provided
     let tempPdfPath = '';
     if (pdfFile) {
-      const pdfBytes = await pdfFile.arrayBuffer();
-      const pdfBuffer = Buffer.from(pdfBytes);
-      tempPdfPath = path.join(process.cwd(), '..', pdfFile.name);
-      await writeFile(tempPdfPath, pdfBuffer);
+      tempPdfPath = await saveUpload(job, pdfFile, 'context.pdf');
     }
 
     // If custom prompt provided, save it temporarily
     let tempPromptPath: string;
     if (customPrompt) {
-      tempPromptPath = path.join(process.cwd(), '..', 'temp_procedure_prompt.txt');
+      tempPromptPath = path.join(job.scratchDir, 'prompt.txt');
       await writeFile(tempPromptPath, customPrompt);
     } else {
       // Use the default prompt from frontend/public/prompts directory
@@ -46,9 +42,8 @@ export async function POST(request: NextRequest) {
       }
     }
 
-    // Build Python script arguments - flags must come before positional arguments
+    // Build main.py arguments - flags must come before positional arguments
     const pythonArgs = [
-      'main.py',
       '--mode', 'procedure',
       '--model', model
     ];
@@ -63,9 +58,8 @@ export async function POST(request: NextRequest) {
 
     // Run Python script with the video file path, prompt path, and optional PDF path as arguments
     return new Promise((resolve) => {
-      const pythonProcess = spawn('python3', pythonArgs, {
-        cwd: path.join(process.cwd(), '..'),
-      });
+      // Runs once the job queue has a free slot for it
+      const pythonProcess = spawnJob(job, 'process_video', pythonArgs);
 
       let output = '';
       let errorOutput = '';
@@ -79,21 +73,13 @@ export async function POST(request: NextRequest) {
         console.error('Python error:', errorOutput);
       });
 
-      pythonProcess.on('close', (code) => {
+      pythonProcess.on('close', async (code) => {
         // Clean up temporary files
-        const filesToRemove = [tempFilePath];
-        if (customPrompt) {
-          filesToRemove.push(tempPromptPath);
-        }
-        if (pdfFile) {
-          filesToRemove.push(tempPdfPath);
-        }
-        
-        spawn('rm', filesToRemove, {
-          cwd: path.join(process.cwd(), '..'),
-        });
+        await removeJob(job);
 
-        if (code !== 0) {
+        if (code === QUEUE_FULL_EXIT_CODE) {
+          resolve(busyResponse(errorOutput));
+        } else if (code !== 0) {
           resolve(
             NextResponse.json(
               { error: 'Procedure generation failed', details: errorOutput },
@@ -106,7 +92,7 @@ export async function POST(request: NextRequest) {
             const procedure = JSON.parse(output);
             resolve(
               NextResponse.json(
-                { procedure },
+                { procedure, job_id: job.id },
                 { status: 200 }
               )
             );
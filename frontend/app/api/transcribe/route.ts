@@ -1,7 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { spawn } from 'child_process';
 import { writeFile } from 'fs/promises';
 import path from 'path';
+import { createJob, removeJob, saveUpload, spawnJob, busyResponse, QUEUE_FULL_EXIT_CODE } from '../../../lib/jobs';
 
 export async function POST(request: NextRequest) {
   try {
@@ -17,27 +17,23 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // Save the uploaded file
-    const bytes = await file.arrayBuffer();
-    const buffer = Buffer.from(bytes);
-    
-    // Save to temp location with original filename
-    const tempFilePath = path.join(process.cwd(), '..', file.name);
-    await writeFile(tempFilePath, buffer);
+    // Save the uploaded file in a directory of its own, so concurrent
+    // requests never collide
+    const job = await createJob(formData.get('jobId') as string);
+    const tempFilePath = await saveUpload(job, file, 'video.mp4');
 
     // If custom prompt provided, save it temporarily
     let tempPromptPath: string;
     if (customPrompt) {
-      tempPromptPath = path.join(process.cwd(), '..', 'temp_prompt.txt');
+      tempPromptPath = path.join(job.scratchDir, 'prompt.txt');
       await writeFile(tempPromptPath, customPrompt);
     } else {
       // Use default prompt from frontend/public/prompts directory using relative path
       tempPromptPath = path.join('frontend', 'public', 'prompts', 'video_transcription_prompt.txt');
     }
 
-    // Build Python script arguments - flags must come before positional arguments
+    // Build main.py arguments - flags must come before positional arguments
     const pythonArgs = [
-      'main.py',
       '--mode', 'transcribe',
       '--model', model
     ];
@@ -46,9 +42,8 @@ export async function POST(request: NextRequest) {
     pythonArgs.push(tempFilePath, tempPromptPath);
 
     return new Promise((resolve) => {
-      const pythonProcess = spawn('python3', pythonArgs, {
-        cwd: path.join(process.cwd(), '..'),
-      });
+      // Runs once the job queue has a free slot for it
+      const pythonProcess = spawnJob(job, 'process_video', pythonArgs);
 
       let output = '';
       let errorOutput = '';
@@ -62,18 +57,13 @@ export async function POST(request: NextRequest) {
         console.error('Python error:', errorOutput);
       });
 
-      pythonProcess.on('close', (code) => {
+      pythonProcess.on('close', async (code) => {
         // Clean up temporary files
-        const filesToRemove = [tempFilePath];
-        if (customPrompt) {
-          filesToRemove.push(tempPromptPath);
-        }
-        
-        spawn('rm', filesToRemove, {
-          cwd: path.join(process.cwd(), '..'),
-        });
+        await removeJob(job);
 
-        if (code !== 0) {
+        if (code === QUEUE_FULL_EXIT_CODE) {
+          resolve(busyResponse(errorOutput));
+        } else if (code !== 0) {
           resolve(
             NextResponse.json(
               { error: 'Transcription failed', details: errorOutput },
@@ -88,7 +78,8 @@ export async function POST(request: NextRequest) {
               NextResponse.json(
                 { 
                   transcript: result.text,
-                  token_usage: result.token_usage 
+                  token_usage: result.token_usage,
+                  job_id: job.id
                 },
                 { status: 200 }
               )
@@ -99,7 +99,9 @@ export default function VideoProcedure() {
     }
   };
 
-  const extractFrames = async () => {
+  // Frames stream in as one JSON object per line; onFrame sees each one as
+  // soon as it arrives
+  const extractFrames = async (onFrame?: (frame: any) => void) => {
     if (!file) return;
 
     try {
@@ -125,7 +127,30 @@ export default function VideoProcedure() {
         throw new Error(data.error || 'Failed to extract frames');
       }
 
-      const { frames } = await response.json();
+      const frames: any[] = [];
+      const reader = response.body!.pipeThrough(new TextDecoderStream()).getReader();
+      let pending = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        pending += value;
+        const lines = pending.split('\n');
+        pending = lines.pop() || '';
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const frame = JSON.parse(line);
+          if (frame.error) {
+            throw new Error(frame.error);
+          }
+          frames.push(frame);
+          onFrame?.(frame);
+        }
+      }
+
+      // Timestamp frames arrive in video order; index is their requested position
+      if (frames.length > 0 && frames[0].index !== undefined) {
+        frames.sort((a, b) => a.index - b.index);
+      }
       console.log('Extracted frames:', frames);
       return frames;
     } catch (err) {
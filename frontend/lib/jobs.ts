@@ -0,0 +1,66 @@
+import { NextResponse } from 'next/server';
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import { randomUUID } from 'crypto';
+import { mkdtemp, rm, writeFile } from 'fs/promises';
+import os from 'os';
+import path from 'path';
+
+// Every Python entry point runs through jobs.py, which queues it behind the
+// per-type concurrency and memory limits and exits with this status when
+// the queue is full.
+export const QUEUE_FULL_EXIT_CODE = 75;
+
+export const repoRoot = path.join(process.cwd(), '..');
+
+export type JobType = 'process_video' | 'extract_frames' | 'generate_word';
+
+export interface Job {
+  id: string;
+  scratchDir: string;
+}
+
+// A job id from the client (so it can poll /api/jobs while waiting) or a new one
+export function jobId(requested?: string | null): string {
+  return requested && /^[A-Za-z0-9_-]{1,64}$/.test(requested) ? requested : randomUUID();
+}
+
+// A fresh directory for one request's uploads and outputs
+export async function createJob(requestedId?: string | null): Promise<Job> {
+  const scratchDir = await mkdtemp(path.join(os.tmpdir(), 'video-job-'));
+  return { id: jobId(requestedId), scratchDir };
+}
+
+export async function removeJob(job: Job): Promise<void> {
+  await rm(job.scratchDir, { recursive: true, force: true }).catch((err) =>
+    console.error('Error cleaning up job directory:', err)
+  );
+}
+
+// Save an upload in the job directory; only the base name of the client's
+// file name is kept
+export async function saveUpload(job: Job, file: File, fallbackName: string): Promise<string> {
+  const name = path.basename(file.name || '').replace(/[^A-Za-z0-9._-]/g, '_') || fallbackName;
+  const filePath = path.join(job.scratchDir, name);
+  await writeFile(filePath, Buffer.from(await file.arrayBuffer()));
+  return filePath;
+}
+
+export function spawnJob(job: Job, type: JobType, args: string[]): ChildProcessWithoutNullStreams {
+  return spawn('python3', [
+    'jobs.py', 'run',
+    '--type', type,
+    '--job-id', job.id,
+    '--scratch-dir', job.scratchDir,
+    '--',
+    ...args
+  ], {
+    cwd: repoRoot,
+  });
+}
+
+export function busyResponse(details: string): NextResponse {
+  return NextResponse.json(
+    { error: 'Server busy, try again shortly', details },
+    { status: 503, headers: { 'Retry-After': '10' } }
+  );
+}
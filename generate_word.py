@@ -1,39 +1,172 @@
 import sys
-import json
 import base64
+import hashlib
 import io
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from PIL import Image
+import os
+import shutil
+import tempfile
+from contextlib import closing
+
+import jobs
+import tracing
+import worker
+from concurrency import ordered_map
+from frame_cache import configured_cache
+
+# python-docx, Pillow and ijson are imported inside the functions that use
+# them so the CLI can hand off to a running worker without loading them.
+
+# ijson prefix of the base64 frame images in the procedure data
+FRAME_IMAGE_PREFIX = 'procedure.steps.item.frames.item.image'
 
 def add_heading(doc, text, level=1):
+    from docx.shared import RGBColor
+
     heading = doc.add_heading(text, level=level)
     heading.style.font.color.rgb = RGBColor(204, 0, 0)  # Match the red color theme
 
-def add_image(doc, image_data, width_inches=6.0):
-    # Remove data URL prefix if present
+# Images are embedded at no more than this many pixels per printed inch
+DEFAULT_IMAGE_DPI = 200
+# Only downscale images at least this much larger than needed; smaller
+# savings are not worth a lossy re-encode
+DOWNSCALE_SLACK = 1.25
+# Formats Word displays that are embedded exactly as extracted
+EMBEDDABLE_FORMATS = {"JPEG", "PNG", "GIF"}
+
+def load_image_bytes(image_data):
+    """
+    The encoded image behind a frame: a (data URL) base64 string, or a frame
+    written by extract_frames.py --frame-cache, by path or by URL under
+    --frame-url-prefix. Cached frames are only read from the frame cache
+    configured with $VIDEO_FRAME_CACHE (and $VIDEO_FRAME_URL_PREFIX), so the
+    procedure data cannot name other files on the server.
+    """
     if image_data.startswith('data:image'):
-        image_data = image_data.split(',')[1]
-    
-    # Decode base64 image
-    image_bytes = base64.b64decode(image_data)
-    image_stream = io.BytesIO(image_bytes)
-    image = Image.open(image_stream)
-    
-    # Save to temporary stream in PNG format
-    temp_stream = io.BytesIO()
-    image.save(temp_stream, format='PNG')
-    temp_stream.seek(0)
-    
-    # Add to document
-    doc.add_picture(temp_stream, width=Inches(width_inches))
+        return base64.b64decode(image_data.split(',')[1])
+
+    cache = configured_cache()
+    path = cache.resolve(image_data)
+    if path is not None:
+        with open(path, 'rb') as f:
+            return f.read()
+    named_file = (
+        '://' in image_data
+        or (cache.url_prefix and image_data.startswith(cache.url_prefix))
+        or os.path.isfile(image_data)
+    )
+    if named_file:
+        raise ValueError(f"Frame image {image_data} is not in the frame cache ({cache.cache_dir})")
+    return base64.b64decode(image_data)
+
+@tracing.traced("image_prepare")
+def prepare_image(image_data, width_inches=6.0, dpi=DEFAULT_IMAGE_DPI):
+    """
+    Return the bytes to embed for a frame printed width_inches wide. JPEG,
+    PNG and GIF frames that are not much larger than needed at dpi are
+    embedded as they are, without decoding; others are downscaled (or, for
+    formats Word cannot show such as WebP, converted) to JPEG, or PNG when
+    the image has transparency or was a PNG.
+    """
+    from PIL import Image
+
+    image_bytes = load_image_bytes(image_data)
+    # Image.open only reads the header; pixels are decoded on first use
+    image = Image.open(io.BytesIO(image_bytes))
+    source_format = image.format
+    max_width = max(1, int(width_inches * dpi))
+    too_large = image.width > max_width * DOWNSCALE_SLACK
+    if source_format in EMBEDDABLE_FORMATS and not too_large:
+        return image_bytes
+
+    if too_large:
+        height = max(1, round(image.height * max_width / image.width))
+        image = image.resize((max_width, height), Image.LANCZOS)
+
+    output = io.BytesIO()
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    if has_alpha or source_format in ('PNG', 'GIF'):
+        image.save(output, format='PNG', optimize=True)
+    else:
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+def add_image(doc, image_data, width_inches=6.0, prepared=None):
+    """Add a frame image; prepared is the output of prepare_image if already computed."""
+    from docx.shared import Inches
+
+    if prepared is None:
+        prepared = prepare_image(image_data, width_inches)
+
+    # Identical bytes share one image part: python-docx looks parts up by SHA-1
+    with tracing.span("docx_image"):
+        doc.add_picture(io.BytesIO(prepared), width=Inches(width_inches))
+
+@tracing.traced("json_read")
+def read_outline(data_path):
+    """
+    The procedure data with every frame image replaced by None, read with a
+    streaming parser so at most one image is in memory at a time.
+    """
+    import ijson
+
+    builder = ijson.ObjectBuilder()
+    with open(data_path, 'rb') as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if prefix == FRAME_IMAGE_PREFIX:
+                value = None
+            builder.event(event, value)
+    return builder.value
+
+def iter_frame_images(data_path):
+    """The frame images of the procedure data in document order, one at a time."""
+    import ijson
+
+    with open(data_path, 'rb') as f:
+        yield from ijson.items(f, FRAME_IMAGE_PREFIX)
+
+def build_document(data, images=None, image_dpi=DEFAULT_IMAGE_DPI, workers=None):
+    """
+    Assemble the procedure document. images yields the frame images in
+    document order (default: those in data); they are decoded and
+    downscaled a few frames ahead of assembly in a thread pool, where
+    Pillow releases the GIL.
+    """
+    from docx import Document
+    from docx.shared import Inches
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
 
-def generate_word_doc(data):
     procedure = data['procedure']
     image_scale = data['imageScale'] / 100.0  # Convert percentage to decimal
+    image_width = 6.0 * image_scale
+
+    if images is None:
+        images = (frame['image'] for step in procedure['steps'] for frame in step.get('frames') or [])
+
+    # Each distinct image is prepared once, at its first position; repeats
+    # are embedded from the image part python-docx already holds for it, so
+    # no prepared bytes are kept here. ordered_map consumes images on this
+    # thread, so first positions are claimed in document order.
+    seen = set()
+
+    def distinct(images):
+        for image_data in images:
+            digest = hashlib.sha1(image_data.encode('utf-8')).digest()
+            yield digest, None if digest in seen else image_data
+            seen.add(digest)
+
+    def prepare(item):
+        digest, image_data = item
+        if image_data is None:
+            return digest, None
+        return digest, prepare_image(image_data, image_width, image_dpi)
+
+    workers = workers or min(8, os.cpu_count() or 1)
+    prepared = ordered_map(prepare, distinct(images), workers, 2 * workers)
     
     doc = Document()
+    image_parts = {}  # image digest -> the package part holding its prepared bytes
     
     # Title
     add_heading(doc, procedure['title'])
@@ -84,9 +217,15 @@ def generate_word_doc(data):
         # Images
         if step.get('frames'):
             for frame in step['frames']:
-                add_image(doc, frame['image'], width_inches=6.0 * image_scale)
+                digest, image_bytes = next(prepared)
+                if image_bytes is None:
+                    image_bytes = image_parts[digest].blob
+                else:
+                    image_parts[digest] = doc.part.package.get_or_add_image_part(io.BytesIO(image_bytes))
+                add_image(doc, frame['image'], width_inches=image_width, prepared=image_bytes)
                 caption = doc.add_paragraph(f"Time: {frame['timestamp']}")
                 caption.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        jobs.progress("Steps written", i, len(procedure['steps']))
         
         doc.add_paragraph()
     
@@ -102,19 +241,61 @@ def generate_word_doc(data):
         p.add_run('• ').bold = True
         p.add_run(item)
     
-    # Save to memory stream
+    prepared.close()
+    return doc
+
+def generate_word_doc(data, image_dpi=DEFAULT_IMAGE_DPI, workers=None):
+    """The document for already-loaded procedure data, as bytes."""
     doc_stream = io.BytesIO()
-    doc.save(doc_stream)
-    doc_stream.seek(0)
+    build_document(data, image_dpi=image_dpi, workers=workers).save(doc_stream)
     return doc_stream.getvalue()
 
-if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print("Usage: python generate_word.py <procedure_data.json>")
+def write_document(data_path, output, image_dpi=DEFAULT_IMAGE_DPI, workers=None):
+    """
+    Build the document for the procedure data at data_path and save it to
+    output, a path or a binary stream (which need not be seekable, so
+    stdout works). Neither the input images nor the document are held in
+    memory as a whole beyond what python-docx keeps for its parts.
+    """
+    with closing(iter_frame_images(data_path)) as images:
+        doc = build_document(read_outline(data_path), images, image_dpi, workers)
+    with tracing.span("docx_save"):
+        doc.save(output)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) not in (1, 2):
+        print("Usage: python generate_word.py <procedure_data.json> [output.docx]")
         sys.exit(1)
-    
-    with open(sys.argv[1], 'r') as f:
-        data = json.load(f)
-    
-    doc_bytes = generate_word_doc(data)
-    sys.stdout.buffer.write(doc_bytes) 
\ No newline at end of file
+    output_path = argv[1] if len(argv) == 2 else None
+
+    with tracing.invocation("generate_word"):
+        sock = worker.connect()
+        if sock is not None:
+            # A warm worker builds the document; without an output path it goes
+            # into a temp file that we relay to stdout
+            target = os.path.abspath(output_path) if output_path else None
+            if target is None:
+                fd, target = tempfile.mkstemp(suffix='.docx')
+                os.close(fd)
+            try:
+                worker.request(sock, "generate_word", {
+                    "data_path": os.path.abspath(argv[0]),
+                    "output_path": target
+                })
+                if output_path is None:
+                    with open(target, 'rb') as f:
+                        shutil.copyfileobj(f, sys.stdout.buffer)
+            finally:
+                if output_path is None:
+                    os.unlink(target)
+            return
+
+        if output_path:
+            write_document(argv[0], output_path)
+        else:
+            write_document(argv[0], sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+
+if __name__ == '__main__':
+    main()
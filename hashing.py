@@ -0,0 +1,35 @@
+import hashlib
+from pathlib import Path
+from typing import Optional, Union
+
+CHUNK_SIZE = 1 << 20  # 1 MiB
+
+def hash_file(path: Union[str, Path], hasher=None, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Hash a file's contents without reading it into memory at once.
+    Returns the hex digest (SHA-256 unless another hashlib object is given).
+    """
+    if hasher is None:
+        hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def file_fingerprint(path: Union[str, Path]) -> str:
+    """
+    Cheap identity for a file on disk (absolute path, size and mtime), used
+    to memoize content hashes of large videos between invocations.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def hash_text(*parts: Optional[str]) -> str:
+    """Hash a sequence of strings into one hex digest, keeping part boundaries."""
+    hasher = hashlib.sha256()
+    for part in parts:
+        data = "" if part is None else str(part)
+        hasher.update(f"{len(data)}:".encode("utf-8"))
+        hasher.update(data.encode("utf-8"))
+    return hasher.hexdigest()
@@ -0,0 +1,491 @@
+"""
+Local job queue in front of process_video, extract_frames and
+generate_word.
+
+    python jobs.py run --type process_video -- video.mp4 prompt.txt --mode procedure
+    python jobs.py run --type extract_frames --job-id 42 --scratch-dir /tmp/upload-42 -- /tmp/upload-42/video.mp4
+    python jobs.py status [job_id]
+
+`run` registers the job in a SQLite queue shared by every process on the
+machine, waits until its type has a free slot, then runs the entry point
+in-process with the given arguments; stdout, stderr and the exit status are
+the entry point's own. Each type has a concurrency limit matched to the CPU
+count and a memory estimate: a job only starts while the memory the kernel
+reports as available, less what running jobs are still expected to grow
+into, leaves min_free_mb spare. Jobs of a type start in submission order.
+
+Each job gets a scratch directory, also used as its TMPDIR, so temp files
+of concurrent jobs never collide. A directory passed with --scratch-dir
+(holding the job's uploaded inputs, say) belongs to the caller; one the
+queue creates is removed when the job ends.
+
+When a type already has max_queued jobs waiting, memory is below
+min_free_mb, or --timeout passes before a slot frees up, the job is
+rejected and `run` exits with status 75 (EX_TEMPFAIL) and a JSON error on
+stderr, so callers can answer "busy, retry later".
+
+Running entry points report progress through progress(); `status` prints
+each job's state, queue position, progress and timings as JSON.
+"""
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_QUEUE_PATH = Path.home() / ".cache" / "video-analysis" / "jobs.sqlite3"
+DEFAULT_SCRATCH_DIR = Path(tempfile.gettempdir()) / "video-jobs"
+DEFAULT_MAX_QUEUED = 32
+DEFAULT_MIN_FREE_MB = 512
+# Finished jobs are kept this long for status queries
+DEFAULT_RETENTION_SECONDS = 24 * 3600
+POLL_SECONDS = 0.25
+PROGRESS_INTERVAL = 0.5
+QUEUE_FULL_EXIT_CODE = 75  # EX_TEMPFAIL
+
+# Job type -> (module, function) of its command-line entry point
+ENTRY_POINTS = {
+    "process_video": ("main", "main"),
+    "extract_frames": ("extract_frames", "main"),
+    "generate_word": ("generate_word", "main"),
+}
+
+class QueueFull(Exception):
+    """The job was not accepted or did not get a slot in time."""
+
+@dataclass
+class JobLimits:
+    concurrency: int
+    memory_mb: int  # expected peak RSS of one job
+
+def default_limits(cpu_count: Optional[int] = None) -> Dict[str, JobLimits]:
+    """
+    Per-type limits for this machine. Frame extraction and the Word export
+    keep a core busy each (decode, image resizing); process_video mostly
+    waits on the model, so more of them can share the CPUs.
+    """
+    cpus = cpu_count or os.cpu_count() or 1
+    return {
+        "process_video": JobLimits(concurrency=max(2, cpus), memory_mb=400),
+        "extract_frames": JobLimits(concurrency=max(1, cpus // 2), memory_mb=500),
+        "generate_word": JobLimits(concurrency=max(1, cpus // 2), memory_mb=300),
+    }
+
+def available_memory_mb() -> Optional[int]:
+    """MemAvailable from /proc/meminfo, or None where it cannot be read."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+def process_rss_mb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return 0
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobQueue:
+    """
+    Jobs and their state in a SQLite file. Every method is safe to call
+    from several processes at once; admission decisions are made inside an
+    immediate transaction so two waiters never take the same slot.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        limits: Optional[Dict[str, JobLimits]] = None,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        min_free_mb: int = DEFAULT_MIN_FREE_MB,
+        scratch_root: Optional[str] = None
+    ):
+        self.db_path = Path(db_path) if db_path else DEFAULT_QUEUE_PATH
+        self.limits = limits or default_limits()
+        self.max_queued = max_queued
+        self.min_free_mb = min_free_mb
+        self.scratch_root = Path(scratch_root) if scratch_root else DEFAULT_SCRATCH_DIR
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Progress can be reported from worker threads, so the connection is
+        # shared under a lock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                memory_mb INTEGER NOT NULL,
+                scratch_dir TEXT NOT NULL,
+                owns_scratch INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                message TEXT,
+                progress_done INTEGER,
+                progress_total INTEGER,
+                exit_code INTEGER,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, type, created_at);
+        """)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _transaction(self):
+        return _ImmediateTransaction(self.conn, self._lock)
+
+    def _reap(self) -> None:
+        """Mark jobs whose process died without finishing them as abandoned."""
+        for job_id, pid in self.conn.execute(
+            "SELECT id, pid FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchall():
+            if not process_alive(pid):
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'abandoned', finished_at = ?, error = 'process exited' WHERE id = ?",
+                    (time.time(), job_id)
+                )
+
+    def submit(self, job_type: str, job_id: Optional[str] = None, scratch_dir: Optional[str] = None,
+               memory_mb: Optional[int] = None) -> Dict:
+        """
+        Queue a job for the calling process. Raises QueueFull if max_queued
+        jobs of the type are already waiting or memory is below min_free_mb.
+        """
+        if job_type not in ENTRY_POINTS:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job_id = job_id or uuid.uuid4().hex
+        memory_mb = memory_mb if memory_mb is not None else self.limits[job_type].memory_mb
+        now = time.time()
+
+        with self._transaction():
+            self._reap()
+            self.conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'rejected', 'abandoned') "
+                              "AND finished_at < ?", (now - DEFAULT_RETENTION_SECONDS,))
+            if self.conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone():
+                raise ValueError(f"Job {job_id} already exists")
+
+            queued = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND type = ?", (job_type,)
+            ).fetchone()[0]
+            available = available_memory_mb()
+            error = None
+            if queued >= self.max_queued:
+                error = f"{queued} {job_type} jobs are already waiting"
+            elif available is not None and available < self.min_free_mb:
+                error = f"Only {available} MB of memory available"
+
+            owns_scratch = scratch_dir is None
+            if owns_scratch and error is None:
+                scratch_dir = str(self.scratch_root / job_id)
+                os.makedirs(scratch_dir, exist_ok=True)
+            self.conn.execute(
+                "INSERT INTO jobs (id, type, status, pid, memory_mb, scratch_dir, owns_scratch, created_at, "
+                "finished_at, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, "rejected" if error else "queued", os.getpid(), memory_mb,
+                 scratch_dir or "", int(owns_scratch), now, now if error else None, error)
+            )
+        if error:
+            raise QueueFull(error)
+        return self.get(job_id)
+
+    def try_start(self, job_id: str) -> bool:
+        """Start the queued job if its type has a free slot and memory allows."""
+        with self._transaction():
+            self._reap()
+            job = self.conn.execute("SELECT type, status, memory_mb FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                raise ValueError(f"No job {job_id}")
+            job_type, status, memory_mb = job
+            if status != "queued":
+                return status == "running"
+
+            oldest = self.conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND type = ? ORDER BY created_at, rowid LIMIT 1",
+                (job_type,)
+            ).fetchone()
+            if oldest[0] != job_id:
+                return False
+
+            running = self.conn.execute("SELECT type, pid, memory_mb FROM jobs WHERE status = 'running'").fetchall()
+            if sum(1 for t, _, _ in running if t == job_type) >= self.limits[job_type].concurrency:
+                return False
+
+            available = available_memory_mb()
+            if running and available is not None:
+                # Jobs that just started have not grown to their estimate yet
+                pending = sum(max(0, estimate - process_rss_mb(pid)) for _, pid, estimate in running)
+                if available - pending - memory_mb < self.min_free_mb:
+                    return False
+
+            self.conn.execute("UPDATE jobs SET status = 'running', started_at = ?, pid = ? WHERE id = ?",
+                              (time.time(), os.getpid(), job_id))
+        return True
+
+    def wait_for_slot(self, job_id: str, timeout: Optional[float] = None) -> None:
+        """Block until the job starts; raises QueueFull (and rejects the job) after timeout seconds."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        reported = False
+        while not self.try_start(job_id):
+            if deadline is not None and time.monotonic() >= deadline:
+                self.finish(job_id, "rejected", error=f"No slot within {timeout:.0f}s")
+                raise QueueFull(f"Job {job_id} did not start within {timeout:.0f}s")
+            if not reported:
+                job = self.get(job_id)
+                print(f"Job {job_id} queued at position {job['position']}", file=sys.stderr)
+                reported = True
+            time.sleep(POLL_SECONDS)
+
+    def finish(self, job_id: str, status: str, exit_code: Optional[int] = None, error: Optional[str] = None) -> None:
+        with self._transaction():
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, exit_code = ?, error = ? WHERE id = ?",
+                (status, time.time(), exit_code, error, job_id)
+            )
+
+    def set_progress(self, job_id: str, message: Optional[str], done: Optional[int] = None,
+                     total: Optional[int] = None) -> None:
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET message = ?, progress_done = ?, progress_total = ? WHERE id = ?",
+                (message, done, total, job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        jobs = self.list(job_id=job_id)
+        return jobs[0] if jobs else None
+
+    def list(self, job_id: Optional[str] = None, active_only: bool = False) -> List[Dict]:
+        """Jobs as dicts, oldest first; queued jobs have their 1-based position within their type."""
+        query = "SELECT * FROM jobs"
+        params: Tuple = ()
+        if job_id is not None:
+            query += " WHERE id = ?"
+            params = (job_id,)
+        elif active_only:
+            query += " WHERE status IN ('queued', 'running')"
+        query += " ORDER BY created_at, rowid"
+
+        with self._lock:
+            cursor = self.conn.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            queued = self.conn.execute(
+                "SELECT id, type FROM jobs WHERE status = 'queued' ORDER BY created_at, rowid"
+            ).fetchall()
+
+        positions, per_type = {}, {}
+        for queued_id, job_type in queued:
+            per_type[job_type] = per_type.get(job_type, 0) + 1
+            positions[queued_id] = per_type[job_type]
+
+        now = time.time()
+        jobs = []
+        for row in rows:
+            started, finished = row["started_at"], row["finished_at"]
+            jobs.append({
+                "id": row["id"],
+                "type": row["type"],
+                "status": row["status"],
+                "position": positions.get(row["id"]),
+                "progress": {"message": row["message"], "done": row["progress_done"], "total": row["progress_total"]},
+                "wait_seconds": round((started or finished or now) - row["created_at"], 3),
+                "run_seconds": round((finished or now) - started, 3) if started else None,
+                "exit_code": row["exit_code"],
+                "error": row["error"],
+                "scratch_dir": row["scratch_dir"],
+                "owns_scratch": bool(row["owns_scratch"])
+            })
+        return jobs
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE ... COMMIT under the queue's lock (ROLLBACK on error)."""
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.Lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+
+# The job this process is running, for progress()
+_active: Optional[Tuple[JobQueue, str]] = None
+_last_progress = 0.0
+
+def progress(message: str, done: Optional[int] = None, total: Optional[int] = None) -> None:
+    """
+    Report progress of the job this process is running; does nothing
+    outside a job. Updates are written at most every PROGRESS_INTERVAL
+    seconds, except the one that reaches total.
+    """
+    global _last_progress
+    if _active is None:
+        return
+    now = time.monotonic()
+    if now - _last_progress < PROGRESS_INTERVAL and not (total is not None and done == total):
+        return
+    _last_progress = now
+    queue, job_id = _active
+    try:
+        queue.set_progress(job_id, message, done, total)
+    except sqlite3.Error as e:
+        print(f"Could not record job progress: {e}", file=sys.stderr)
+
+def track(items: Iterable, message: str, total: Optional[int] = None) -> Iterator:
+    """Yield items, reporting each one as progress; once exhausted, the count is the total."""
+    done = 0
+    for item in items:
+        yield item
+        done += 1
+        progress(message, done, total)
+    progress(message, done, done)
+
+def run_job(queue: JobQueue, job_type: str, argv: List[str], job_id: Optional[str] = None,
+            scratch_dir: Optional[str] = None, timeout: Optional[float] = None,
+            memory_mb: Optional[int] = None) -> int:
+    """
+    Queue a job, wait for its slot and run its entry point with argv in this
+    process. Returns the exit status; QueueFull propagates if the job is
+    rejected.
+    """
+    global _active
+    job = queue.submit(job_type, job_id, scratch_dir, memory_mb)
+    job_id, scratch_dir = job["id"], job["scratch_dir"]
+    try:
+        queue.wait_for_slot(job_id, timeout)
+    except QueueFull:
+        if job["owns_scratch"]:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        raise
+    except BaseException:
+        queue.finish(job_id, "failed", error="interrupted while queued")
+        if job["owns_scratch"]:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        raise
+
+    # Temp files of this job (and of ffmpeg) go to its scratch directory
+    os.environ["TMPDIR"] = scratch_dir
+    tempfile.tempdir = scratch_dir
+    _active = (queue, job_id)
+    exit_code, error = 1, None
+    try:
+        module_name, function_name = ENTRY_POINTS[job_type]
+        getattr(importlib.import_module(module_name), function_name)(argv)
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _active = None
+        sys.stdout.flush()
+        queue.finish(job_id, "done" if exit_code == 0 else "failed", exit_code,
+                     error or (None if exit_code == 0 else f"exit status {exit_code}"))
+        if job["owns_scratch"]:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+    return exit_code
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run pipeline jobs through a local queue")
+    parser.add_argument("--db", help=f"Queue database (default: {DEFAULT_QUEUE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Queue a job, wait for a slot and run it")
+    run.add_argument("--type", required=True, choices=sorted(ENTRY_POINTS), help="Entry point to run")
+    run.add_argument("--job-id", help="Id to report status under (default: a random id)")
+    run.add_argument("--scratch-dir",
+                     help="Existing directory to use as the job's scratch directory; it is left in place")
+    run.add_argument("--timeout", type=float, help="Reject the job if it has not started after this many seconds")
+    run.add_argument("--concurrency", type=int, help="Jobs of this type allowed to run at once")
+    run.add_argument("--memory-mb", type=int, help="Expected peak memory of the job")
+    run.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED,
+                     help="Reject the job if this many jobs of its type are already waiting")
+    run.add_argument("--min-free-mb", type=int, default=DEFAULT_MIN_FREE_MB,
+                     help="Memory to keep available; jobs wait (or are rejected) below it")
+    run.add_argument("args", nargs=argparse.REMAINDER, help="Arguments for the entry point, after --")
+
+    status = commands.add_parser("status", help="Print jobs as JSON")
+    status.add_argument("job_id", nargs="?", help="Only this job")
+    status.add_argument("--all", action="store_true", help="Include finished jobs")
+
+    args = parser.parse_args(argv)
+    if args.command == "run" and args.args and args.args[0] == "--":
+        args.args = args.args[1:]
+    return args
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
+    if args.command == "status":
+        queue = JobQueue(args.db)
+        if args.job_id:
+            job = queue.get(args.job_id)
+            if job is None:
+                print(f"Error: No job {args.job_id}", file=sys.stderr)
+                sys.exit(1)
+            print(json.dumps(job, indent=2))
+        else:
+            print(json.dumps(queue.list(active_only=not args.all), indent=2))
+        return
+
+    limits = default_limits()
+    if args.concurrency is not None:
+        limits[args.type].concurrency = args.concurrency
+    queue = JobQueue(args.db, limits, max_queued=args.max_queued, min_free_mb=args.min_free_mb)
+    try:
+        exit_code = run_job(queue, args.type, args.args, args.job_id, args.scratch_dir, args.timeout, args.memory_mb)
+    except QueueFull as e:
+        print(json.dumps({"error": "busy", "details": str(e)}), file=sys.stderr)
+        sys.exit(QUEUE_FULL_EXIT_CODE)
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    # Run as the importable module, so the entry points' progress() calls
+    # see the active job rather than a second copy of this module
+    import jobs
+    jobs.main()
@@ -1,18 +1,64 @@
-from google.cloud import aiplatform
-from vertexai.preview.generative_models import GenerativeModel, Part
 from pathlib import Path
+import os
 import sys
 import json
 import argparse
+import asyncio
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+import worker
+from procedure_parser import parse_procedure, ProcedureStreamParser
+import jobs
+import tracing
+from result_cache import ResultCache, DEFAULT_CACHE_PATH, DEFAULT_TTL_SECONDS
+from storage import StorageBackend, GCSStorage, LocalStorage, DEFAULT_INLINE_MAX_BYTES
+from units import AUDIO_TOKENS_PER_SECOND, VIDEO_TOKENS_PER_SECOND, estimate_text_tokens
+
+if TYPE_CHECKING:
+    from vertexai.preview.generative_models import GenerativeModel, Part
+    from preprocess import PreprocessOptions
+    from audio import AudioOptions
+    from batch import RateLimiter
 
 PROJECT_ID = "noted-app-302517"
+LOCATION = "us-central1"
+# Point the SDK at another endpoint, e.g. a local fake model server in tests
+API_ENDPOINT_ENV = "VERTEX_API_ENDPOINT"
+LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "[::1]"}
+
+# The Vertex SDK takes seconds to import and initialize, so it is loaded on
+# first use rather than at import time; --help, argument errors and cache
+# hits never touch it.
+_vertex_initialized = False
+
+def init_vertex() -> None:
+    """Initialize the Vertex AI SDK once per process."""
+    global _vertex_initialized
+    if not _vertex_initialized:
+        from google.cloud import aiplatform
+        api_endpoint = os.environ.get(API_ENDPOINT_ENV)
+        if api_endpoint:
+            print(f"Using Vertex AI endpoint {api_endpoint}", file=sys.stderr)
+            credentials = None
+            if api_endpoint.rsplit(":", 1)[0] in LOOPBACK_HOSTS:
+                # A local fake model server (benchmarks/fake_model_server.py) needs no Google login
+                from google.auth.credentials import AnonymousCredentials
+                credentials = AnonymousCredentials()
+            aiplatform.init(project=PROJECT_ID, location=LOCATION, api_endpoint=api_endpoint,
+                            credentials=credentials)
+        else:
+            aiplatform.init(project=PROJECT_ID, location=LOCATION)
+        _vertex_initialized = True
 
-aiplatform.init(project=PROJECT_ID, location="us-central1")
+# Requests up to this many tokens are billed at the lower rate
+LOW_TIER_MAX_TOKENS = 128000
 
 def calculate_cost(prompt_tokens: int, response_tokens: int, model_name: str = "gemini-1.5-flash-002"):
     """Calculate cost based on Gemini 1.5 model pricing"""
     total_tokens = prompt_tokens + response_tokens
-    is_low_tier = total_tokens <= 128000
+    is_low_tier = total_tokens <= LOW_TIER_MAX_TOKENS
     
     # Pricing differs based on the model
     if model_name == "gemini-1.5-flash-002":
@@ -42,10 +88,70 @@ def calculate_cost(prompt_tokens: int, response_tokens: int, model_name: str = "
         "total_cost": round(total_cost, 6)
     }
 
-def process_video(video_path: str, prompt_path: str, mode: str = "transcribe", pdf_path: str = None, model_name: str = "gemini-1.5-flash-002"):
-    # Initialize the model based on the selected model name
-    model = GenerativeModel(model_name)
+_models: Dict[str, "GenerativeModel"] = {}
+
+def get_model(model_name: str) -> "GenerativeModel":
+    """Return a GenerativeModel for model_name, reused across calls in this process."""
+    if model_name not in _models:
+        init_vertex()
+        from vertexai.preview.generative_models import GenerativeModel
+        _models[model_name] = GenerativeModel(model_name)
+    return _models[model_name]
+
+def response_usage(response) -> Any:
+    """
+    A response's (or stream chunk's) usage metadata, or None. SDK versions
+    without a usage_metadata property keep it on the raw response proto.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        usage = getattr(getattr(response, "_raw_response", None), "usage_metadata", None)
+    return usage or None
+
+def response_token_counts(response) -> Tuple[Optional[int], Optional[int]]:
+    """(prompt_tokens, response_tokens) from a response's usage metadata, if present."""
+    usage = response_usage(response)
+    if usage is None:
+        return None, None
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or None
+    response_tokens = getattr(usage, "candidates_token_count", None)
+    return prompt_tokens, response_tokens
+
+def estimate_prompt_tokens(prompt: str, video_path: Path) -> int:
+    """Rough input token count from the prompt length and video duration."""
+    tokens = estimate_text_tokens(prompt)
+    try:
+        from video_utils import VideoSession
+        with VideoSession(str(video_path)) as session:
+            tokens += int(session.duration * (VIDEO_TOKENS_PER_SECOND + AUDIO_TOKENS_PER_SECOND))
+    except Exception as e:
+        print(f"Could not probe video duration for token estimate: {e}", file=sys.stderr)
+    return tokens
+
+def make_file_part(path: Path, mime_type: str, storage: Optional[StorageBackend] = None,
+                   inline_max_bytes: int = DEFAULT_INLINE_MAX_BYTES, digest: Optional[str] = None) -> "Part":
+    """
+    Build a content part for a local file. Files up to inline_max_bytes are
+    sent inline; larger ones are streamed to storage and passed by URI so the
+    bytes are never held in memory. digest is the file's content hash if
+    already known, which names the stored object.
+    """
+    from vertexai.preview.generative_models import Part
 
+    size = path.stat().st_size
+    if storage is None or size <= inline_max_bytes:
+        if size > inline_max_bytes:
+            print(f"Warning: sending {size} bytes inline; configure storage to pass large files by reference", file=sys.stderr)
+        with tracing.span("file_read"), open(path, "rb") as f:
+            data = f.read()
+        return Part.from_data(data=data, mime_type=mime_type)
+
+    with tracing.span("upload"):
+        uri = storage.upload(str(path), mime_type, digest)
+    return Part.from_uri(uri, mime_type=mime_type)
+
+def resolve_inputs(video_path: str, prompt_path: str, pdf_path: Optional[str] = None) -> Tuple[str, Path, Optional[Path]]:
+    """Validate the input files and return (prompt text, video path, PDF path)."""
     # If PDF is provided, use the context-aware prompt from the frontend/public/prompts directory
     if pdf_path:
         # Get the directory of the original prompt
@@ -69,45 +175,180 @@ def process_video(video_path: str, prompt_path: str, mode: str = "transcribe", p
     if not video_file_path.exists():
         raise FileNotFoundError(f"Video file not found at {video_file_path}")
 
-    contents = []
-    
-    # Add video file
-    with open(video_file_path, "rb") as f:
-        video_file = Part.from_data(data=f.read(), mime_type="video/mp4")
-        contents.append(video_file)
-        print("Added video file to contents", file=sys.stderr)
-
-    # Add PDF file if provided
+    # Validate PDF file
+    pdf_file_path = None
     if pdf_path:
         pdf_file_path = Path(pdf_path)
         if not pdf_file_path.exists():
             raise FileNotFoundError(f"PDF file not found at {pdf_path}")
-            
-        with open(pdf_file_path, "rb") as f:
-            pdf_file = Part.from_data(data=f.read(), mime_type="application/pdf")
+
+    return prompt, video_file_path, pdf_file_path
+
+def result_cache_key(cache: ResultCache, video_file_path: Path, prompt: str, model_name: str, mode: str,
+                     pdf_file_path: Optional[Path], preprocess: Optional["PreprocessOptions"],
+                     audio: Optional["AudioOptions"] = None) -> str:
+    extra = [json.dumps(asdict(preprocess), sort_keys=True) if preprocess else ""]
+    if audio is not None:
+        extra.append("audio:" + json.dumps(asdict(audio), sort_keys=True))
+    return cache.key(str(video_file_path), prompt, model_name, mode,
+                     str(pdf_file_path) if pdf_file_path else None, *extra)
+
+def input_digests(cache: ResultCache, video_file_path: Path, pdf_file_path: Optional[Path]) -> Dict[Path, str]:
+    """
+    Content hashes of the input files, as memoized by the result cache for
+    the key, so uploading them does not read the files again.
+    """
+    digests = {video_file_path: cache.file_hash(str(video_file_path))}
+    if pdf_file_path:
+        digests[pdf_file_path] = cache.file_hash(str(pdf_file_path))
+    return digests
+
+def check_input_options(mode: str, preprocess: Optional["PreprocessOptions"], audio: Optional["AudioOptions"]) -> None:
+    """Reject preprocess and audio options that do not fit mode (called by prepare_request)."""
+    if preprocess is not None and mode == "transcribe":
+        raise ValueError("Preprocessing drops the audio track, so it cannot be used in transcribe mode "
+                         "(use audio-only requests to shrink transcription inputs)")
+    if audio is None:
+        return
+    if mode != "transcribe":
+        raise ValueError("Audio-only requests are only supported in transcribe mode")
+    if preprocess is not None:
+        raise ValueError("Audio-only requests cannot be combined with video preprocessing")
+
+@dataclass
+class PreparedRequest:
+    """Everything needed to call the model for one video and to finish its result."""
+    prompt: str
+    video_file_path: Path
+    model_name: str
+    mode: str
+    contents: List
+    preflight_tokens: Optional[int] = None
+    preprocess_report: Optional[Dict] = None
+    audio_report: Optional[Dict] = None
+    cache_key: Optional[str] = None
+    temp_path: Optional[Path] = None
+
+    @property
+    def timestamp_segments(self) -> Optional[List[Dict]]:
+        """
+        Segments table mapping times in what the model saw back to the source
+        video, when preprocessing or audio trimming cut parts of it out.
+        """
+        report = self.audio_report or self.preprocess_report
+        return report["segments"] if report else None
+
+    def cleanup(self) -> None:
+        if self.temp_path is not None:
+            self.temp_path.unlink(missing_ok=True)
+
+def prepare_request(model: "GenerativeModel", prompt: str, video_file_path: Path, pdf_file_path: Optional[Path],
+                    model_name: str, mode: str, storage: Optional[StorageBackend] = None,
+                    inline_max_bytes: int = DEFAULT_INLINE_MAX_BYTES, max_input_tokens: Optional[int] = None,
+                    preprocess: Optional["PreprocessOptions"] = None,
+                    audio: Optional["AudioOptions"] = None,
+                    digests: Optional[Dict[Path, str]] = None) -> PreparedRequest:
+    """
+    Preprocess, upload or read the input files and assemble the request
+    contents. With audio, only the video's (silence-trimmed) audio track and
+    optional key frames are sent instead of the video. digests has content
+    hashes already known for input files (see input_digests). The caller
+    must call cleanup() on the result once the model has been called.
+    """
+    from vertexai.preview.generative_models import Part
+
+    check_input_options(mode, preprocess, audio)
+    digests = digests or {}
+    jobs.progress("Preparing inputs")
+    request = PreparedRequest(prompt, video_file_path, model_name, mode, [])
+
+    # Optionally shrink the video, or extract its audio, locally before upload
+    upload_path = video_file_path
+    if preprocess is not None or audio is not None:
+        fd, temp_path = tempfile.mkstemp(suffix=".flac" if audio is not None else ".mp4")
+        os.close(fd)
+        upload_path = request.temp_path = Path(temp_path)
+
+    try:
+        contents = request.contents
+
+        if preprocess is not None:
+            from preprocess import preprocess_video
+            with tracing.span("preprocess"):
+                request.preprocess_report = preprocess_video(str(video_file_path), str(upload_path), preprocess)
+
+        if audio is not None:
+            from audio import prepare_audio
+            request.audio_report, key_frames = prepare_audio(str(video_file_path), str(upload_path), audio)
+            contents.append(make_file_part(upload_path, "audio/flac", storage, inline_max_bytes))
+            print("Added audio track to contents", file=sys.stderr)
+            for frame in key_frames:
+                contents.append(Part.from_text(f"Screen at [{frame['timestamp']}] of the audio:"))
+                contents.append(Part.from_data(data=frame["data"], mime_type=frame["mime_type"]))
+            if key_frames:
+                print(f"Added {len(key_frames)} key frames to contents", file=sys.stderr)
+        else:
+            # Add video file
+            contents.append(make_file_part(upload_path, "video/mp4", storage, inline_max_bytes,
+                                           digests.get(upload_path)))
+            print("Added video file to contents", file=sys.stderr)
+
+        # Add PDF file if provided
+        if pdf_file_path:
+            contents.append(make_file_part(pdf_file_path, "application/pdf", storage, inline_max_bytes,
+                                           digests.get(pdf_file_path)))
             print("Added PDF file to contents", file=sys.stderr)
-            contents.append(pdf_file)
 
-    # Add prompt
-    contents.append(Part.from_text(prompt))
-    print("Added prompt to contents", file=sys.stderr)
-    print(f"Total number of content parts: {len(contents)}", file=sys.stderr)
+        # Add prompt
+        contents.append(Part.from_text(prompt))
+        print("Added prompt to contents", file=sys.stderr)
+        print(f"Total number of content parts: {len(contents)}", file=sys.stderr)
 
-    # Get token count for input
-    token_count = model.count_tokens(contents)
-    prompt_tokens = token_count.total_tokens
-    print(f"Input token count: {prompt_tokens}", file=sys.stderr)
+        # Optional pre-flight count; costs an extra round-trip with the full payload
+        if max_input_tokens is not None:
+            with tracing.span("count_tokens"):
+                request.preflight_tokens = model.count_tokens(contents).total_tokens
+            print(f"Pre-flight input token count: {request.preflight_tokens}", file=sys.stderr)
+            if request.preflight_tokens > max_input_tokens:
+                raise ValueError(f"Input is {request.preflight_tokens} tokens, over the budget of {max_input_tokens}")
+    except Exception:
+        request.cleanup()
+        raise
 
-    # Generate response
-    response = model.generate_content(contents)
-    print("Received response from model", file=sys.stderr)
-    
-    # Get token count for response
-    response_tokens = model.count_tokens([Part.from_text(response.text)]).total_tokens
+    jobs.progress("Waiting for the model")
+    return request
+
+def finish_result(response, request: PreparedRequest, cache: Optional[ResultCache] = None) -> str:
+    """Turn a model response into the JSON result string and store it in the cache."""
+    mode = request.mode
+    preprocess_report = request.preprocess_report
+    audio_report = request.audio_report
+
+    # The model saw the preprocessed video or trimmed audio; report positions
+    # in the source video
+    text = response.text
+    if request.timestamp_segments:
+        from preprocess import remap_timestamps
+        text = remap_timestamps(text, request.timestamp_segments)
+
+    # Token counts come back with the response
+    prompt_tokens, response_tokens = response_token_counts(response)
+    if prompt_tokens is None:
+        prompt_tokens = request.preflight_tokens
+    if prompt_tokens is None:
+        if audio_report:
+            prompt_tokens = estimate_text_tokens(request.prompt) + audio_report["estimated_output_tokens"]
+        else:
+            prompt_tokens = estimate_prompt_tokens(request.prompt, request.video_file_path)
+        print("Usage metadata missing; estimated input tokens", file=sys.stderr)
+    if response_tokens is None:
+        response_tokens = estimate_text_tokens(response.text)
+        print("Usage metadata missing; estimated response tokens", file=sys.stderr)
+    print(f"Input token count: {prompt_tokens}", file=sys.stderr)
     print(f"Response token count: {response_tokens}", file=sys.stderr)
     
     # Calculate costs
-    costs = calculate_cost(prompt_tokens, response_tokens, model_name)
+    costs = calculate_cost(prompt_tokens, response_tokens, request.model_name)
     
     token_usage = {
         "prompt_tokens": prompt_tokens,
@@ -119,97 +360,360 @@ def process_video(video_path: str, prompt_path: str, mode: str = "transcribe", p
     if mode == "procedure":
         # Parse the response into a structured format
         try:
-            # Extract sections from the response
-            text = response.text
-            sections = {}
-            
-            # Find the title
-            title_start = text.find("TITLE:") + 6
-            overview_start = text.find("OVERVIEW:")
-            sections["title"] = text[title_start:overview_start].strip()
-            
-            # Find the overview
-            prerequisites_start = text.find("PREREQUISITES:")
-            sections["overview"] = text[overview_start + 9:prerequisites_start].strip()
-            
-            # Find prerequisites
-            procedure_start = text.find("PROCEDURE:")
-            prereq_text = text[prerequisites_start + 14:procedure_start]
-            sections["prerequisites"] = [p.strip()[2:] for p in prereq_text.split("\n") if p.strip().startswith("-")]
-            
-            # Find steps
-            verification_start = text.find("VERIFICATION:")
-            procedure_text = text[procedure_start + 10:verification_start]
-            
-            # Parse steps
-            steps = []
-            current_step = None
-            
-            for line in procedure_text.split("\n"):
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                if line[0].isdigit() and "." in line:
-                    if current_step:
-                        steps.append(current_step)
-                    current_step = {
-                        "main": line[line.find(".")+1:].strip(),
-                        "sub": [],
-                        "warnings": [],
-                        "tips": []
-                    }
-                elif line.startswith("a.") or line.startswith("b.") or line.startswith("c."):
-                    if current_step:
-                        current_step["sub"].append(line[2:].strip())
-                elif line.startswith("⚠️"):
-                    if current_step:
-                        current_step["warnings"].append(line[2:].strip())
-                elif line.startswith("💡"):
-                    if current_step:
-                        current_step["tips"].append(line[2:].strip())
-                        
-            if current_step:
-                steps.append(current_step)
-                
-            sections["steps"] = steps
-            
-            # Find verification
-            troubleshooting_start = text.find("TROUBLESHOOTING:")
-            sections["verification"] = text[verification_start + 13:troubleshooting_start].strip()
-            
-            # Find troubleshooting
-            troubleshooting_text = text[troubleshooting_start + 16:].strip()
-            sections["troubleshooting"] = [t.strip()[2:] for t in troubleshooting_text.split("\n") if t.strip().startswith("-")]
+            with tracing.span("parse"):
+                sections = parse_procedure(text)
             
             # Add token usage to the response
             sections["token_usage"] = token_usage
+            if preprocess_report:
+                sections["preprocessing"] = preprocess_report
             
-            return json.dumps(sections)
+            result = json.dumps(sections)
         except Exception as e:
             raise ValueError(f"Failed to parse procedure: {str(e)}")
     else:
         # For transcribe mode, return both text and token usage
-        return json.dumps({
-            "text": response.text,
+        output = {
+            "text": text,
             "token_usage": token_usage
-        })
+        }
+        if preprocess_report:
+            output["preprocessing"] = preprocess_report
+        if audio_report:
+            output["audio"] = audio_report
+        result = json.dumps(output)
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Process video for transcription or procedure generation")
-    parser.add_argument("video_path", help="Path to the video file")
-    parser.add_argument("prompt_path", help="Path to the prompt file")
+    if cache is not None and request.cache_key is not None:
+        cache.put(request.cache_key, result)
+    return result
+
+def process_video(video_path: str, prompt_path: str, mode: str = "transcribe", pdf_path: str = None, model_name: str = "gemini-1.5-flash-002",
+                  cache: Optional[ResultCache] = None, refresh_cache: bool = False,
+                  storage: Optional[StorageBackend] = None, inline_max_bytes: int = DEFAULT_INLINE_MAX_BYTES,
+                  max_input_tokens: Optional[int] = None, preprocess: Optional["PreprocessOptions"] = None,
+                  audio: Optional["AudioOptions"] = None):
+    prompt, video_file_path, pdf_file_path = resolve_inputs(video_path, prompt_path, pdf_path)
+
+    # Return a stored result for identical inputs without calling the model
+    cache_key = None
+    digests = None
+    if cache is not None:
+        cache_key = result_cache_key(cache, video_file_path, prompt, model_name, mode, pdf_file_path, preprocess, audio)
+        digests = input_digests(cache, video_file_path, pdf_file_path)
+        if not refresh_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print("Returning cached result (no model call)", file=sys.stderr)
+                return cached
+
+    # Initialize the model based on the selected model name
+    model = get_model(model_name)
+    request = prepare_request(model, prompt, video_file_path, pdf_file_path, model_name, mode,
+                              storage, inline_max_bytes, max_input_tokens, preprocess, audio, digests)
+    request.cache_key = cache_key
+    try:
+        # Generate response
+        with tracing.span("model"):
+            response = model.generate_content(request.contents)
+        print("Received response from model", file=sys.stderr)
+    finally:
+        request.cleanup()
+
+    return finish_result(response, request, cache)
+
+async def process_video_async(video_path: str, prompt_path: str, mode: str = "transcribe", pdf_path: str = None,
+                              model_name: str = "gemini-1.5-flash-002", cache: Optional[ResultCache] = None,
+                              refresh_cache: bool = False, storage: Optional[StorageBackend] = None,
+                              inline_max_bytes: int = DEFAULT_INLINE_MAX_BYTES, max_input_tokens: Optional[int] = None,
+                              preprocess: Optional["PreprocessOptions"] = None,
+                              audio: Optional["AudioOptions"] = None,
+                              rate_limiter: Optional["RateLimiter"] = None):
+    """
+    process_video for use from an event loop: the model call goes through
+    generate_content_async, and the cache lookup (which may hash the whole
+    video), preprocessing, uploads and the pre-flight count run in a thread.
+    rate_limiter, if given, is awaited right before the model call, so cache
+    hits do not use up request slots.
+    """
+    prompt, video_file_path, pdf_file_path = resolve_inputs(video_path, prompt_path, pdf_path)
+
+    cache_key = None
+    digests = None
+    if cache is not None:
+        cache_key = await asyncio.to_thread(result_cache_key, cache, video_file_path, prompt, model_name, mode,
+                                            pdf_file_path, preprocess, audio)
+        digests = await asyncio.to_thread(input_digests, cache, video_file_path, pdf_file_path)
+        if not refresh_cache:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                print(f"Returning cached result for {video_path} (no model call)", file=sys.stderr)
+                return cached
+
+    model = get_model(model_name)
+    request = await asyncio.to_thread(prepare_request, model, prompt, video_file_path, pdf_file_path,
+                                      model_name, mode, storage, inline_max_bytes, max_input_tokens, preprocess, audio,
+                                      digests)
+    request.cache_key = cache_key
+    try:
+        if rate_limiter is not None:
+            await rate_limiter.wait()
+        with tracing.span("model"):
+            response = await model.generate_content_async(request.contents)
+        print(f"Received response from model for {video_path}", file=sys.stderr)
+    finally:
+        request.cleanup()
+
+    return finish_result(response, request, cache)
+
+@dataclass
+class StreamedResponse:
+    """A streamed response reassembled, for finish_result."""
+    text: str
+    usage_metadata: Any = None
+
+def process_video_stream(video_path: str, prompt_path: str, mode: str = "transcribe", pdf_path: str = None,
+                         model_name: str = "gemini-1.5-flash-002", cache: Optional[ResultCache] = None,
+                         refresh_cache: bool = False, storage: Optional[StorageBackend] = None,
+                         inline_max_bytes: int = DEFAULT_INLINE_MAX_BYTES, max_input_tokens: Optional[int] = None,
+                         preprocess: Optional["PreprocessOptions"] = None,
+                         audio: Optional["AudioOptions"] = None) -> Iterator[Dict]:
+    """
+    process_video with a streamed response, yielding events as the text
+    arrives: {"event": "text"} chunks in transcribe mode, or the title,
+    steps and other sections from ProcedureStreamParser in procedure mode,
+    each with the seconds "elapsed" since the request was sent.
+
+    The last event is {"event": "result", "result": ..., "timing": ...}
+    whose result is exactly what process_video would return (parsed from
+    JSON). timing has first_chunk_seconds, first_step_seconds (procedure
+    mode) and total_seconds.
+    """
+    prompt, video_file_path, pdf_file_path = resolve_inputs(video_path, prompt_path, pdf_path)
+
+    cache_key = None
+    digests = None
+    if cache is not None:
+        cache_key = result_cache_key(cache, video_file_path, prompt, model_name, mode, pdf_file_path, preprocess, audio)
+        digests = input_digests(cache, video_file_path, pdf_file_path)
+        if not refresh_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print("Returning cached result (no model call)", file=sys.stderr)
+                yield {"event": "result", "result": json.loads(cached), "cached": True}
+                return
+
+    model = get_model(model_name)
+    request = prepare_request(model, prompt, video_file_path, pdf_file_path, model_name, mode,
+                              storage, inline_max_bytes, max_input_tokens, preprocess, audio, digests)
+    request.cache_key = cache_key
+
+    parser = ProcedureStreamParser() if mode == "procedure" else None
+    remapper = None
+    if request.timestamp_segments:
+        from preprocess import TimestampRemapper
+        remapper = TimestampRemapper(request.timestamp_segments)
+    chunks = []
+    usage_metadata = None
+    timing = {}
+    start = time.perf_counter()
+    try:
+        for chunk in model.generate_content(request.contents, stream=True):
+            elapsed = round(time.perf_counter() - start, 3)
+            timing.setdefault("first_chunk_seconds", elapsed)
+            chunks.append(chunk.text)
+            # Each chunk carries the usage so far; the last one has the totals
+            usage_metadata = response_usage(chunk) or usage_metadata
+
+            with tracing.span("parse"):
+                text = remapper.feed(chunk.text) if remapper else chunk.text
+                if parser:
+                    events = parser.feed(text)
+                else:
+                    events = [{"event": "text", "value": text}] if text else []
+            for event in events:
+                if event["event"] == "step":
+                    timing.setdefault("first_step_seconds", elapsed)
+                event["elapsed"] = elapsed
+                yield event
+        print("Received response from model", file=sys.stderr)
+    finally:
+        request.cleanup()
+
+    # A timestamp-like tail held back by the remapper
+    tail = remapper.finish() if remapper else ""
+    if tail and not parser:
+        yield {"event": "text", "value": tail, "elapsed": round(time.perf_counter() - start, 3)}
+
+    if parser:
+        elapsed = round(time.perf_counter() - start, 3)
+        with tracing.span("parse"):
+            final_events = (parser.feed(tail) if tail else []) + parser.finish()
+        for event in final_events:
+            if event["event"] == "step":
+                timing.setdefault("first_step_seconds", elapsed)
+            event["elapsed"] = elapsed
+            yield event
+
+    result = finish_result(StreamedResponse("".join(chunks), usage_metadata), request, cache)
+    timing["total_seconds"] = round(time.perf_counter() - start, 3)
+    yield {"event": "result", "result": json.loads(result), "timing": timing}
+
+def add_processing_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options shared by this CLI and batch.py."""
     parser.add_argument("--mode", choices=["transcribe", "procedure"], default="transcribe",
                       help="Processing mode: transcribe or procedure")
     parser.add_argument("--pdf", help="Path to an optional PDF file for additional context")
     parser.add_argument("--model", choices=["gemini-1.5-flash-002", "gemini-1.5-pro-002"], 
                       default="gemini-1.5-flash-002", help="Gemini model to use")
+    parser.add_argument("--no-cache", action="store_true",
+                      help="Neither read nor write the local result cache")
+    parser.add_argument("--refresh-cache", action="store_true",
+                      help="Ignore any cached result, call the model and store the new result")
+    parser.add_argument("--cache-path", default=str(DEFAULT_CACHE_PATH),
+                      help="SQLite file for the local result cache")
+    parser.add_argument("--cache-ttl-hours", type=float, default=DEFAULT_TTL_SECONDS / 3600,
+                      help="Age after which cached results are discarded")
+    parser.add_argument("--gcs-bucket",
+                      help="Upload files larger than --inline-max-mb to this GCS bucket and pass them by URI")
+    parser.add_argument("--storage-dir",
+                      help="Stage large files in this local directory instead of GCS (file:// URIs)")
+    parser.add_argument("--inline-max-mb", type=float, default=DEFAULT_INLINE_MAX_BYTES / (1024 * 1024),
+                      help="Largest file sent inline in the request")
+    parser.add_argument("--max-input-tokens", type=int,
+                      help="Count input tokens before generating and fail if over this budget (extra round-trip)")
+    parser.add_argument("--audio-only", action="store_true",
+                      help="Transcribe mode: send only the audio track (extracted with ffmpeg) instead of the video; "
+                           "timestamps are mapped back to video time")
+    parser.add_argument("--min-silence", type=float, default=1.5,
+                      help="With --audio-only: cut silences longer than this many seconds (0 keeps all audio)")
+    parser.add_argument("--silence-margin-db", type=float, default=10.0,
+                      help="With --audio-only: how far above the noise floor audio must be to count as speech")
+    parser.add_argument("--audio-key-frames", type=int, default=0,
+                      help="With --audio-only: also send this many key frames of the video for context")
+    parser.add_argument("--preprocess", action="store_true",
+                      help="Procedure mode: re-encode the video locally at lower resolution/fps before upload "
+                           "(drops the audio track); timestamps are mapped back to video time")
+    parser.add_argument("--preprocess-width", type=int, default=1280,
+                      help="With --preprocess: maximum output width")
+    parser.add_argument("--preprocess-height", type=int, default=720,
+                      help="With --preprocess: maximum output height")
+    parser.add_argument("--preprocess-fps", type=float, default=1.0,
+                      help="With --preprocess: output frame rate (Gemini samples at 1 fps)")
+    parser.add_argument("--drop-static", action="store_true",
+                      help="With --preprocess: drop the tail of segments where the screen does not change")
+    parser.add_argument("--static-threshold", type=float, default=2.0,
+                      help="With --drop-static: mean frame difference below which a frame counts as static")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Process video for transcription or procedure generation")
+    parser.add_argument("video_path", help="Path to the video file")
+    parser.add_argument("prompt_path", help="Path to the prompt file")
+    add_processing_arguments(parser)
+    parser.add_argument("--stream", action="store_true",
+                      help="Stream the response and print NDJSON events (title, each step, ...) as they complete; "
+                           "the last event holds the usual result")
+    parser.add_argument("--segment", action="store_true",
+                      help="Split long videos at scene changes into segments that each stay in the lower pricing tier, "
+                           "process them in parallel and merge the results")
+    parser.add_argument("--segment-seconds", type=float,
+                      help="With --segment: maximum segment length (default: computed from the token tier)")
+    parser.add_argument("--scene-threshold", type=float, default=30.0,
+                      help="With --segment: frame difference that counts as a scene change")
+    parser.add_argument("--segment-concurrency", type=int, default=4,
+                      help="With --segment: segments sent to the model at once")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.stream and args.segment:
+        parser.error("--stream cannot be combined with --segment")
+    if args.audio_only and args.mode != "transcribe":
+        parser.error("--audio-only only applies to --mode transcribe")
+    if args.audio_only and args.preprocess:
+        parser.error("--audio-only cannot be combined with --preprocess")
+    if args.preprocess and args.mode == "transcribe":
+        parser.error("--preprocess drops the audio track, so it cannot be used in --mode transcribe "
+                     "(use --audio-only to shrink transcription inputs)")
+    return args
+
+def processing_options(args: argparse.Namespace) -> Dict:
+    """process_video keyword arguments for the options added by add_processing_arguments."""
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache_path, ttl_seconds=args.cache_ttl_hours * 3600)
+    storage = None
+    if args.gcs_bucket:
+        storage = GCSStorage(args.gcs_bucket, project=PROJECT_ID)
+    elif args.storage_dir:
+        storage = LocalStorage(args.storage_dir)
+    preprocess = None
+    if args.preprocess:
+        from preprocess import PreprocessOptions
+        preprocess = PreprocessOptions(
+            max_width=args.preprocess_width,
+            max_height=args.preprocess_height,
+            fps=args.preprocess_fps,
+            drop_static=args.drop_static,
+            static_threshold=args.static_threshold
+        )
+    audio = None
+    if args.audio_only:
+        from audio import AudioOptions
+        audio = AudioOptions(
+            trim_silence=args.min_silence > 0,
+            min_silence_seconds=args.min_silence,
+            margin_db=args.silence_margin_db,
+            key_frames=args.audio_key_frames
+        )
+    return {
+        "mode": args.mode,
+        "pdf_path": args.pdf,
+        "model_name": args.model,
+        "cache": cache,
+        "refresh_cache": args.refresh_cache,
+        "storage": storage,
+        "inline_max_bytes": int(args.inline_max_mb * 1024 * 1024),
+        "max_input_tokens": args.max_input_tokens,
+        "preprocess": preprocess,
+        "audio": audio
+    }
+
+def run(args: argparse.Namespace) -> str:
+    """Run process_video as described by parsed command-line args."""
+    if args.segment:
+        from segments import process_video_segmented
+        return process_video_segmented(args.video_path, args.prompt_path, **processing_options(args),
+                                       segment_seconds=args.segment_seconds,
+                                       scene_threshold=args.scene_threshold,
+                                       concurrency=args.segment_concurrency)
+    return process_video(args.video_path, args.prompt_path, **processing_options(args))
+
+def run_stream(args: argparse.Namespace) -> Iterator[Dict]:
+    """Run process_video_stream as described by parsed command-line args."""
+    return process_video_stream(args.video_path, args.prompt_path, **processing_options(args))
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
     
     try:
-        result = process_video(args.video_path, args.prompt_path, args.mode, args.pdf, args.model)
-        print(result)
+        with tracing.invocation("process_video", mode=args.mode, segment=args.segment, stream=args.stream):
+            sock = worker.connect()
+            if args.stream:
+                events = worker.stream(sock, "process_video_stream", vars(args)) if sock is not None else run_stream(args)
+                for event in events:
+                    print(json.dumps(event), flush=True)
+                return
+            if sock is not None:
+                # A warm worker process runs the request; we only relay the result
+                result = worker.request(sock, "process_video", vars(args))
+            else:
+                result = run(args)
+            print(result)
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
+
+if __name__ == "__main__":
+    # segments, batch and worker import this file as module "main"; run as a
+    # script it would otherwise load twice, with its own model cache and
+    # Vertex AI initialization
+    sys.modules.setdefault("main", sys.modules[__name__])
+    main()
@@ -0,0 +1,207 @@
+import os
+import shutil
+import subprocess
+import sys
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from units import AUDIO_TOKENS_PER_SECOND, VIDEO_TOKENS_PER_SECOND, map_timestamps
+from video_utils import VideoSession, make_thumbnail, resize_frame, thumbnail_size
+
+@dataclass
+class PreprocessOptions:
+    """How to re-encode a video before it is sent to the model."""
+    max_width: Optional[int] = 1280
+    max_height: Optional[int] = 720
+    fps: float = 1.0
+    drop_static: bool = False
+    static_threshold: float = 2.0    # mean thumbnail diff below which a frame counts as unchanged
+    keep_static_seconds: float = 2.0  # how much of each static run to keep
+    thumbnail_width: int = 64
+
+def _open_writer(output_path: str, fps: float, size) -> cv2.VideoWriter:
+    # H.264 if this OpenCV build can encode it, else MPEG-4 Part 2
+    for fourcc in ("avc1", "mp4v"):
+        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if writer.isOpened():
+            return writer
+        writer.release()
+    raise ValueError(f"Failed to open video writer: {output_path}")
+
+def cut_video(input_path: str, output_path: str, start_seconds: float, end_seconds: Optional[float] = None) -> bool:
+    """
+    Write [start_seconds, end_seconds) of a video to output_path. Uses
+    ffmpeg when it is on the PATH, re-encoding so the cut is frame-accurate
+    and the audio track is kept; otherwise falls back to OpenCV, which
+    writes video only. Returns whether the output has audio.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        command = [ffmpeg, "-y", "-v", "error", "-ss", f"{start_seconds:.3f}", "-i", input_path]
+        if end_seconds is not None:
+            command += ["-t", f"{end_seconds - start_seconds:.3f}"]
+        command += ["-c:v", "libx264", "-preset", "veryfast", "-c:a", "aac", output_path]
+        subprocess.run(command, check=True)
+        return True
+
+    with VideoSession(input_path) as session:
+        fps = session.fps or 30.0
+        start_frame = int(round(start_seconds * fps))
+        end_frame = int(round(end_seconds * fps)) if end_seconds is not None else None
+        session.seek(start_frame)
+
+        writer = _open_writer(output_path, fps, (session.width, session.height))
+        frame_index = start_frame
+        try:
+            while end_frame is None or frame_index < end_frame:
+                ret, frame = session.cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+                frame_index += 1
+        finally:
+            writer.release()
+
+    if frame_index == start_frame:
+        raise ValueError(f"No frames could be read from {input_path} after {start_seconds:.1f}s")
+    return False
+
+def remap_time(seconds: float, segments: List[Dict]) -> float:
+    """
+    Map a position in the preprocessed video back to the source video using
+    the segments table from preprocess_video.
+    """
+    for segment in reversed(segments):
+        if seconds >= segment["output_start"]:
+            return segment["source_start"] + (seconds - segment["output_start"])
+    return seconds
+
+def remap_timestamps(text: str, segments: List[Dict]) -> str:
+    """Rewrite every [HH:MM:SS] or [MM:SS] timestamp in text from output time to source time."""
+    return map_timestamps(text, lambda seconds: remap_time(seconds, segments))
+
+class TimestampRemapper:
+    """
+    remap_timestamps for streamed text: a chunk that ends inside what may
+    be a timestamp is held back until the next chunk completes it.
+    """
+    MAX_TIMESTAMP_CHARS = 10  # "[HH:MM:SS]"
+
+    def __init__(self, segments: List[Dict]):
+        self.segments = segments
+        self.pending = ""
+
+    def feed(self, text: str) -> str:
+        text = self.pending + text
+        open_bracket = text.rfind("[")
+        if open_bracket != -1 and "]" not in text[open_bracket:] and len(text) - open_bracket < self.MAX_TIMESTAMP_CHARS:
+            text, self.pending = text[:open_bracket], text[open_bracket:]
+        else:
+            self.pending = ""
+        return remap_timestamps(text, self.segments)
+
+    def finish(self) -> str:
+        text, self.pending = self.pending, ""
+        return remap_timestamps(text, self.segments)
+
+def preprocess_video(input_path: str, output_path: str, options: Optional[PreprocessOptions] = None) -> Dict:
+    """
+    Re-encode a video at a lower resolution and frame rate, optionally
+    dropping the tail of static stretches (runs of frames that differ from
+    the previous kept frame by less than static_threshold, compared as
+    thumbnails the same way as detect_scene_changes).
+
+    Returns a report with the byte sizes, the estimated input token saving
+    and a segments table mapping output time back to source time (see
+    remap_timestamps). The output has no audio track: OpenCV does not carry
+    audio through.
+    """
+    options = options or PreprocessOptions()
+
+    with VideoSession(input_path) as session:
+        source_fps = session.fps or 30.0
+        step = max(1, int(round(source_fps / options.fps)))
+        out_fps = source_fps / step
+        keep_static = int(round(options.keep_static_seconds * out_fps))
+        size = thumbnail_size(session, options.thumbnail_width)
+
+        writer = None
+        segments = []
+        written = 0
+        dropped = 0
+        static_run = 0
+        prev_thumb = None
+        in_segment = False
+
+        frame_index = -1
+        while session.cap.grab():
+            frame_index += 1
+            if frame_index % step:
+                continue
+            ret, frame = session.cap.retrieve()
+            if not ret:
+                continue
+
+            if options.drop_static:
+                thumb = make_thumbnail(frame, size)
+                if prev_thumb is not None and np.mean(cv2.absdiff(thumb, prev_thumb)) < options.static_threshold:
+                    static_run += 1
+                else:
+                    static_run = 0
+                    prev_thumb = thumb
+                if static_run > keep_static:
+                    dropped += 1
+                    in_segment = False
+                    continue
+
+            if not in_segment:
+                segments.append({
+                    "output_start": round(written / out_fps, 3),
+                    "source_start": round(frame_index / source_fps, 3)
+                })
+                in_segment = True
+
+            frame = resize_frame(frame, options.max_width, options.max_height)
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = _open_writer(output_path, out_fps, (width, height))
+            writer.write(frame)
+            written += 1
+
+        if writer is not None:
+            writer.release()
+        source_duration = session.duration
+
+    if not written:
+        raise ValueError(f"No frames could be read from {input_path}")
+
+    output_duration = written / out_fps
+    source_bytes = os.path.getsize(input_path)
+    output_bytes = os.path.getsize(output_path)
+    source_tokens = int(source_duration * (VIDEO_TOKENS_PER_SECOND + AUDIO_TOKENS_PER_SECOND))
+    output_tokens = int(output_duration * VIDEO_TOKENS_PER_SECOND)
+
+    report = {
+        "options": asdict(options),
+        "source_bytes": source_bytes,
+        "output_bytes": output_bytes,
+        "bytes_saved": source_bytes - output_bytes,
+        "source_duration": round(source_duration, 3),
+        "output_duration": round(output_duration, 3),
+        "frames_written": written,
+        "frames_dropped_static": dropped,
+        "estimated_source_tokens": source_tokens,
+        "estimated_output_tokens": output_tokens,
+        "estimated_tokens_saved": source_tokens - output_tokens,
+        "segments": segments
+    }
+    print(
+        f"Preprocessed video: {source_bytes} -> {output_bytes} bytes, "
+        f"{source_duration:.1f}s -> {output_duration:.1f}s, "
+        f"~{report['estimated_tokens_saved']} input tokens saved",
+        file=sys.stderr
+    )
+    return report
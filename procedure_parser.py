@@ -0,0 +1,198 @@
+"""
+Parsing of the model's procedure-mode responses (the TITLE:/OVERVIEW:/
+PREREQUISITES:/PROCEDURE:/VERIFICATION:/TROUBLESHOOTING: format requested by
+the procedure prompts) into the structure process_video returns.
+
+ProcedureParser reads a response line by line in a single pass. A line that
+starts with a known section header switches sections, so sections may be
+missing, repeated or out of order; headers may carry markdown emphasis
+("**PROCEDURE:**", "## PROCEDURE:"). parse() handles a complete response and
+ProcedureStreamParser one that arrives in chunks; both go through the same
+line handling, so a streamed response parses exactly like the full text.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+@dataclass
+class ProcedureStep:
+    main: str
+    sub: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    tips: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {"main": self.main, "sub": list(self.sub), "warnings": list(self.warnings), "tips": list(self.tips)}
+
+@dataclass
+class Procedure:
+    title: str = ""
+    overview: str = ""
+    prerequisites: List[str] = field(default_factory=list)
+    steps: List[ProcedureStep] = field(default_factory=list)
+    verification: str = ""
+    troubleshooting: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        # Field by field: dataclasses.asdict deep-copies recursively and
+        # dominates parse time on long procedures
+        return {
+            "title": self.title,
+            "overview": self.overview,
+            "prerequisites": list(self.prerequisites),
+            "steps": [step.to_dict() for step in self.steps],
+            "verification": self.verification,
+            "troubleshooting": list(self.troubleshooting)
+        }
+
+# Header text -> Procedure field. Headers from the GUI prompt map onto the
+# same fields; None means the section's content is skipped.
+SECTION_HEADERS = {
+    "TITLE": "title",
+    "OVERVIEW": "overview",
+    "PREREQUISITES": "prerequisites",
+    "INTERFACE SETUP": "prerequisites",
+    "PROCEDURE": "steps",
+    "VERIFICATION": "verification",
+    "COMPLETION VERIFICATION": "verification",
+    "VISUAL CONFIRMATION POINTS": None,
+    "TROUBLESHOOTING": "troubleshooting",
+}
+TEXT_SECTIONS = {"title", "overview", "verification"}
+LIST_EVENTS = {"prerequisites": "prerequisite", "troubleshooting": "troubleshooting"}
+
+HEADER_PATTERN = re.compile(r"^[#*_\s]*(" + "|".join(sorted(SECTION_HEADERS, key=len, reverse=True)) + r")[*_]*:[*_]*\s*")
+STEP_PATTERN = re.compile(r"^(\d+)[.)]\s*")
+SUB_STEP_PATTERN = re.compile(r"^[a-z][.)](?:\s+|$)")
+BULLETS = "-*•"
+WARNING_MARK = "⚠"
+TIP_MARK = "💡"
+VARIATION_SELECTOR = "\ufe0f"  # emoji presentation suffix, as in "⚠️"
+
+class ProcedureParser:
+    """
+    Single-pass, line-at-a-time procedure parser.
+
+    feed_line() and finish() return events for the parts they complete:
+    {"event": name, "value": value} with name one of title, overview,
+    prerequisite, step, verification or troubleshooting. Steps are complete
+    when the next step or section starts and also carry a 1-based "number";
+    text sections are complete when the next section starts.
+    """
+
+    def __init__(self):
+        self.procedure = Procedure()
+        self._section: Optional[str] = None
+        self._in_section = False  # False before the first header and in skipped sections
+        self._text: List[str] = []
+        self._step: Optional[ProcedureStep] = None
+
+    def feed_line(self, line: str) -> List[Dict]:
+        events = []
+        header = HEADER_PATTERN.match(line)
+        if header:
+            self._close_section(events)
+            self._section = SECTION_HEADERS[header.group(1)]
+            self._in_section = self._section is not None
+            line = line[header.end():]
+
+        if not self._in_section:
+            return events
+        if self._section in TEXT_SECTIONS:
+            self._text.append(line)
+            return events
+
+        line = line.strip()
+        if not line:
+            return events
+        if self._section == "steps":
+            self._step_line(line, events)
+        elif line[0] in BULLETS:
+            item = line[1:].strip()
+            getattr(self.procedure, self._section).append(item)
+            events.append({"event": LIST_EVENTS[self._section], "value": item})
+        return events
+
+    def finish(self) -> List[Dict]:
+        events = []
+        self._close_section(events)
+        self._section = None
+        self._in_section = False
+        return events
+
+    def _step_line(self, line: str, events: List[Dict]) -> None:
+        step = STEP_PATTERN.match(line)
+        if step:
+            self._finish_step(events)
+            self._step = ProcedureStep(line[step.end():].strip())
+            return
+        if self._step is None:
+            return
+
+        if SUB_STEP_PATTERN.match(line):
+            self._step.sub.append(line[2:].strip())
+        elif line.startswith(WARNING_MARK):
+            self._step.warnings.append(line[len(WARNING_MARK):].lstrip(VARIATION_SELECTOR).strip())
+        elif line.startswith(TIP_MARK):
+            self._step.tips.append(line[len(TIP_MARK):].lstrip(VARIATION_SELECTOR).strip())
+
+    def _finish_step(self, events: List[Dict]) -> None:
+        if self._step is not None:
+            self.procedure.steps.append(self._step)
+            events.append({"event": "step", "number": len(self.procedure.steps), "value": self._step.to_dict()})
+        self._step = None
+
+    def _close_section(self, events: List[Dict]) -> None:
+        if not self._in_section:
+            return
+        if self._section in TEXT_SECTIONS:
+            value = "\n".join(self._text).strip()
+            previous = getattr(self.procedure, self._section)
+            if previous and value:
+                value = f"{previous}\n\n{value}"
+            setattr(self.procedure, self._section, value or previous)
+            events.append({"event": self._section, "value": value or previous})
+            self._text = []
+        elif self._section == "steps":
+            self._finish_step(events)
+
+def parse(text: str) -> Procedure:
+    """Parse a complete procedure response."""
+    parser = ProcedureParser()
+    for line in text.split("\n"):
+        parser.feed_line(line.rstrip("\r"))
+    parser.finish()
+    return parser.procedure
+
+def parse_procedure(text: str) -> Dict:
+    """parse() as the plain dict stored in process_video results."""
+    return parse(text).to_dict()
+
+class ProcedureStreamParser:
+    """
+    ProcedureParser for a response that arrives in chunks: complete lines
+    are parsed as soon as their newline arrives. feed() and finish() return
+    the events the new text completes; result() equals parse_procedure() of
+    the concatenated chunks.
+    """
+
+    def __init__(self):
+        self._parser = ProcedureParser()
+        self._partial = ""
+
+    def feed(self, chunk: str) -> List[Dict]:
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        events = []
+        for line in lines:
+            events.extend(self._parser.feed_line(line.rstrip("\r")))
+        return events
+
+    def finish(self) -> List[Dict]:
+        events = self._parser.feed_line(self._partial.rstrip("\r"))
+        self._partial = ""
+        events.extend(self._parser.finish())
+        return events
+
+    def result(self) -> Dict:
+        return self._parser.procedure.to_dict()
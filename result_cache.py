@@ -0,0 +1,153 @@
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from hashing import file_fingerprint, hash_file, hash_text
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "video-analysis" / "results.sqlite3"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Input files whose content hashes are remembered; the oldest are forgotten
+# first. Uploads land in fresh scratch paths, so every request adds one.
+MAX_FILE_HASH_ENTRIES = 4096
+
+class ResultCache:
+    """
+    On-disk store of process_video results, keyed by the content of every
+    model input (video, PDF, prompt) plus model and mode.
+
+    Entries expire after ttl_seconds, and the total stored size is kept under
+    max_bytes by dropping least-recently-read entries. Content hashes of
+    input files are memoized by path, size and mtime so a cache lookup for
+    an unchanged multi-GB video does not re-read it; the last
+    MAX_FILE_HASH_ENTRIES files are remembered.
+
+    Methods may be called from several threads (process_video_async hashes
+    and looks up in a worker thread); statements on the shared connection
+    are serialized, and file hashing runs outside the lock.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.db_path = Path(db_path) if db_path else DEFAULT_CACHE_PATH
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at);
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                fingerprint TEXT PRIMARY KEY,
+                digest TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def file_hash(self, path: str) -> str:
+        fingerprint = file_fingerprint(path)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT digest FROM file_hashes WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        if row:
+            return row[0]
+
+        print(f"Hashing file contents: {path}", file=sys.stderr)
+        digest = hash_file(path)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO file_hashes (fingerprint, digest) VALUES (?, ?)",
+                (fingerprint, digest)
+            )
+            # Rows are numbered in insertion order, so this keeps the newest
+            self.conn.execute(
+                "DELETE FROM file_hashes WHERE rowid <= (SELECT MAX(rowid) FROM file_hashes) - ?",
+                (MAX_FILE_HASH_ENTRIES,)
+            )
+        return digest
+
+    def key(
+        self,
+        video_path: str,
+        prompt: str,
+        model_name: str,
+        mode: str,
+        pdf_path: Optional[str] = None,
+        *extra: str
+    ) -> str:
+        """Cache key for one process_video request."""
+        return hash_text(
+            self.file_hash(video_path),
+            self.file_hash(pdf_path) if pdf_path else None,
+            prompt,
+            model_name,
+            mode,
+            *extra
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            self.conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-read ones over max_bytes."""
+        with self._lock, self.conn:
+            removed = self.conn.execute(
+                "DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self.conn.execute(
+                    "SELECT key, size FROM results ORDER BY accessed_at"
+                ).fetchall()
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
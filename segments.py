@@ -0,0 +1,240 @@
+"""
+Segmented processing for recordings too long for one request.
+
+The video is cut at scene changes into segments that each fit under the
+lower pricing tier (LOW_TIER_MAX_TOKENS in main.py), the segments are sent
+to the model concurrently, and the per-segment results are merged in order:
+transcript timestamps are shifted to absolute positions and procedure steps
+are concatenated so they number straight through.
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import jobs
+import main
+from result_cache import ResultCache
+from storage import StorageBackend, DEFAULT_INLINE_MAX_BYTES
+from units import AUDIO_TOKENS_PER_SECOND, VIDEO_TOKENS_PER_SECOND, estimate_text_tokens, map_timestamps
+
+if TYPE_CHECKING:
+    from preprocess import PreprocessOptions
+    from audio import AudioOptions
+
+# Room left in each segment's budget for the model's answer (Gemini 1.5
+# returns at most 8192 tokens).
+RESPONSE_TOKEN_RESERVE = 8192
+
+# A scene change is only used as a cut if it leaves the segment at least
+# this fraction of the maximum length; otherwise the cut falls at the limit.
+MIN_SEGMENT_FRACTION = 0.5
+
+def max_segment_seconds(prompt: str, has_audio: bool = True,
+                        token_limit: int = main.LOW_TIER_MAX_TOKENS, has_video: bool = True,
+                        fixed_tokens: int = 0) -> float:
+    """
+    Longest segment whose request (prompt, video and answer, plus
+    fixed_tokens such as images) stays within token_limit.
+    """
+    tokens_per_second = ((VIDEO_TOKENS_PER_SECOND if has_video else 0) +
+                         (AUDIO_TOKENS_PER_SECOND if has_audio else 0))
+    budget = token_limit - estimate_text_tokens(prompt) - RESPONSE_TOKEN_RESERVE - fixed_tokens
+    if budget <= tokens_per_second:
+        raise ValueError("Prompt leaves no room for video within the token limit")
+    return budget / tokens_per_second
+
+def plan_segments(duration: float, change_times: List[float], max_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Split [0, duration) into segments of at most max_seconds, cutting at the
+    latest scene change that leaves the segment at least half that long, or
+    at the limit when there is none.
+    """
+    segments = []
+    start = 0.0
+    while duration - start > max_seconds:
+        earliest, latest = start + max_seconds * MIN_SEGMENT_FRACTION, start + max_seconds
+        candidates = [t for t in change_times if earliest <= t <= latest]
+        cut = candidates[-1] if candidates else latest
+        segments.append((start, cut))
+        start = cut
+    segments.append((start, duration))
+    return segments
+
+def shift_timestamps(text: str, offset_seconds: float) -> str:
+    """Add offset_seconds to every [HH:MM:SS] or [MM:SS] timestamp in text."""
+    if not offset_seconds:
+        return text
+    offset = int(round(offset_seconds))
+    return map_timestamps(text, lambda seconds: seconds + offset)
+
+def _shift_step(step: Dict, offset_seconds: float) -> Dict:
+    shifted = {}
+    for key, value in step.items():
+        if isinstance(value, str):
+            value = shift_timestamps(value, offset_seconds)
+        elif isinstance(value, list):
+            value = [shift_timestamps(v, offset_seconds) if isinstance(v, str) else v for v in value]
+        shifted[key] = value
+    return shifted
+
+def _unique(items: List[str]) -> List[str]:
+    return list(dict.fromkeys(items))
+
+def merge_token_usage(usages: List[Dict], model_name: str) -> Dict:
+    """Sum per-segment token usage; each segment is billed at its own tier."""
+    costs = {"model": model_name, "input_cost": 0.0, "output_cost": 0.0, "total_cost": 0.0}
+    for usage in usages:
+        for key in ("input_cost", "output_cost", "total_cost"):
+            costs[key] += usage["costs"][key]
+    for key in ("input_cost", "output_cost", "total_cost"):
+        costs[key] = round(costs[key], 6)
+
+    prompt_tokens = sum(usage["prompt_tokens"] for usage in usages)
+    response_tokens = sum(usage["response_tokens"] for usage in usages)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "total_tokens": prompt_tokens + response_tokens,
+        "costs": costs
+    }
+
+def merge_results(mode: str, results: List[Dict], segments: List[Tuple[float, float]], model_name: str) -> Dict:
+    """Combine per-segment process_video results, given in segment order."""
+    if mode == "procedure":
+        merged = {
+            "title": next((r["title"] for r in results if r.get("title")), ""),
+            "overview": next((r["overview"] for r in results if r.get("overview")), ""),
+            "prerequisites": _unique([p for r in results for p in r.get("prerequisites", [])]),
+            "steps": [
+                _shift_step(step, start)
+                for r, (start, _) in zip(results, segments)
+                for step in r.get("steps", [])
+            ],
+            # The last segment is where the finished result is checked
+            "verification": next((r["verification"] for r in reversed(results) if r.get("verification")), ""),
+            "troubleshooting": _unique([t for r in results for t in r.get("troubleshooting", [])])
+        }
+    else:
+        merged = {
+            "text": "\n".join(
+                shift_timestamps(r["text"].strip(), start) for r, (start, _) in zip(results, segments)
+            )
+        }
+
+    merged["token_usage"] = merge_token_usage([r["token_usage"] for r in results], model_name)
+    merged["segments"] = [
+        {
+            "start": round(start, 3),
+            "end": round(end, 3),
+            "token_usage": r["token_usage"],
+            **({"preprocessing": r["preprocessing"]} if "preprocessing" in r else {}),
+            **({"audio": r["audio"]} if "audio" in r else {})
+        }
+        for r, (start, end) in zip(results, segments)
+    ]
+    return merged
+
+async def _process_segments(segment_paths: List[str], prompt_path: str, concurrency: int, options: Dict) -> List[Dict]:
+    semaphore = asyncio.Semaphore(concurrency)
+    finished = 0
+
+    async def run_segment(index: int, path: str) -> Dict:
+        nonlocal finished
+        async with semaphore:
+            print(f"Processing segment {index + 1}/{len(segment_paths)}", file=sys.stderr)
+            result = json.loads(await main.process_video_async(path, prompt_path, **options))
+        finished += 1
+        jobs.progress("Segments processed", finished, len(segment_paths))
+        return result
+
+    return await asyncio.gather(*(run_segment(i, path) for i, path in enumerate(segment_paths)))
+
+def process_video_segmented(video_path: str, prompt_path: str, mode: str = "transcribe", pdf_path: str = None,
+                            model_name: str = "gemini-1.5-flash-002", cache: Optional[ResultCache] = None,
+                            refresh_cache: bool = False, storage: Optional[StorageBackend] = None,
+                            inline_max_bytes: int = DEFAULT_INLINE_MAX_BYTES, max_input_tokens: Optional[int] = None,
+                            preprocess: Optional["PreprocessOptions"] = None, segment_seconds: Optional[float] = None,
+                            scene_threshold: float = 30.0, concurrency: int = 4,
+                            audio: Optional["AudioOptions"] = None) -> str:
+    """
+    Like process_video, but for videos that would not fit the lower pricing
+    tier in one request. Segments are cut at scene changes (fast scan),
+    processed concurrently, and merged into a result of the same shape as
+    process_video's plus a "segments" list with each segment's span and
+    token usage. segment_seconds overrides the computed maximum length.
+
+    A PDF is sent with every segment and is not counted in the plan; lower
+    segment_seconds if a large PDF pushes segments over the tier. With
+    audio, segments are sized for audio-only requests, and each one's
+    timestamps are mapped back to its own video time before merging.
+    """
+    from preprocess import cut_video
+    from video_utils import VideoSession, scene_change_frames
+
+    prompt, video_file_path, _ = main.resolve_inputs(video_path, prompt_path, pdf_path)
+
+    options = {
+        "mode": mode,
+        "pdf_path": pdf_path,
+        "model_name": model_name,
+        "storage": storage,
+        "inline_max_bytes": inline_max_bytes,
+        "max_input_tokens": max_input_tokens,
+        "preprocess": preprocess,
+        "audio": audio
+    }
+
+    if audio is not None:
+        from audio import IMAGE_TOKENS
+        max_seconds = segment_seconds or max_segment_seconds(prompt, has_video=False,
+                                                             fixed_tokens=audio.key_frames * IMAGE_TOKENS)
+    else:
+        max_seconds = segment_seconds or max_segment_seconds(prompt, has_audio=preprocess is None)
+    with VideoSession(str(video_file_path)) as session:
+        duration = session.duration
+        fps = session.fps or 30.0
+    if duration <= max_seconds:
+        # Fits in one request: no need to cut (or re-encode) anything
+        return main.process_video(video_path, prompt_path, cache=cache, refresh_cache=refresh_cache, **options)
+
+    # Whole-video results are cached; segment files are fresh encodes each run
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.key(str(video_file_path), prompt, model_name, mode, pdf_path,
+                              json.dumps(asdict(preprocess), sort_keys=True) if preprocess else "",
+                              f"segmented:{segment_seconds}:{scene_threshold}",
+                              *(["audio:" + json.dumps(asdict(audio), sort_keys=True)] if audio is not None else []))
+        if not refresh_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print("Returning cached result (no model call)", file=sys.stderr)
+                return cached
+
+    if shutil.which("ffmpeg") is None:
+        if mode == "transcribe":
+            raise ValueError("Segmented transcription needs ffmpeg on the PATH to keep the audio track")
+        print("Warning: ffmpeg not found; segments are cut with OpenCV and have no audio", file=sys.stderr)
+
+    change_times = [index / fps for index in scene_change_frames(str(video_file_path), scene_threshold)]
+
+    segments = plan_segments(duration, change_times, max_seconds)
+    print(f"Split {duration:.1f}s video into {len(segments)} segments of at most {max_seconds:.0f}s", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory(prefix="segments-") as tmp:
+        segment_paths = []
+        for i, (start, end) in enumerate(segments):
+            path = os.path.join(tmp, f"segment-{i:03d}.mp4")
+            cut_video(str(video_file_path), path, start, end if i < len(segments) - 1 else None)
+            segment_paths.append(path)
+
+        results = asyncio.run(_process_segments(segment_paths, str(prompt_path), concurrency, options))
+
+    result = json.dumps(merge_results(mode, results, segments, model_name))
+    if cache is not None:
+        cache.put(cache_key, result)
+    return result
@@ -0,0 +1,76 @@
+import shutil
+from abc import ABC, abstractmethod
+import sys
+from pathlib import Path
+from typing import Optional
+
+from hashing import hash_file
+
+# Requests to Vertex AI are limited to about 20 MB of inline data; larger
+# inputs have to be passed by reference.
+DEFAULT_INLINE_MAX_BYTES = 20 * 1024 * 1024
+
+class StorageBackend(ABC):
+    """
+    Where large model inputs are staged so they can be passed to Gemini as a
+    URI instead of inline bytes. Objects are named by content hash, so the
+    same file is only uploaded once.
+    """
+
+    @abstractmethod
+    def upload(self, local_path: str, mime_type: str, digest: Optional[str] = None) -> str:
+        """
+        Stream local_path to the store and return its URI. digest is the
+        file's hash_file() digest when the caller already has it, so the
+        file is not read an extra time just to name the object.
+        """
+
+    @staticmethod
+    def object_name(local_path: str, digest: Optional[str] = None) -> str:
+        return f"{digest or hash_file(local_path)}{Path(local_path).suffix.lower()}"
+
+class GCSStorage(StorageBackend):
+    """Stage files in a Google Cloud Storage bucket (gs:// URIs)."""
+
+    def __init__(self, bucket: str, prefix: str = "video-inputs", project: Optional[str] = None):
+        self.bucket_name = bucket
+        self.prefix = prefix.strip("/")
+        self.project = project
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            from google.cloud import storage
+            self._bucket = storage.Client(project=self.project).bucket(self.bucket_name)
+        return self._bucket
+
+    def upload(self, local_path: str, mime_type: str, digest: Optional[str] = None) -> str:
+        name = self.object_name(local_path, digest)
+        if self.prefix:
+            name = f"{self.prefix}/{name}"
+        blob = self.bucket.blob(name)
+        if blob.exists():
+            print(f"Already uploaded: gs://{self.bucket_name}/{name}", file=sys.stderr)
+        else:
+            print(f"Uploading {local_path} to gs://{self.bucket_name}/{name}", file=sys.stderr)
+            # upload_from_filename reads the file in chunks (resumable upload)
+            blob.upload_from_filename(local_path, content_type=mime_type)
+        return f"gs://{self.bucket_name}/{name}"
+
+class LocalStorage(StorageBackend):
+    """
+    Stage files in a local directory and return file:// URIs. Stands in for
+    GCS in tests and offline runs.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def upload(self, local_path: str, mime_type: str, digest: Optional[str] = None) -> str:
+        target = self.root / self.object_name(local_path, digest)
+        if not target.exists():
+            print(f"Copying {local_path} to {target}", file=sys.stderr)
+            shutil.copyfile(local_path, target)
+        return target.resolve().as_uri()
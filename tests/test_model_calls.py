@@ -0,0 +1,157 @@
+"""
+Network calls made per process_video request, counted against a stub of
+the Vertex AI SDK's generative_models module: one generate call, one more
+count_tokens call only with a pre-flight token budget, and none at all when
+the result cache already has the answer.
+"""
+import asyncio
+import json
+import sys
+import types
+
+import pytest
+
+import main
+from result_cache import ResultCache
+
+RESPONSE_TEXT = "TITLE: Demo\nOVERVIEW: Over\nPROCEDURE:\n1. Step one\nVERIFICATION: ok\n"
+
+class StubUsage:
+    prompt_token_count = 1200
+    candidates_token_count = 30
+    total_token_count = 1230
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = StubUsage()
+
+class StubTokenCount:
+    total_tokens = 1200
+
+class StubPart:
+    def __init__(self, **fields):
+        self.fields = fields
+
+    @classmethod
+    def from_data(cls, data, mime_type):
+        return cls(data=data, mime_type=mime_type)
+
+    @classmethod
+    def from_uri(cls, uri, mime_type):
+        return cls(uri=uri, mime_type=mime_type)
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(text=text)
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Install the stub SDK and return the list every model call is appended to."""
+    calls = []
+
+    class StubGenerativeModel:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+        def count_tokens(self, contents):
+            calls.append("count_tokens")
+            return StubTokenCount()
+
+        def generate_content(self, contents, stream=False):
+            calls.append("generate_content")
+            if stream:
+                return iter([StubResponse(RESPONSE_TEXT[i:i + 8]) for i in range(0, len(RESPONSE_TEXT), 8)])
+            return StubResponse(RESPONSE_TEXT)
+
+        async def generate_content_async(self, contents):
+            calls.append("generate_content_async")
+            return StubResponse(RESPONSE_TEXT)
+
+    generative_models = types.ModuleType("vertexai.preview.generative_models")
+    generative_models.GenerativeModel = StubGenerativeModel
+    generative_models.Part = StubPart
+    preview = types.ModuleType("vertexai.preview")
+    preview.generative_models = generative_models
+    vertexai = types.ModuleType("vertexai")
+    vertexai.preview = preview
+    monkeypatch.setitem(sys.modules, "vertexai", vertexai)
+    monkeypatch.setitem(sys.modules, "vertexai.preview", preview)
+    monkeypatch.setitem(sys.modules, "vertexai.preview.generative_models", generative_models)
+
+    monkeypatch.setattr(main, "_models", {})
+    monkeypatch.setattr(main, "_vertex_initialized", True)
+    return calls
+
+@pytest.fixture
+def inputs(tmp_path):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"not decoded: sent inline as it is")
+    prompt = tmp_path / "prompt.txt"
+    prompt.write_text("Describe the video")
+    return str(video), str(prompt)
+
+def test_one_generate_call(calls, inputs):
+    result = json.loads(main.process_video(*inputs, mode="procedure"))
+
+    assert calls == ["generate_content"]
+    # Usage comes from the response, not from a count_tokens call
+    assert result["token_usage"]["prompt_tokens"] == StubUsage.prompt_token_count
+    assert result["token_usage"]["response_tokens"] == StubUsage.candidates_token_count
+
+def test_preflight_budget_adds_one_count_call(calls, inputs):
+    main.process_video(*inputs, max_input_tokens=100000)
+
+    assert calls == ["count_tokens", "generate_content"]
+
+def test_preflight_budget_exceeded_skips_generation(calls, inputs):
+    with pytest.raises(ValueError, match="over the budget"):
+        main.process_video(*inputs, max_input_tokens=1000)
+
+    assert calls == ["count_tokens"]
+
+def test_cache_hit_makes_no_calls(calls, inputs, tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"))
+    first = main.process_video(*inputs, cache=cache)
+    assert calls == ["generate_content"]
+
+    assert main.process_video(*inputs, cache=cache) == first
+    assert calls == ["generate_content"]
+
+def test_refresh_cache_calls_again(calls, inputs, tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"))
+    main.process_video(*inputs, cache=cache)
+    main.process_video(*inputs, cache=cache, refresh_cache=True)
+
+    assert calls == ["generate_content", "generate_content"]
+
+def test_streamed_request_makes_one_call(calls, inputs):
+    events = list(main.process_video_stream(*inputs, mode="procedure"))
+
+    assert calls == ["generate_content"]
+    assert events[-1]["result"]["token_usage"]["prompt_tokens"] == StubUsage.prompt_token_count
+
+def test_async_request_makes_one_call(calls, inputs):
+    asyncio.run(main.process_video_async(*inputs))
+
+    assert calls == ["generate_content_async"]
+
+def test_mismatched_options_make_no_calls(calls, inputs):
+    from audio import AudioOptions
+
+    with pytest.raises(ValueError, match="only supported in transcribe mode"):
+        main.process_video(*inputs, mode="procedure", audio=AudioOptions())
+
+    assert calls == []
+
+def test_cli_rejects_preprocess_in_transcribe_mode(capsys):
+    with pytest.raises(SystemExit):
+        main.parse_args(["video.mp4", "prompt.txt", "--preprocess"])
+
+    assert "--preprocess drops the audio track" in capsys.readouterr().err
+
+def test_token_counts_from_raw_response():
+    # SDK releases without GenerationResponse.usage_metadata keep it on the proto
+    response = types.SimpleNamespace(text=RESPONSE_TEXT, _raw_response=types.SimpleNamespace(usage_metadata=StubUsage()))
+    assert main.response_token_counts(response) == (1200, 30)
+    assert main.response_token_counts(types.SimpleNamespace(text=RESPONSE_TEXT)) == (None, None)
@@ -0,0 +1,89 @@
+"""
+parse_procedure must reproduce the golden results in
+benchmarks/corpus/procedure, and ProcedureStreamParser must parse a
+response exactly like parse_procedure does the full text, wherever the
+chunk boundaries fall: inside a header, between "\r" and "\n", in the
+middle of an emoji.
+"""
+import json
+from pathlib import Path
+
+import pytest
+from hypothesis import given, strategies as st
+
+from procedure_parser import ProcedureStreamParser, parse_procedure
+
+CORPUS = sorted((Path(__file__).parent.parent / "benchmarks" / "corpus" / "procedure").glob("*.txt"))
+
+@pytest.mark.parametrize("path", CORPUS, ids=lambda path: path.stem)
+def test_corpus_matches_golden_result(path):
+    expected = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+    assert parse_procedure(path.read_text(encoding="utf-8")) == expected
+
+def test_corpus_is_not_empty():
+    assert CORPUS
+
+# Lines in the shapes the parser distinguishes, plus arbitrary text
+LINES = st.one_of(
+    st.sampled_from([
+        "TITLE: Replace the filter",
+        "**OVERVIEW:**",
+        "## PROCEDURE:",
+        "PREREQUISITES:",
+        "INTERFACE SETUP:",
+        "VERIFICATION: Light is green",
+        "VISUAL CONFIRMATION POINTS:",
+        "TROUBLESHOOTING:",
+        "1. Open the cover",
+        "2) Remove the filter [00:01:05]",
+        "a. Pull the tab",
+        "b)",
+        "⚠️ Unplug first",
+        "💡 Use gloves",
+        "- A screwdriver",
+        "• Spare filter",
+        "",
+        "   ",
+    ]),
+    st.text(alphabet=st.characters(blacklist_categories=("Cs",)), max_size=40),
+)
+RESPONSES = st.lists(LINES, max_size=30).flatmap(
+    lambda lines: st.sampled_from(["\n", "\r\n"]).map(lambda newline: newline.join(lines))
+)
+
+@st.composite
+def chunked(draw):
+    """A response and the chunks it arrives in."""
+    text = draw(RESPONSES)
+    cuts = sorted(draw(st.lists(st.integers(0, len(text)), max_size=20)))
+    bounds = [0, *cuts, len(text)]
+    return text, [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def stream(chunks):
+    parser = ProcedureStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.finish())
+    return parser.result(), events
+
+@given(chunked())
+def test_streamed_result_equals_parse_procedure(response):
+    text, chunks = response
+    result, _ = stream(chunks)
+    assert result == parse_procedure(text)
+
+@given(chunked())
+def test_events_do_not_depend_on_chunking(response):
+    text, chunks = response
+    _, events = stream(chunks)
+    _, whole_events = stream([text])
+    assert events == whole_events
+
+@given(chunked())
+def test_step_events_are_the_steps(response):
+    text, chunks = response
+    result, events = stream(chunks)
+    steps = [event for event in events if event["event"] == "step"]
+    assert [event["value"] for event in steps] == result["steps"]
+    assert [event["number"] for event in steps] == list(range(1, len(steps) + 1))
@@ -0,0 +1,18 @@
+"""ResultCache keeps its memoized input file hashes bounded."""
+import result_cache
+from hashing import file_fingerprint
+from result_cache import ResultCache
+
+def test_file_hashes_keep_the_newest(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "MAX_FILE_HASH_ENTRIES", 3)
+    cache = ResultCache(str(tmp_path / "results.sqlite3"))
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"upload-{i}.mp4"
+        path.write_bytes(bytes([i]))
+        cache.file_hash(str(path))
+        paths.append(path)
+
+    fingerprints = {row[0] for row in cache.conn.execute("SELECT fingerprint FROM file_hashes")}
+    assert fingerprints == {file_fingerprint(path) for path in paths[2:]}
+    cache.close()
@@ -0,0 +1,200 @@
+"""
+Per-video index of small thumbnails sampled at a fixed interval.
+
+The index is built in one pass over the video (frames between samples are
+grabbed but never converted) and stored as a raw array of BGR thumbnails,
+memory-mapped on load, plus a JSON header with each sample's frame index
+and its mean grayscale difference from the previous sample. Timeline
+scrubbing, candidate frame suggestions and scene detection are answered
+from the index without decoding; only the frames finally chosen are decoded
+at full resolution.
+"""
+import json
+import os
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+from frame_cache import DEFAULT_CACHE_DIR
+from hashing import file_fingerprint, hash_text
+from video_utils import EncodeOptions, VideoSession, VideoSource, encode_frame, format_timestamp, open_video, thumbnail_size
+
+DEFAULT_INDEX_DIR = DEFAULT_CACHE_DIR / "index"
+DEFAULT_INTERVAL = 1.0
+DEFAULT_THUMBNAIL_WIDTH = 96
+INDEX_VERSION = 1
+
+@dataclass
+class ThumbnailIndex:
+    """
+    thumbnails has shape (samples, height, width, 3); frame_indices[i] is
+    the video frame of sample i and diffs[i] its mean absolute grayscale
+    difference from sample i - 1 (0 for the first sample).
+    """
+    thumbnails: np.ndarray
+    frame_indices: np.ndarray
+    diffs: np.ndarray
+    fps: float
+    interval: float
+
+    def __len__(self) -> int:
+        return len(self.frame_indices)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.frame_indices / self.fps
+
+    def sample_at(self, timestamp: float) -> int:
+        """Index of the sample nearest to timestamp (seconds)."""
+        position = np.searchsorted(self.frame_indices, timestamp * self.fps)
+        if position >= len(self):
+            return len(self) - 1
+        if position > 0 and timestamp * self.fps - self.frame_indices[position - 1] < self.frame_indices[position] - timestamp * self.fps:
+            return int(position - 1)
+        return int(position)
+
+    def thumbnail_at(self, timestamp: float) -> np.ndarray:
+        return self.thumbnails[self.sample_at(timestamp)]
+
+    def change_samples(self, threshold: float) -> np.ndarray:
+        """Samples that differ from the previous one by more than threshold."""
+        return np.flatnonzero(self.diffs > threshold)
+
+    def scene_change_frames(self, threshold: float = 30.0) -> List[int]:
+        """
+        Frame indices of scene changes, at sample resolution: each change is
+        reported at the first sample after it.
+        """
+        return [int(self.frame_indices[i]) for i in self.change_samples(threshold)]
+
+    def candidate_frames(self, count: int, min_gap: int = 2) -> List[int]:
+        """
+        Frame indices of up to count suggested frames: the first sample, then
+        the samples that differ most from their predecessor, at least
+        min_gap samples apart. Returned in video order.
+        """
+        if not len(self) or count <= 0:
+            return []
+        chosen = [0]
+        for i in np.argsort(-self.diffs, kind="stable"):
+            if len(chosen) >= count or self.diffs[i] <= 0:
+                break
+            if all(abs(int(i) - c) >= min_gap for c in chosen):
+                chosen.append(int(i))
+        return sorted(int(self.frame_indices[i]) for i in chosen)
+
+def index_key(video_path: str, interval: float, thumbnail_width: int) -> str:
+    """Key of a video's index; it changes whenever the file does."""
+    return hash_text(file_fingerprint(video_path), str(interval), str(thumbnail_width), str(INDEX_VERSION))[:32]
+
+def build_index(video: VideoSource, path: Path, interval: float = DEFAULT_INTERVAL,
+                thumbnail_width: int = DEFAULT_THUMBNAIL_WIDTH) -> None:
+    """
+    Sample a thumbnail every interval seconds and write the index to
+    path.with_suffix(".thumbs") and path.with_suffix(".json"). The header is
+    written last, so an index is only visible once complete.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open_video(video) as session:
+        fps = session.fps or 30.0
+        step = max(1, int(round(interval * fps)))
+        size = thumbnail_size(session, thumbnail_width)
+        print(f"Indexing {session.video_path}: a {size[0]}x{size[1]} thumbnail every {step} frames", file=sys.stderr)
+
+        if session.position != 0:
+            session.seek(0)
+        frame_indices, diffs = [], []
+        prev_gray = None
+        frame_index = -1
+        fd, thumbs_tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while session.cap.grab():
+                    frame_index += 1
+                    if frame_index % step:
+                        continue
+                    ret, frame = session.cap.retrieve()
+                    if not ret:
+                        continue
+
+                    thumb = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+                    diffs.append(0.0 if prev_gray is None else round(float(np.mean(cv2.absdiff(gray, prev_gray))), 3))
+                    frame_indices.append(frame_index)
+                    f.write(thumb.tobytes())
+                    prev_gray = gray
+            os.replace(thumbs_tmp, path.with_suffix(".thumbs"))
+        except BaseException:
+            if os.path.exists(thumbs_tmp):
+                os.unlink(thumbs_tmp)
+            raise
+
+    header = {
+        "version": INDEX_VERSION,
+        "fps": fps,
+        "interval": interval,
+        "thumbnail_size": [size[0], size[1]],
+        "frame_indices": frame_indices,
+        "diffs": diffs
+    }
+    fd, header_tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(header, f)
+    os.replace(header_tmp, path.with_suffix(".json"))
+    print(f"Indexed {len(frame_indices)} samples", file=sys.stderr)
+
+def load_index(path: Path) -> Optional[ThumbnailIndex]:
+    """The index at path (without suffix), or None if there is none."""
+    try:
+        with open(path.with_suffix(".json")) as f:
+            header = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if header.get("version") != INDEX_VERSION:
+        return None
+
+    width, height = header["thumbnail_size"]
+    count = len(header["frame_indices"])
+    thumbnails = (np.memmap(path.with_suffix(".thumbs"), dtype=np.uint8, mode="r", shape=(count, height, width, 3))
+                  if count else np.empty((0, height, width, 3), dtype=np.uint8))
+    return ThumbnailIndex(
+        thumbnails=thumbnails,
+        frame_indices=np.array(header["frame_indices"], dtype=np.int64),
+        diffs=np.array(header["diffs"], dtype=np.float32),
+        fps=header["fps"],
+        interval=header["interval"]
+    )
+
+def get_index(video: VideoSource, index_dir: Optional[str] = None, interval: float = DEFAULT_INTERVAL,
+              thumbnail_width: int = DEFAULT_THUMBNAIL_WIDTH, rebuild: bool = False) -> ThumbnailIndex:
+    """Load the video's index from index_dir, building it on first use."""
+    video_path = video.video_path if isinstance(video, VideoSession) else str(video)
+    key = index_key(video_path, interval, thumbnail_width)
+    path = Path(index_dir or DEFAULT_INDEX_DIR) / key[:2] / key
+
+    index = None if rebuild else load_index(path)
+    if index is None:
+        build_index(video, path, interval, thumbnail_width)
+        index = load_index(path)
+    return index
+
+def iter_thumbnails(index: ThumbnailIndex, timestamps: Optional[List[float]] = None,
+                    encoding: Optional[EncodeOptions] = None) -> Iterator[Dict]:
+    """
+    Encoded thumbnails for timeline scrubbing, straight from the index: every
+    sample, or the sample nearest each of timestamps (seconds).
+    """
+    samples = range(len(index)) if timestamps is None else [index.sample_at(t) for t in timestamps]
+    for i in samples:
+        seconds = float(index.frame_indices[i] / index.fps)
+        yield {
+            "timestamp": format_timestamp(seconds),
+            "seconds": round(seconds, 3),
+            "image": encode_frame(np.asarray(index.thumbnails[i]), encoding),
+            "diff": float(index.diffs[i])
+        }
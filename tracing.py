@@ -0,0 +1,189 @@
+"""
+Opt-in timing of the pipeline's hot paths.
+
+Set VIDEO_TRACE=1 to have each entry point (process_video, extract_frames,
+generate_word, batch and every worker request) print a JSON summary to
+stderr when it finishes, or VIDEO_TRACE=<path> to append the summaries to
+a file as JSON lines. A summary has the wall time, peak RSS and, for each
+stage, the number of calls and their total and longest duration. Stages
+timed on several threads at once (the encode pool) can add up to more than
+the wall time; stages in child processes (parallel scene scans) are not
+included.
+
+Set VIDEO_PROFILE=<path> to also run each invocation under cProfile and
+write the stats to path (or, if path is a directory, to a file per
+invocation in it), for python -m pstats or snakeviz. cProfile only sees
+the invoking thread.
+
+With neither variable set, span() returns a shared no-op context manager,
+so instrumented code pays one function call per span.
+"""
+import contextlib
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator
+
+TRACE_ENV = "VIDEO_TRACE"
+PROFILE_ENV = "VIDEO_PROFILE"
+
+_enabled = bool(os.environ.get(TRACE_ENV))
+_stages: Dict[str, list] = {}  # name -> [calls, total seconds, max seconds]
+_lock = threading.Lock()
+_NULL_SPAN = contextlib.nullcontext()
+
+def enabled() -> bool:
+    return _enabled
+
+def enable(target: str = "1") -> None:
+    """Turn tracing on for this process, as if VIDEO_TRACE=target were set."""
+    global _enabled
+    os.environ[TRACE_ENV] = target
+    _enabled = True
+
+def record(name: str, seconds: float) -> None:
+    with _lock:
+        stats = _stages.get(name)
+        if stats is None:
+            _stages[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        record(self.name, time.perf_counter() - self.start)
+
+def span(name: str):
+    """Context manager timing its block as stage name."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+def traced(name: str) -> Callable:
+    """Decorator timing every call of the function as stage name."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class TracedCapture:
+    """
+    Proxy for a cv2.VideoCapture that times grab/retrieve/read as "decode"
+    and set (only used to reposition) as "seek". VideoSession wraps its
+    capture in one when tracing is on.
+    """
+
+    def __init__(self, cap: Any):
+        self._cap = cap
+
+    def grab(self):
+        with _Span("decode"):
+            return self._cap.grab()
+
+    def retrieve(self, *args):
+        with _Span("decode"):
+            return self._cap.retrieve(*args)
+
+    def read(self, *args):
+        with _Span("decode"):
+            return self._cap.read(*args)
+
+    def set(self, prop, value):
+        with _Span("seek"):
+            return self._cap.set(prop, value)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cap, name)
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss survives exec on Linux, so a process started by a big parent
+    # would report the parent's peak; the kernel's VmHWM starts afresh
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def summary(name: str, wall_seconds: float, **info) -> Dict:
+    with _lock:
+        stages = {
+            stage: {"calls": calls, "total_seconds": round(total, 6), "max_seconds": round(longest, 6)}
+            for stage, (calls, total, longest) in sorted(_stages.items(), key=lambda item: -item[1][1])
+        }
+    return {
+        "trace": name,
+        "pid": os.getpid(),
+        "wall_seconds": round(wall_seconds, 6),
+        "peak_rss_mb": round(peak_rss_bytes() / (1024 * 1024), 1),
+        "stages": stages,
+        **info
+    }
+
+def emit(report: Dict) -> None:
+    target = os.environ.get(TRACE_ENV, "1")
+    line = json.dumps(report)
+    if target.lower() in ("1", "true", "yes", "stderr"):
+        print(line, file=sys.stderr, flush=True)
+    else:
+        with open(target, "a") as f:
+            f.write(line + "\n")
+
+def _profile_path(name: str) -> str:
+    path = os.environ[PROFILE_ENV]
+    if os.path.isdir(path):
+        return os.path.join(path, f"{name}-{os.getpid()}-{int(time.time() * 1000)}.prof")
+    return path
+
+@contextlib.contextmanager
+def invocation(name: str, **info) -> Iterator[None]:
+    """
+    Trace one run of an entry point: stage totals start from zero, and the
+    summary (and profile) are written when the block exits, even on error.
+    Does nothing unless VIDEO_TRACE or VIDEO_PROFILE is set.
+    """
+    profile = bool(os.environ.get(PROFILE_ENV))
+    if not (_enabled or profile):
+        yield
+        return
+
+    with _lock:
+        _stages.clear()
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall_seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(_profile_path(name))
+        if _enabled:
+            emit(summary(name, wall_seconds, **info))
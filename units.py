@@ -0,0 +1,43 @@
+"""
+Units of model input and output shared by main, preprocess, segments and
+audio: the token rates of text, video and audio, and the [HH:MM:SS]
+timestamps the model writes into its answers. This module imports nothing
+from the rest of the tree, so low-level helpers can use it without pulling
+in the CLI.
+"""
+import re
+from typing import Callable
+
+# Published Gemini 1.5 tokenization rates, used when a response carries no
+# usage metadata and to plan preprocessing and segments.
+CHARS_PER_TOKEN = 4
+VIDEO_TOKENS_PER_SECOND = 258  # one frame per second
+AUDIO_TOKENS_PER_SECOND = 32
+
+TIMESTAMP_PATTERN = re.compile(r"\[(\d{1,2}):(\d{2})(?::(\d{2}))?\]")
+
+def estimate_text_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+def format_timestamp(seconds: float) -> str:
+    """Format a position in seconds as HH:MM:SS."""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+def timestamp_seconds(match: re.Match) -> int:
+    """The position in seconds of a TIMESTAMP_PATTERN match ([HH:MM:SS] or [MM:SS])."""
+    first, second, third = match.groups()
+    if third is None:
+        return int(first) * 60 + int(second)
+    return int(first) * 3600 + int(second) * 60 + int(third)
+
+def map_timestamps(text: str, func: Callable[[int], float]) -> str:
+    """
+    Replace every [HH:MM:SS] or [MM:SS] timestamp in text with func of its
+    position in seconds, rounded to a whole second and written as [HH:MM:SS].
+    """
+    return TIMESTAMP_PATTERN.sub(
+        lambda match: f"[{format_timestamp(int(round(func(timestamp_seconds(match)))))}]", text
+    )
@@ -4,117 +4,740 @@ from pathlib import Path
 import base64
 import json
 import sys
-from typing import List, Dict, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, List, Dict, Tuple, Optional, Iterable, Iterator, Union
 
-def extract_key_frames(video_path: str, num_frames: int = 5) -> List[Dict[str, str]]:
+import tracing
+from concurrency import ordered_map
+from frame_cache import FrameCache, image_size
+from units import format_timestamp
+
+if TYPE_CHECKING:
+    from thumbnail_index import ThumbnailIndex
+
+# Assumed keyframe interval when the container does not tell us. Most screen
+# recorders (OBS, QuickTime, ffmpeg defaults) emit a keyframe every 2-10s.
+DEFAULT_GOP_SECONDS = 2.0
+
+class VideoSession:
     """
-    Extract key frames from a video file.
-    Returns a list of dictionaries containing frame data and timestamps.
+    One opened video, shared across extraction calls.
+
+    Holds a single cv2.VideoCapture plus the container properties probed at
+    open time, so callers that need many frames from the same file do not
+    reopen and re-probe it each time. Use as a context manager to guarantee
+    the capture is released.
     """
-    print(f"Opening video file: {video_path}", file=sys.stderr)
-    cap = cv2.VideoCapture(str(video_path))
-    
-    if not cap.isOpened():
-        raise ValueError(f"Failed to open video file: {video_path}")
-    
-    # Get video properties
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    duration = total_frames / fps
-    
-    print(f"Video properties: frames={total_frames}, fps={fps}, duration={duration:.2f}s", file=sys.stderr)
-    
-    # Calculate frame positions to extract (evenly distributed)
-    frame_positions = np.linspace(0, total_frames - 1, num_frames, dtype=int)
-    print(f"Frame positions to extract: {frame_positions}", file=sys.stderr)
-    
-    frames = []
-    for pos in frame_positions:
-        # Set frame position
-        cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+
+    def __init__(self, video_path: str):
+        self.video_path = str(video_path)
+        print(f"Opening video file: {self.video_path}", file=sys.stderr)
+        with tracing.span("video_open"):
+            self.cap = cv2.VideoCapture(self.video_path)
+            if not self.cap.isOpened():
+                raise ValueError(f"Failed to open video file: {self.video_path}")
+
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+            self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if tracing.enabled():
+            # Time every decode and seek, whichever helper issues it
+            self.cap = tracing.TracedCapture(self.cap)
+
+    @property
+    def duration(self) -> float:
+        return self.total_frames / self.fps if self.fps else 0.0
+
+    @property
+    def position(self) -> int:
+        """Index of the frame the next read() will return."""
+        return int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+    def seek(self, frame_index: int) -> None:
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+    def close(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def __enter__(self) -> "VideoSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+VideoSource = Union[str, VideoSession]
+
+@contextmanager
+def open_video(video: VideoSource) -> Iterator[VideoSession]:
+    """
+    Yield a VideoSession for video. An existing session is passed through
+    untouched; a path is opened for the duration of the block and released.
+    """
+    if isinstance(video, VideoSession):
+        yield video
+    else:
+        with VideoSession(video) as session:
+            yield session
+
+# Output formats for captured frames: extension, MIME type, OpenCV quality
+# flag and the quality used when none is given. OpenCV's own WebP default is
+# lossless, far larger than a screen capture needs.
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY, 95),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY, 80),
+}
+
+@dataclass
+class EncodeOptions:
+    """
+    How captured frames are encoded. quality is 1-100 (None uses the
+    format's default). With workers > 1, resizing and encoding run in a
+    thread pool fed by the decoder, with at most queue_size frames in flight
+    (default 2 * workers); results keep their order.
+    """
+    format: str = "jpeg"
+    quality: Optional[int] = None
+    workers: int = 1
+    queue_size: Optional[int] = None
+
+    def __post_init__(self):
+        if self.format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {self.format}")
+
+    @property
+    def ext(self) -> str:
+        return IMAGE_FORMATS[self.format][0]
+
+    @property
+    def mime_type(self) -> str:
+        return IMAGE_FORMATS[self.format][1]
+
+    def imencode_params(self) -> List[int]:
+        _, _, flag, default_quality = IMAGE_FORMATS[self.format]
+        return [flag, self.quality if self.quality is not None else default_quality]
+
+DEFAULT_ENCODING = EncodeOptions()
+
+@tracing.traced("encode")
+def encode_frame_bytes(frame, encoding: Optional[EncodeOptions] = None) -> bytes:
+    """Encode a BGR frame as JPEG (or the format in encoding) bytes."""
+    encoding = encoding or DEFAULT_ENCODING
+    _, buffer = cv2.imencode(encoding.ext, frame, encoding.imencode_params())
+    return buffer.tobytes()
+
+def encode_frame(frame, encoding: Optional[EncodeOptions] = None) -> str:
+    """Encode a BGR frame as a base64 JPEG (or the format in encoding) data URL."""
+    encoding = encoding or DEFAULT_ENCODING
+    data = encode_frame_bytes(frame, encoding)
+    with tracing.span("base64"):
+        img_base64 = base64.b64encode(data).decode('utf-8')
+    return f"data:{encoding.mime_type};base64,{img_base64}"
+
+def store_frame(frame, cache: Optional[FrameCache] = None, key: Optional[str] = None,
+                encoding: Optional[EncodeOptions] = None) -> str:
+    """
+    Encode a frame for output: a base64 data URL by default, or, with a
+    cache, an image file written under key and returned as a path or URL.
+    """
+    encoding = encoding or DEFAULT_ENCODING
+    if cache is None:
+        return encode_frame(frame, encoding)
+    return cache.reference(cache.put(key, encode_frame_bytes(frame, encoding), encoding.ext))
+
+def cache_key(cache: FrameCache, video_hash: str, frame_index: int, max_width: Optional[int],
+              max_height: Optional[int], target_size: Optional[Tuple[int, int]] = None,
+              encoding: Optional[EncodeOptions] = None) -> str:
+    encoding = encoding or DEFAULT_ENCODING
+    return cache.key(video_hash, frame_index, max_width, max_height, target_size, encoding.ext, encoding.quality)
+
+def estimate_gop_size(fps: float) -> int:
+    """Estimate the keyframe interval in frames for a video with the given fps."""
+    return max(1, int(round(fps * DEFAULT_GOP_SECONDS)))
+
+def read_frames_at_positions(
+    cap,
+    positions: Iterable[int],
+    gop_size: Optional[int] = None
+) -> Iterator[Tuple[int, Optional[np.ndarray]]]:
+    """
+    Decode the frames at the given positions in a single forward pass.
+
+    Positions are visited in ascending order. Short gaps (at most one GOP) are
+    skipped with cap.grab(), which demuxes and decodes without converting the
+    frame; longer gaps or backward jumps fall back to a seek, since the decoder
+    has to restart from a keyframe anyway. Yields (position, frame) pairs, with
+    frame set to None when the read fails.
+    """
+    if gop_size is None:
+        gop_size = estimate_gop_size(cap.get(cv2.CAP_PROP_FPS) or 30.0)
+
+    current = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    for pos in sorted(set(int(p) for p in positions)):
+        gap = pos - current
+        if gap < 0 or gap > gop_size:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+        else:
+            for _ in range(gap):
+                if not cap.grab():
+                    break
+
         ret, frame = cap.read()
-        
-        if ret:
-            # Convert frame timestamp to HH:MM:SS format
-            timestamp = pos / fps
-            hours = int(timestamp // 3600)
-            minutes = int((timestamp % 3600) // 60)
-            seconds = int(timestamp % 60)
-            timestamp_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            
-            # Convert frame to JPEG and then to base64
-            _, buffer = cv2.imencode('.jpg', frame)
-            img_base64 = base64.b64encode(buffer).decode('utf-8')
-            
-            frames.append({
-                "timestamp": timestamp_str,
-                "image": f"data:image/jpeg;base64,{img_base64}"
-            })
-            print(f"Extracted frame at position {pos} ({timestamp_str})", file=sys.stderr)
+        current = pos + 1
+        yield pos, (frame if ret else None)
+
+@tracing.traced("resize")
+def resize_frame(
+    frame,
+    max_width: Optional[int] = None,
+    max_height: Optional[int] = None,
+    target_size: Optional[Tuple[int, int]] = None
+):
+    """
+    Apply the capture sizing rules: target_size wins (width only, aspect kept),
+    otherwise fit within max_width/max_height if given.
+    """
+    if target_size:
+        # Use target width as the constraint, maintain aspect ratio
+        target_width, _ = target_size  # Ignore target height, calculate based on aspect
+        return resize_maintaining_aspect_ratio(frame, target_width=target_width)
+    if max_width or max_height:
+        return resize_maintaining_aspect_ratio(frame,
+                                               target_width=max_width,
+                                               target_height=max_height)
+    return frame
+
+# Perceptual hashes are the signs, relative to their median, of the 8x8
+# lowest DCT frequencies of a PHASH_SIZE x PHASH_SIZE grayscale thumbnail.
+PHASH_SIZE = 32
+PHASH_FREQUENCIES = 8
+DEFAULT_DEDUP_DISTANCE = 6
+
+def _dct_matrix(size: int, frequencies: int) -> np.ndarray:
+    """Rows of the orthonormal DCT-II basis for the lowest frequencies."""
+    k = np.arange(frequencies)[:, None]
+    n = np.arange(size)[None, :]
+    basis = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+_PHASH_DCT = _dct_matrix(PHASH_SIZE, PHASH_FREQUENCIES)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+@tracing.traced("phash")
+def perceptual_hash(frame) -> int:
+    """64-bit DCT perceptual hash of a BGR or grayscale frame."""
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (PHASH_SIZE, PHASH_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = _PHASH_DCT @ small @ _PHASH_DCT.T
+    # The DC term is the mean brightness; leave it out of the median
+    bits = low.ravel() > np.median(low.ravel()[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def image_perceptual_hash(path: str) -> int:
+    """perceptual_hash of an image file, decoded at reduced size."""
+    image = cv2.imread(str(path), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        raise ValueError(f"Could not read image: {path}")
+    return perceptual_hash(image)
+
+class FrameDeduplicator:
+    """
+    Perceptual-hash filter for near-identical frames (fades, cursor-only
+    changes). A frame is a duplicate if its hash is within max_distance bits
+    of a frame kept earlier. Kept hashes live in one uint64 array compared
+    with a vectorized XOR and byte popcount, so each check stays well under
+    a millisecond with thousands of kept frames.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_DEDUP_DISTANCE):
+        self.max_distance = max_distance
+        self.removed = 0
+        self._hashes = np.empty(64, dtype=np.uint64)
+        self._count = 0
+
+    def is_duplicate(self, phash: int) -> bool:
+        """Check phash against the kept frames, keeping it if it is new."""
+        if self._count:
+            xor = self._hashes[:self._count] ^ np.uint64(phash)
+            distances = _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+            if distances.min() <= self.max_distance:
+                self.removed += 1
+                return True
+
+        if self._count == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.empty_like(self._hashes)])
+        self._hashes[self._count] = phash
+        self._count += 1
+        return False
+
+    def report(self) -> None:
+        print(f"Removed {self.removed} near-duplicate frames (distance <= {self.max_distance})", file=sys.stderr)
+
+def iter_key_frames(
+    video_path: VideoSource,
+    num_frames: int = 5,
+    max_width: Optional[int] = None,
+    max_height: Optional[int] = None,
+    gop_size: Optional[int] = None,
+    cache: Optional[FrameCache] = None,
+    encoding: Optional[EncodeOptions] = None,
+    dedup: Optional[FrameDeduplicator] = None,
+    index: Optional["ThumbnailIndex"] = None
+) -> Iterator[Dict[str, str]]:
+    """
+    Extract key frames from a video file, yielding each one as soon as it is
+    encoded. With a cache, images are file references and frames that are
+    already cached are not decoded again. See EncodeOptions for the image
+    format and the encode thread pool. With dedup, frames that look like an
+    earlier one are dropped before they are encoded.
+
+    Frames are evenly spaced, or, with a thumbnail index, the index's
+    candidate frames: the opening frame and the biggest visual changes.
+    """
+    encoding = encoding or DEFAULT_ENCODING
+    with open_video(video_path) as session:
+        # Get video properties
+        total_frames = session.total_frames
+        fps = session.fps
+        print(f"Video properties: frames={total_frames}, fps={fps}, duration={session.duration:.2f}s", file=sys.stderr)
+
+        if index is not None:
+            frame_positions = np.array(index.candidate_frames(num_frames), dtype=int)
         else:
-            print(f"Failed to read frame at position {pos}", file=sys.stderr)
-    
-    cap.release()
-    print(f"Extracted {len(frames)} frames total", file=sys.stderr)
-    return frames
+            # Calculate frame positions to extract (evenly distributed)
+            frame_positions = np.linspace(0, total_frames - 1, num_frames, dtype=int)
+        print(f"Frame positions to extract: {frame_positions}", file=sys.stderr)
+
+        keys = {}
+        cached = {}
+        cached_paths = {}
+        if cache is not None:
+            video_hash = cache.video_hash(session.video_path)
+            for pos in set(int(p) for p in frame_positions):
+                keys[pos] = cache_key(cache, video_hash, pos, max_width, max_height, encoding=encoding)
+                hit = cache.get(keys[pos], encoding.ext)
+                if hit is not None:
+                    cached[pos] = cache.reference(hit)
+                    cached_paths[pos] = hit
+
+        decoded = read_frames_at_positions(
+            session.cap,
+            [p for p in frame_positions if int(p) not in cached],
+            gop_size
+        )
+
+        def frames():
+            # Runs on this thread: cached positions pass through, others are decoded
+            for pos in sorted(set(int(p) for p in frame_positions)):
+                frame = None if pos in cached else next(decoded)[1]
+                if dedup is not None and (frame is not None or pos in cached):
+                    phash = perceptual_hash(frame) if frame is not None else image_perceptual_hash(cached_paths[pos])
+                    if dedup.is_duplicate(phash):
+                        print(f"Dropped near-duplicate frame at position {pos}", file=sys.stderr)
+                        continue
+                yield pos, frame
+
+        def encode(item):
+            pos, frame = item
+            if pos in cached or frame is None:
+                return pos, cached.get(pos)
+            frame = resize_frame(frame, max_width, max_height)
+            return pos, store_frame(frame, cache, keys.get(pos), encoding)
+
+        extracted = 0
+        for pos, image in ordered_map(encode, frames(), encoding.workers, encoding.queue_size):
+            timestamp_str = format_timestamp(pos / fps)
+            if image is None:
+                print(f"Failed to read frame at position {pos}", file=sys.stderr)
+                continue
+            if pos in cached:
+                print(f"Using cached frame at position {pos} ({timestamp_str})", file=sys.stderr)
+            else:
+                print(f"Extracted frame at position {pos} ({timestamp_str})", file=sys.stderr)
+
+            extracted += 1
+            yield {
+                "timestamp": timestamp_str,
+                "image": image
+            }
+
+    print(f"Extracted {extracted} frames total", file=sys.stderr)
+    if dedup is not None:
+        dedup.report()
 
-def detect_scene_changes(video_path: str, threshold: float = 30.0) -> List[Dict[str, str]]:
+def extract_key_frames(
+    video_path: VideoSource,
+    num_frames: int = 5,
+    max_width: Optional[int] = None,
+    max_height: Optional[int] = None,
+    gop_size: Optional[int] = None,
+    cache: Optional[FrameCache] = None,
+    encoding: Optional[EncodeOptions] = None,
+    dedup: Optional[FrameDeduplicator] = None,
+    index: Optional["ThumbnailIndex"] = None
+) -> List[Dict[str, str]]:
     """
-    Detect major scene changes in the video and extract frames at those points.
+    Extract key frames from a video file.
+    Returns a list of dictionaries containing frame data and timestamps.
     """
-    print(f"Opening video file: {video_path}", file=sys.stderr)
-    cap = cv2.VideoCapture(str(video_path))
-    
-    if not cap.isOpened():
-        raise ValueError(f"Failed to open video file: {video_path}")
-    
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    print(f"Video properties: frames={total_frames}, fps={fps}", file=sys.stderr)
-    
+    return list(iter_key_frames(video_path, num_frames, max_width, max_height, gop_size, cache, encoding, dedup, index))
+
+@tracing.traced("thumbnail")
+def make_thumbnail(frame, size: Tuple[int, int]):
+    """Downscale a BGR frame to a small grayscale thumbnail for comparisons."""
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+def thumbnail_size(session: VideoSession, thumbnail_width: int) -> Tuple[int, int]:
+    """Thumbnail (width, height) for session that keeps its aspect ratio."""
+    if not session.width or not session.height:
+        return (thumbnail_width, thumbnail_width)
+    height = max(1, int(round(thumbnail_width * session.height / session.width)))
+    return (thumbnail_width, height)
+
+def _scan_scene_changes_exact(
+    session: VideoSession,
+    threshold: float,
+    start: int = 0,
+    end: Optional[int] = None
+) -> Iterator[Tuple[int, np.ndarray, float]]:
+    """
+    Compare every decoded frame in [start, end) with its predecessor at full
+    resolution. The frame before start is decoded as the reference, so a
+    change exactly at start is still seen. Yields (frame_index, frame,
+    mean_diff) for each frame above threshold.
+    """
+    reference = max(start - 1, 0)
+    if session.position != reference:
+        session.seek(reference)
+
     prev_frame = None
-    frames = []
-    frame_count = 0
-    
-    while True:
-        ret, frame = cap.read()
+    frame_count = reference
+
+    while end is None or frame_count < end:
+        ret, frame = session.cap.read()
         if not ret:
             break
-            
+
         # Convert to grayscale for comparison
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
+
         if prev_frame is not None:
             # Calculate mean absolute difference between frames
             diff = cv2.absdiff(gray, prev_frame)
             mean_diff = np.mean(diff)
-            
-            # If difference is above threshold, save frame
+
+            # If difference is above threshold, report frame
             if mean_diff > threshold:
-                timestamp = frame_count / fps
-                hours = int(timestamp // 3600)
-                minutes = int((timestamp % 3600) // 60)
-                seconds = int(timestamp % 60)
-                timestamp_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                
-                _, buffer = cv2.imencode('.jpg', frame)
-                img_base64 = base64.b64encode(buffer).decode('utf-8')
-                
-                frames.append({
-                    "timestamp": timestamp_str,
-                    "image": f"data:image/jpeg;base64,{img_base64}"
-                })
-                print(f"Detected scene change at frame {frame_count} ({timestamp_str}), diff={mean_diff:.2f}", file=sys.stderr)
-        
+                yield frame_count, frame, mean_diff
+
         prev_frame = gray
         frame_count += 1
-        
+
         if frame_count % 100 == 0:
-            print(f"Processed {frame_count}/{total_frames} frames", file=sys.stderr)
-    
-    cap.release()
-    print(f"Detected {len(frames)} scene changes", file=sys.stderr)
-    return frames 
+            print(f"Processed {frame_count}/{session.total_frames} frames", file=sys.stderr)
+
+def _thumbnail_at(session: VideoSession, frame_index: int, size: Tuple[int, int]):
+    session.seek(frame_index)
+    ret, frame = session.cap.read()
+    return (frame, make_thumbnail(frame, size)) if ret else (None, None)
+
+def _scan_scene_changes_fast(
+    session: VideoSession,
+    threshold: float,
+    stride: int,
+    thumbnail_width: int,
+    start: int = 0,
+    end: Optional[int] = None
+) -> Iterator[Tuple[int, np.ndarray, float]]:
+    """
+    Compare downscaled grayscale thumbnails of every stride-th frame.
+
+    Frames between samples are skipped with grab(), so they are never
+    converted or resized. When two consecutive samples differ by more than
+    threshold, the first differing frame between them is located by bisection
+    (seeking back only inside that one interval). At most one change is
+    reported per sampling interval.
+
+    start must be a multiple of stride; the sample before it is decoded as
+    the reference so results match a scan of the whole video.
+    """
+    size = thumbnail_size(session, thumbnail_width)
+    last_index = session.total_frames - 1
+    reference = max(start - stride, 0)
+    if session.position != reference:
+        session.seek(reference)
+
+    prev_thumb = None
+    prev_index = None
+    frame_index = reference - 1
+
+    while (end is None or frame_index + 1 < end) and session.cap.grab():
+        frame_index += 1
+        if frame_index % stride and frame_index != last_index:
+            continue
+
+        ret, frame = session.cap.retrieve()
+        if not ret:
+            continue
+        thumb = make_thumbnail(frame, size)
+
+        if prev_thumb is not None:
+            mean_diff = np.mean(cv2.absdiff(thumb, prev_thumb))
+            if mean_diff > threshold:
+                change_index, change_frame = frame_index, frame
+                lo, hi = prev_index, frame_index
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    mid_frame, mid_thumb = _thumbnail_at(session, mid, size)
+                    if mid_thumb is None:
+                        break
+                    if np.mean(cv2.absdiff(mid_thumb, prev_thumb)) > threshold:
+                        hi, change_index, change_frame = mid, mid, mid_frame
+                    else:
+                        lo = mid
+                if frame_index - prev_index > 1:
+                    # Resume the forward scan where it left off
+                    session.seek(frame_index + 1)
+                yield change_index, change_frame, mean_diff
+
+        prev_thumb = thumb
+        prev_index = frame_index
+
+        if frame_index % (stride * 100) == 0:
+            print(f"Processed {frame_index}/{session.total_frames} frames", file=sys.stderr)
+
+def _scene_change_records(
+    session: VideoSession,
+    threshold: float,
+    max_width: Optional[int],
+    max_height: Optional[int],
+    fast: bool,
+    stride: int,
+    thumbnail_width: int,
+    start: int = 0,
+    end: Optional[int] = None,
+    cache: Optional[FrameCache] = None,
+    video_hash: Optional[str] = None,
+    encoding: Optional[EncodeOptions] = None,
+    dedup: Optional[FrameDeduplicator] = None,
+    hash_frames: bool = False
+) -> Iterator[Tuple[int, float, str, Optional[int]]]:
+    """
+    Scan [start, end) and yield (frame_index, mean_diff, image, phash) per
+    change. With dedup, duplicates are dropped before encoding; with
+    hash_frames, phash is the frame's perceptual hash (otherwise None) so
+    the caller can deduplicate.
+    """
+    if fast:
+        changes = _scan_scene_changes_fast(session, threshold, stride, thumbnail_width, start, end)
+    else:
+        changes = _scan_scene_changes_exact(session, threshold, start, end)
+    yield from _encode_scene_changes(changes, max_width, max_height, cache, video_hash, encoding, dedup, hash_frames)
+
+def _encode_scene_changes(
+    changes: Iterable[Tuple[int, np.ndarray, float]],
+    max_width: Optional[int],
+    max_height: Optional[int],
+    cache: Optional[FrameCache],
+    video_hash: Optional[str],
+    encoding: Optional[EncodeOptions],
+    dedup: Optional[FrameDeduplicator] = None,
+    hash_frames: bool = False
+) -> Iterator[Tuple[int, float, str, Optional[int]]]:
+    encoding = encoding or DEFAULT_ENCODING
+    if dedup is not None:
+        changes = _drop_duplicate_changes(changes, dedup)
+
+    def encode(change):
+        frame_index, frame, mean_diff = change
+        key = cache_key(cache, video_hash, frame_index, max_width, max_height, encoding=encoding) if cache is not None else None
+        phash = perceptual_hash(frame) if hash_frames else None
+        image = store_frame(resize_frame(frame, max_width, max_height), cache, key, encoding)
+        return frame_index, float(mean_diff), image, phash
+
+    # The scan keeps decoding while earlier changes are encoded
+    yield from ordered_map(encode, changes, encoding.workers, encoding.queue_size)
+
+def _indexed_scene_changes(session: VideoSession, index: "ThumbnailIndex", threshold: float) -> Iterator[Tuple[int, np.ndarray, float]]:
+    """Decode only the frames at the index's scene changes, in one forward pass."""
+    samples = index.change_samples(threshold)
+    diffs = {int(index.frame_indices[i]): float(index.diffs[i]) for i in samples}
+    for frame_index, frame in read_frames_at_positions(session.cap, diffs):
+        if frame is not None:
+            yield frame_index, frame, diffs[frame_index]
+
+def _drop_duplicate_changes(changes: Iterable[Tuple[int, Any, float]], dedup: FrameDeduplicator) -> Iterator[Tuple[int, Any, float]]:
+    for change in changes:
+        if dedup.is_duplicate(perceptual_hash(change[1])):
+            print(f"Dropped near-duplicate scene change at frame {change[0]}", file=sys.stderr)
+            continue
+        yield change
+
+def _scene_change_records_chunk(video_path: str, start: int, end: Optional[int], options: Dict) -> List[Tuple[int, float, str, Optional[int]]]:
+    """Process pool entry point: scan one chunk with its own VideoCapture."""
+    with VideoSession(video_path) as session:
+        return list(_scene_change_records(session, start=start, end=end, **options))
+
+def scene_chunks(total_frames: int, workers: int, align: int = 1) -> List[Tuple[int, Optional[int]]]:
+    """
+    Split [0, total_frames) into up to workers contiguous (start, end) ranges
+    whose starts are multiples of align. The last range is open-ended so
+    frames past an inaccurate container frame count are still scanned.
+    """
+    chunk = -(-max(total_frames, 1) // max(workers, 1))
+    chunk = max(align, -(-chunk // align) * align)
+    starts = list(range(0, max(total_frames, 1), chunk))
+    return [(s, e) for s, e in zip(starts, starts[1:] + [None])]
+
+def iter_scene_changes(
+    video_path: VideoSource,
+    threshold: float = 30.0,
+    max_width: Optional[int] = None,
+    max_height: Optional[int] = None,
+    fast: bool = False,
+    stride: int = 5,
+    thumbnail_width: int = 64,
+    workers: int = 1,
+    cache: Optional[FrameCache] = None,
+    encoding: Optional[EncodeOptions] = None,
+    dedup: Optional[FrameDeduplicator] = None,
+    index: Optional["ThumbnailIndex"] = None
+) -> Iterator[Dict[str, str]]:
+    """
+    Detect major scene changes in the video, yielding a frame for each one as
+    soon as it is encoded.
+
+    By default every frame is compared with the previous one at full
+    resolution. With fast=True only every stride-th frame is decoded and
+    compared as a thumbnail_width-wide grayscale thumbnail, and detected
+    changes are refined to the exact frame by bisection.
+
+    With workers > 1 the video is split into time ranges scanned in a process
+    pool, each worker opening its own capture. Every range also decodes the
+    frame (or sample) just before it, so the merged result is identical to
+    the serial scan. Chunks are yielded in order as they complete.
+
+    With a cache, images are written as files and returned as references.
+    encoding selects the image format and the encode thread pool. With
+    dedup, changes that look like an earlier kept one are dropped; a serial
+    scan drops them before encoding, a parallel one after, in scan order,
+    so both keep the same frames.
+
+    With a thumbnail index, changes are read from its sample differences
+    (to the index's sample resolution) and only the changed frames are
+    decoded; fast, stride, thumbnail_width and workers are then unused.
+    """
+    stride = max(1, stride)
+    options = {
+        "threshold": threshold,
+        "max_width": max_width,
+        "max_height": max_height,
+        "fast": fast,
+        "stride": stride,
+        "thumbnail_width": thumbnail_width,
+        "cache": cache,
+        "encoding": encoding,
+    }
+    if dedup is not None:
+        if workers <= 1:
+            options["dedup"] = dedup
+        else:
+            options["hash_frames"] = True
+
+    with open_video(video_path) as session:
+        if cache is not None:
+            options["video_hash"] = cache.video_hash(session.video_path)
+        fps = session.fps
+        print(f"Video properties: frames={session.total_frames}, fps={fps}", file=sys.stderr)
+
+        if index is not None:
+            records = _encode_scene_changes(
+                _indexed_scene_changes(session, index, threshold), max_width, max_height, cache,
+                options.get("video_hash"), encoding, dedup
+            )
+        else:
+            records = _iter_scene_records(session, workers, options)
+
+        detected = 0
+        for frame_index, mean_diff, image, phash in records:
+            if phash is not None and dedup.is_duplicate(phash):
+                print(f"Dropped near-duplicate scene change at frame {frame_index}", file=sys.stderr)
+                continue
+            timestamp_str = format_timestamp(frame_index / fps)
+            print(f"Detected scene change at frame {frame_index} ({timestamp_str}), diff={mean_diff:.2f}", file=sys.stderr)
+            detected += 1
+            yield {
+                "timestamp": timestamp_str,
+                "image": image
+            }
+
+    print(f"Detected {detected} scene changes", file=sys.stderr)
+    if dedup is not None:
+        dedup.report()
+
+def _iter_scene_records(session: VideoSession, workers: int, options: Dict) -> Iterator[Tuple[int, float, str, Optional[int]]]:
+    if workers <= 1:
+        yield from _scene_change_records(session, **options)
+        return
+
+    chunks = scene_chunks(session.total_frames, workers, options["stride"] if options["fast"] else 1)
+    print(f"Scanning {len(chunks)} chunks with {workers} workers", file=sys.stderr)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            _scene_change_records_chunk,
+            [session.video_path] * len(chunks),
+            [start for start, _ in chunks],
+            [end for _, end in chunks],
+            [options] * len(chunks)
+        )
+        for chunk_records in results:
+            yield from chunk_records
+
+def detect_scene_changes(
+    video_path: VideoSource,
+    threshold: float = 30.0,
+    max_width: Optional[int] = None,
+    max_height: Optional[int] = None,
+    fast: bool = False,
+    stride: int = 5,
+    thumbnail_width: int = 64,
+    workers: int = 1,
+    cache: Optional[FrameCache] = None,
+    encoding: Optional[EncodeOptions] = None,
+    dedup: Optional[FrameDeduplicator] = None,
+    index: Optional["ThumbnailIndex"] = None
+) -> List[Dict[str, str]]:
+    """
+    Detect major scene changes in the video and extract frames at those points.
+    See iter_scene_changes for the fast, parallel, dedup and index options.
+    """
+    return list(iter_scene_changes(
+        video_path, threshold, max_width, max_height, fast, stride, thumbnail_width, workers, cache, encoding, dedup, index
+    ))
+
+def scene_change_frames(
+    video_path: VideoSource,
+    threshold: float = 30.0,
+    fast: bool = True,
+    stride: int = 5,
+    thumbnail_width: int = 64
+) -> List[int]:
+    """
+    Frame indices of the scene changes detect_scene_changes would report,
+    without resizing or encoding an image for each one.
+    """
+    with open_video(video_path) as session:
+        if fast:
+            changes = _scan_scene_changes_fast(session, threshold, max(1, stride), thumbnail_width)
+        else:
+            changes = _scan_scene_changes_exact(session, threshold)
+        return [frame_index for frame_index, _, _ in changes]
 
 def resize_maintaining_aspect_ratio(frame, target_width=None, target_height=None):
     """
@@ -140,45 +763,125 @@ def resize_maintaining_aspect_ratio(frame, target_width=None, target_height=None
     return cv2.resize(frame, (target_width, target_height), interpolation=cv2.INTER_AREA)
 
 def capture_frame_at_timestamp(
-    video_path: str,
+    video_path: VideoSource,
     timestamp: float,
     description: Optional[str] = None,
     max_width: Optional[int] = None,
     max_height: Optional[int] = None,
-    target_size: Optional[Tuple[int, int]] = None
+    target_size: Optional[Tuple[int, int]] = None,
+    cache: Optional[FrameCache] = None,
+    encoding: Optional[EncodeOptions] = None
 ) -> Dict:
     """
     Capture a frame at the specified timestamp and optionally resize it.
     """
-    cap = cv2.VideoCapture(str(video_path))
-    if not cap.isOpened():
-        raise ValueError(f"Failed to open video file: {video_path}")
-    
-    cap.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
-    ret, frame = cap.read()
-    
-    if not ret:
-        raise ValueError(f"Failed to read frame at timestamp {timestamp}")
-    
-    original_height, original_width = frame.shape[:2]
-    
-    if target_size:
-        # Use target width as the constraint, maintain aspect ratio
-        target_width, _ = target_size  # Ignore target height, calculate based on aspect
-        frame = resize_maintaining_aspect_ratio(frame, target_width=target_width)
-    elif max_width or max_height:
-        frame = resize_maintaining_aspect_ratio(frame, 
-                                             target_width=max_width,
-                                             target_height=max_height)
-    
-    # Convert to base64
-    _, buffer = cv2.imencode('.jpg', frame)
-    img_base64 = base64.b64encode(buffer).decode('utf-8')
-    
-    height, width = frame.shape[:2]
-    return {
-        "frame_path": f"data:image/jpeg;base64,{img_base64}",
-        "width": width,
-        "height": height,
-        "description": description
-    }
\ No newline at end of file
+    return capture_frames_at_timestamps(
+        video_path,
+        [timestamp],
+        descriptions=[description],
+        max_width=max_width,
+        max_height=max_height,
+        target_sizes=[target_size],
+        cache=cache,
+        encoding=encoding
+    )[0]
+
+def iter_frames_at_timestamps(
+    video_path: VideoSource,
+    timestamps: List[float],
+    descriptions: Optional[List[Optional[str]]] = None,
+    max_width: Optional[int] = None,
+    max_height: Optional[int] = None,
+    target_sizes: Optional[List[Optional[Tuple[int, int]]]] = None,
+    gop_size: Optional[int] = None,
+    cache: Optional[FrameCache] = None,
+    encoding: Optional[EncodeOptions] = None
+) -> Iterator[Tuple[int, Dict]]:
+    """
+    Capture frames at many timestamps with one forward pass over the video.
+
+    Yields (index, frame_data) in decode order, where index is the position
+    of the timestamp in the caller's list. Each decoded frame is encoded and
+    dropped before the next one is read (or, with encoding.workers > 1,
+    handed to the encode pool while decoding continues). With a cache,
+    frames already on disk are yielded first without touching the decoder.
+    """
+    encoding = encoding or DEFAULT_ENCODING
+    with open_video(video_path) as session:
+        last_frame = max(session.total_frames - 1, 0)
+        positions = [min(int(round(ts * session.fps)), last_frame) for ts in timestamps]
+
+        keys = [None] * len(timestamps)
+        pending = []
+        if cache is not None:
+            video_hash = cache.video_hash(session.video_path)
+            for i, pos in enumerate(positions):
+                keys[i] = cache_key(cache, video_hash, pos, max_width, max_height,
+                                    target_sizes[i] if target_sizes else None, encoding)
+                hit = cache.get(keys[i], encoding.ext)
+                if hit is None:
+                    pending.append(i)
+                    continue
+
+                width, height = image_size(str(hit))
+                yield i, {
+                    "frame_path": cache.reference(hit),
+                    "width": width,
+                    "height": height,
+                    "description": descriptions[i] if descriptions else None
+                }
+        else:
+            pending = list(range(len(timestamps)))
+
+        indices_by_position = {}
+        for i in pending:
+            indices_by_position.setdefault(positions[i], []).append(i)
+
+        def frames():
+            for pos, frame in read_frames_at_positions(session.cap, indices_by_position, gop_size):
+                for i in indices_by_position[pos]:
+                    if frame is None:
+                        raise ValueError(f"Failed to read frame at timestamp {timestamps[i]}")
+                    yield i, frame
+
+        def encode(item):
+            i, frame = item
+            resized = resize_frame(
+                frame,
+                max_width=max_width,
+                max_height=max_height,
+                target_size=target_sizes[i] if target_sizes else None
+            )
+
+            height, width = resized.shape[:2]
+            return i, {
+                "frame_path": store_frame(resized, cache, keys[i], encoding),
+                "width": width,
+                "height": height,
+                "description": descriptions[i] if descriptions else None
+            }
+
+        yield from ordered_map(encode, frames(), encoding.workers, encoding.queue_size)
+
+def capture_frames_at_timestamps(
+    video_path: VideoSource,
+    timestamps: List[float],
+    descriptions: Optional[List[Optional[str]]] = None,
+    max_width: Optional[int] = None,
+    max_height: Optional[int] = None,
+    target_sizes: Optional[List[Optional[Tuple[int, int]]]] = None,
+    gop_size: Optional[int] = None,
+    cache: Optional[FrameCache] = None,
+    encoding: Optional[EncodeOptions] = None
+) -> List[Dict]:
+    """
+    Capture frames at many timestamps with one forward pass over the video.
+    Timestamps are decoded in sorted order; results are returned in the
+    caller's order.
+    """
+    results = [None] * len(timestamps)
+    for i, frame_data in iter_frames_at_timestamps(
+        video_path, timestamps, descriptions, max_width, max_height, target_sizes, gop_size, cache, encoding
+    ):
+        results[i] = frame_data
+    return results
@@ -0,0 +1,213 @@
+"""
+Long-running worker for the Python processing layer.
+
+Starting python3 for every HTTP request pays interpreter startup plus the
+imports of the Vertex AI SDK, OpenCV and python-docx before any work starts.
+A worker process does that once and then serves requests over a Unix
+socket:
+
+    python worker.py --socket /tmp/video-worker.sock --processes 4
+
+When VIDEO_WORKER_SOCKET points at a running worker, main.py,
+extract_frames.py and generate_word.py forward their parsed arguments to it
+and only relay the output, so the existing command lines (and the Next.js
+routes that spawn them) keep working unchanged. If no worker is listening
+they run the work in-process as before.
+
+Protocol: one request per connection. The client sends a single JSON line
+{"method", "params", "cwd"}; the worker answers with zero or more
+{"item": ...} lines followed by {"done": true} or {"error": ..., "traceback": ...}.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import tracing
+
+SOCKET_ENV = "VIDEO_WORKER_SOCKET"
+
+class WorkerError(Exception):
+    """Raised on the client when the worker reports a failed request."""
+
+# Handlers import their modules lazily so that the client side of this file
+# stays cheap to import; warm_up() loads them all once in the worker.
+
+def _process_video(params: Dict) -> Iterator[Any]:
+    import main
+    yield main.run(argparse.Namespace(**params))
+
+def _process_video_stream(params: Dict) -> Iterator[Any]:
+    import main
+    yield from main.run_stream(argparse.Namespace(**params))
+
+def _extract_frames(params: Dict) -> Iterator[Any]:
+    import extract_frames
+    yield from extract_frames.iter_frames(argparse.Namespace(**params))
+
+def _generate_word(params: Dict) -> Iterator[Any]:
+    import generate_word
+    generate_word.write_document(params["data_path"], params["output_path"])
+    yield {"output_path": params["output_path"]}
+
+METHODS: Dict[str, Callable[[Dict], Iterator[Any]]] = {
+    "process_video": _process_video,
+    "process_video_stream": _process_video_stream,
+    "extract_frames": _extract_frames,
+    "generate_word": _generate_word,
+}
+
+def warm_up() -> None:
+    """
+    Import every handler's dependencies and initialize Vertex AI, which the
+    CLIs otherwise defer to first use, so the first request is not slow.
+    """
+    import main
+    import extract_frames  # noqa: F401
+    import generate_word  # noqa: F401
+    import video_utils  # noqa: F401
+    import thumbnail_index  # noqa: F401
+    import docx  # noqa: F401
+    import PIL.Image  # noqa: F401
+    import ijson  # noqa: F401
+    main.init_vertex()
+    import vertexai.preview.generative_models  # noqa: F401
+    print(f"Worker {os.getpid()} ready", file=sys.stderr)
+
+def _send(stream, message: Dict) -> None:
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.flush()
+
+def handle_connection(conn: socket.socket) -> None:
+    try:
+        _handle_connection(conn)
+    except (BrokenPipeError, ConnectionResetError):
+        # The client hung up before the buffered reply was flushed on close
+        pass
+
+def _handle_connection(conn: socket.socket) -> None:
+    with conn, conn.makefile("rwb") as stream:
+        try:
+            request = json.loads(stream.readline())
+            handler = METHODS.get(request.get("method"))
+            if handler is None:
+                raise ValueError(f"Unknown method: {request.get('method')}")
+            if request.get("cwd"):
+                os.chdir(request["cwd"])
+
+            print(f"Worker {os.getpid()}: {request['method']}", file=sys.stderr)
+            # With VIDEO_TRACE set on the worker, each request gets its own summary
+            with tracing.invocation(f"worker.{request['method']}"):
+                for item in handler(request.get("params") or {}):
+                    _send(stream, {"item": item})
+            _send(stream, {"done": True})
+        except (BrokenPipeError, ConnectionResetError):
+            print(f"Worker {os.getpid()}: client disconnected", file=sys.stderr)
+        except Exception as e:
+            print(traceback.format_exc(), file=sys.stderr)
+            try:
+                _send(stream, {"error": str(e), "traceback": traceback.format_exc()})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+def _serve_forever(server: socket.socket) -> None:
+    warm_up()
+    while True:
+        conn, _ = server.accept()
+        handle_connection(conn)
+
+def serve(socket_path: str, processes: int = 1) -> None:
+    """
+    Listen on socket_path and serve requests with a pre-forked pool of
+    processes, each handling one request at a time with warm imports.
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(64)
+    print(f"Listening on {socket_path} with {processes} processes", file=sys.stderr)
+
+    try:
+        if processes <= 1:
+            _serve_forever(server)
+            return
+
+        import multiprocessing
+        ctx = multiprocessing.get_context("fork")
+        children = [ctx.Process(target=_serve_forever, args=(server,)) for _ in range(processes)]
+        for child in children:
+            child.start()
+
+        def _stop(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, _stop)
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if processes > 1:
+            for child in children:
+                child.terminate()
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def connect(socket_path: Optional[str] = None) -> Optional[socket.socket]:
+    """
+    Connect to the worker at socket_path (default: $VIDEO_WORKER_SOCKET).
+    Returns None when no worker is configured or listening, so callers can
+    fall back to running the work in-process.
+    """
+    socket_path = socket_path or os.environ.get(SOCKET_ENV)
+    if not socket_path:
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        sock.close()
+        print(f"Worker not available at {socket_path} ({e}); running in-process", file=sys.stderr)
+        return None
+    return sock
+
+def stream(sock: socket.socket, method: str, params: Dict) -> Iterator[Any]:
+    """Send one request on sock and yield the items the worker streams back."""
+    with sock, sock.makefile("rwb") as conn:
+        _send(conn, {"method": method, "params": params, "cwd": os.getcwd()})
+        for line in conn:
+            message = json.loads(line)
+            if "item" in message:
+                yield message["item"]
+            elif message.get("done"):
+                return
+            elif "error" in message:
+                print(message.get("traceback", ""), file=sys.stderr)
+                raise WorkerError(message["error"])
+    raise WorkerError("Worker closed the connection before finishing the request")
+
+def request(sock: socket.socket, method: str, params: Dict) -> Any:
+    """
+    Send a request that has a single result on sock and return it. The reply
+    is read to the end, so the worker never writes to a closed connection.
+    """
+    items = list(stream(sock, method, params))
+    if len(items) != 1:
+        raise WorkerError(f"Expected one result from {method}, got {len(items)}")
+    return items[0]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve video processing requests from warm worker processes")
+    parser.add_argument("--socket", default=os.environ.get(SOCKET_ENV, "/tmp/video-worker.sock"),
+                        help=f"Unix socket path to listen on (clients read ${SOCKET_ENV})")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Number of worker processes serving requests concurrently")
+    args = parser.parse_args()
+    serve(args.socket, args.processes)